@@ -1,11 +1,16 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import render
+from django.urls import path, reverse
 from .models import (
     Communication,
     CommunicationAttachment,
     CommunicationTargetGroup,
     CommunicationRecipient,
     CommunicationComment,
+    CommunicationArchive,
+    SavedAudience,
     CustomUser, 
     Branch, 
     TeachingPosition, 
@@ -14,18 +19,30 @@ from .models import (
     StudentClass,
     ClassArm, 
     StudentProfile, 
-    ParentProfile
+    ParentProfile,
+    PushDevice,
+    DeliveryAttempt,
+    RecurringCommunication
 
 )
 from django.utils.html import format_html  # Import format_html
+from .forms import RosterImportForm
+from .notifications import breaker, retries
+from .notifications.channels import CHANNELS
+from .paginators import EstimatedCountPaginator
+from .roster_import import RosterImporter, read_roster
 
 
 class CustomUserAdmin(UserAdmin):
     model = CustomUser
     list_display = ('email', 'username', 'role', 'branch', 'staff_type', 'gender', 'is_active', 'is_staff', 'profile_picture_thumb')
     list_filter = ('role', 'branch', 'staff_type', 'gender', 'is_active')
-    search_fields = ('email', 'username', 'first_name', 'last_name')
+    # Prefix searches so the unique email/username and (last_name, first_name) indexes are used
+    search_fields = ('^email', '^username', '^last_name', '^first_name')
     ordering = ('email',)
+    list_select_related = ('branch',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     fieldsets = (
         (None, {'fields': ('email', 'username', 'password')}),
@@ -48,11 +65,66 @@ class CustomUserAdmin(UserAdmin):
 
     def profile_picture_thumb(self, obj):
         if obj.profile_picture:
-            return format_html('<img src="{}" width="50" height="50" />', obj.profile_picture.url)
+            return format_html(
+                '<img src="{}" width="32" height="32" style="object-fit: cover;" />',
+                obj.get_profile_picture_url(size=32),
+            )
         return 'No image'
 
     profile_picture_thumb.short_description = 'Profile Picture'
 
+    def get_urls(self):
+        custom_urls = [
+            path(
+                'import-roster/',
+                self.admin_site.admin_view(self.import_roster_view),
+                name='accounts_customuser_import_roster',
+            ),
+        ]
+        return custom_urls + super().get_urls()
+
+    def import_roster_view(self, request):
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+
+        result = None
+        if request.method == 'POST':
+            form = RosterImportForm(request.POST, request.FILES)
+            if form.is_valid():
+                upload = form.cleaned_data['file']
+                restrict_branch = request.user.branch if request.user.role == 'branch_admin' else None
+                importer = RosterImporter(
+                    default_branch=form.cleaned_data['branch'],
+                    restrict_branch=restrict_branch,
+                    allow_superadmin=request.user.is_superuser,
+                    # Hash in this process: a pool per web request would fork a worker per CPU
+                    hash_workers=1,
+                    dry_run=form.cleaned_data['dry_run'],
+                )
+                try:
+                    result = importer.run(read_roster(upload.file, upload.name))
+                except ValueError as e:
+                    form.add_error('file', str(e))
+                else:
+                    verb = "validated" if form.cleaned_data['dry_run'] else "created"
+                    level = messages.WARNING if result.errors else messages.SUCCESS
+                    self.message_user(
+                        request,
+                        f"{result.total_created} of {result.rows_read} rows {verb}; {len(result.errors)} rejected.",
+                        level,
+                    )
+        else:
+            form = RosterImportForm()
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import roster',
+            'form': form,
+            'result': result,
+        }
+        return render(request, 'admin/accounts/customuser/import_roster.html', context)
+
 
 class StudentClassAdmin(admin.ModelAdmin):
     list_display = ('name',)
@@ -76,15 +148,11 @@ class CommunicationTargetGroupInline(admin.TabularInline):
     extra = 1
 
 
-class CommunicationRecipientInline(admin.TabularInline):
-    model = CommunicationRecipient
-    extra = 1
-
-
 class CommunicationCommentInline(admin.TabularInline):
     model = CommunicationComment
     extra = 1
     readonly_fields = ['created_at']
+    raw_id_fields = ('commenter',)
 
 
 # --- Main admin class ---
@@ -92,37 +160,152 @@ class CommunicationCommentInline(admin.TabularInline):
 @admin.register(Communication)
 class CommunicationAdmin(admin.ModelAdmin):
     list_display = ('message_type', 'title', 'sender', 'is_draft', 'scheduled_time', 'created_at')
-    search_fields = ('title', 'body', 'sender__username')
-    list_filter = ('message_type', 'is_draft', 'created_at')
-
+    search_fields = ('=id', '^title', '^sender__email')
+    list_filter = ('message_type', 'is_draft', 'is_broadcast', 'created_at')
+    list_select_related = ('sender',)
+    autocomplete_fields = ('sender', 'audience')
+    readonly_fields = ('recipients_link',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    # Recipients can number in the thousands, so they are linked to their own
+    # paginated (read-only) changelist instead of being rendered as an inline.
     inlines = [
         CommunicationAttachmentInline,
         CommunicationTargetGroupInline,
-        CommunicationRecipientInline,
         CommunicationCommentInline,
     ]
 
+    def recipients_link(self, obj):
+        if not obj.pk:
+            return '-'
+        url = reverse('admin:accounts_communicationrecipient_changelist')
+        count = obj.recipients.count()
+        return format_html('<a href="{}?communication__id__exact={}">{} recipient(s)</a>', url, obj.pk, count)
+
+    recipients_link.short_description = 'Recipients'
+
+
+@admin.register(SavedAudience)
+class SavedAudienceAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'owner', 'size', 'updated_at')
+    search_fields = ('^name', '^owner__email')
+    list_select_related = ('owner',)
+    raw_id_fields = ('owner',)
+    # The member array is binary; size and filter_data describe it
+    exclude = ('members',)
+    readonly_fields = ('size', 'digest')
+
+
+@admin.register(RecurringCommunication)
+class RecurringCommunicationAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'rule', 'active', 'next_run_at', 'last_run_at', 'occurrences')
+    list_filter = ('active',)
+    search_fields = ('^template__title', '^template__sender__email')
+    list_select_related = ('template',)
+    raw_id_fields = ('template', 'extra_audience')
+    # next_run_at is recomputed from the rule on save
+    readonly_fields = ('next_run_at', 'last_run_at', 'occurrences')
+
 
 # Registering the remaining models separately (optional)
 @admin.register(CommunicationAttachment)
 class CommunicationAttachmentAdmin(admin.ModelAdmin):
     list_display = ('communication', 'file', 'uploaded_at')
+    list_select_related = ('communication__sender',)
+    raw_id_fields = ('communication',)
 
 
 @admin.register(CommunicationRecipient)
 class CommunicationRecipientAdmin(admin.ModelAdmin):
-    list_display = ('recipient', 'communication', 'read', 'read_at')
+    """Read-only, paginated view of delivery rows; open it filtered from a communication."""
+    list_display = ('recipient', 'email', 'communication', 'read', 'read_at', 'delivered', 'has_responded')
+    list_filter = ('read', 'delivered', 'has_responded')
+    search_fields = ('=communication__id', '^recipient__email', '^email')
+    list_select_related = ('recipient', 'communication__sender')
+    raw_id_fields = ('communication', 'recipient')
+    list_per_page = 50
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(CommunicationComment)
 class CommunicationCommentAdmin(admin.ModelAdmin):
     list_display = ('commenter', 'communication', 'created_at')
     search_fields = ('comment',)
+    list_select_related = ('commenter', 'communication__sender')
+    raw_id_fields = ('commenter', 'communication')
+
+
+@admin.register(PushDevice)
+class PushDeviceAdmin(admin.ModelAdmin):
+    list_display = ('user', 'platform', 'created_at', 'last_seen')
+    list_filter = ('platform',)
+    search_fields = ('^user__email', '=token')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+
+
+class StuckDeliveryFilter(admin.SimpleListFilter):
+    title = 'stuck'
+    parameter_name = 'stuck'
+
+    def lookups(self, request, model_admin):
+        return [('yes', 'Stuck (dead or overdue)')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return retries.stuck(queryset)
+        return queryset
+
+
+@admin.register(DeliveryAttempt)
+class DeliveryAttemptAdmin(admin.ModelAdmin):
+    """Failed deliveries in the retry queue; filter by "stuck" for the ones needing attention."""
+    list_display = ('communication', 'channel', 'address', 'status', 'attempts', 'next_attempt_at', 'last_error', 'updated_at')
+    list_filter = (StuckDeliveryFilter, 'status', 'channel')
+    search_fields = ('=communication__id', '^address')
+    list_select_related = ('communication__sender',)
+    raw_id_fields = ('communication',)
+    readonly_fields = ('recipient_ids', 'created_at', 'updated_at')
+    ordering = ('next_attempt_at',)
+    actions = ['retry_now', 'dead_letter']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description="Retry selected deliveries now")
+    def retry_now(self, request, queryset):
+        count = retries.requeue(queryset)
+        self.message_user(request, f"{count} deliver{'y' if count == 1 else 'ies'} queued for retry.", messages.SUCCESS)
+
+    @admin.action(description="Give up on selected deliveries (dead-letter)")
+    def dead_letter(self, request, queryset):
+        count = queryset.filter(status='retrying').update(status='dead', next_attempt_at=None)
+        self.message_user(request, f"{count} deliver{'y' if count == 1 else 'ies'} dead-lettered.", messages.SUCCESS)
+
+    def changelist_view(self, request, extra_context=None):
+        for channel, until in breaker.open_channels(CHANNELS).items():
+            self.message_user(
+                request,
+                f"The {channel} channel is paused by its circuit breaker until "
+                f"{retries.reopens_at(until):%H:%M:%S} UTC; its deliveries wait in the queue.",
+                messages.WARNING,
+            )
+        return super().changelist_view(request, extra_context)
 
 
 @admin.register(CommunicationTargetGroup)
 class CommunicationTargetGroupAdmin(admin.ModelAdmin):
-    list_display = ('communication', 'role', 'branch', 'get_student_class', 'get_class_arm')
+    list_display = ('communication', 'role', 'branch', 'get_student_class', 'get_class_arm', 'guardians')
+    list_select_related = ('communication__sender', 'branch', 'student_class', 'class_arm')
+    raw_id_fields = ('communication',)
 
     def get_student_class(self, obj):
         return obj.student_class.name if obj.student_class else '-'
@@ -134,12 +317,44 @@ class CommunicationTargetGroupAdmin(admin.ModelAdmin):
 
 
 
+class ProfileAdmin(admin.ModelAdmin):
+    # The default select would list every user on the change form
+    raw_id_fields = ('user',)
+    list_select_related = ('user',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class StudentProfileAdmin(ProfileAdmin):
+    raw_id_fields = ('user', 'parent')
+
+
+@admin.register(CommunicationArchive)
+class CommunicationArchiveAdmin(admin.ModelAdmin):
+    list_display = ('original_id', 'title', 'message_type', 'sender', 'sent_at', 'recipient_count', 'archived_at')
+    list_filter = ('message_type',)
+    list_select_related = ('sender',)
+    raw_id_fields = ('sender',)
+    exclude = ('payload',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('payload')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 admin.site.register(StudentClass, StudentClassAdmin)
 admin.site.register(ClassArm, ClassArmAdmin)
 admin.site.register(CustomUser, CustomUserAdmin)
 admin.site.register(Branch)
 admin.site.register(TeachingPosition)
 admin.site.register(NonTeachingPosition)
-admin.site.register(StaffProfile)
-admin.site.register(StudentProfile)
-admin.site.register(ParentProfile)
+admin.site.register(StaffProfile, ProfileAdmin)
+admin.site.register(StudentProfile, StudentProfileAdmin)
+admin.site.register(ParentProfile, ProfileAdmin)
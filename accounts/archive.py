@@ -0,0 +1,198 @@
+"""
+Cold-storage archival for communications.
+
+Sent communications older than a cutoff are copied into ``CommunicationArchive`` /
+``ArchivedRecipient`` (and optionally a gzip-compressed JSONL file per batch) and then
+deleted from the live tables, so inbox/outbox queries only touch recent rows.
+"""
+# Standard Library
+import gzip
+import json
+import logging
+import zlib
+from dataclasses import dataclass, field
+from datetime import timedelta
+from pathlib import Path
+
+# Django Core
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+# Local App Imports
+from .audiences import prune_snapshots
+from .models import (
+    ArchivedRecipient, Communication, CommunicationArchive, CommunicationAttachment,
+    CommunicationComment, CommunicationRecipient, MessageReply, ReplyAttachment,
+    SentMessageDelete,
+)
+
+logger = logging.getLogger(__name__)
+
+RECIPIENT_FIELDS = (
+    'id', 'communication_id', 'recipient_id', 'email', 'deleted', 'read', 'read_at',
+    'delivered', 'delivered_at', 'requires_response', 'has_responded',
+)
+
+
+@dataclass
+class ArchiveResult:
+    communications: int = 0
+    recipients: int = 0
+    replies: int = 0
+    batches: int = 0
+    snapshots: int = 0
+    files: list = field(default_factory=list)
+
+
+def default_cutoff():
+    return timezone.now() - timedelta(days=settings.COMMUNICATION_ARCHIVE_AFTER_DAYS)
+
+
+def archivable(before):
+    # Broadcasts have no row per reader to archive; they stay in the live tables
+    return Communication.objects.filter(sent=True, is_draft=False, is_broadcast=False, sent_at__lt=before)
+
+
+def archive_communications(before=None, batch_size=500, export_dir=None, dry_run=False):
+    """Move sent communications with ``sent_at < before`` into cold storage, batch by batch."""
+    before = before or default_cutoff()
+    result = ArchiveResult()
+    if dry_run:
+        result.communications = archivable(before).count()
+        return result
+
+    last_id = 0
+    while True:
+        ids = list(
+            archivable(before).filter(id__gt=last_id)
+            .order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        last_id = ids[-1]
+        payloads = _collect(ids)
+        if export_dir:
+            result.files.append(_export(payloads, export_dir))
+        with transaction.atomic():
+            _store(payloads, result)
+            Communication.objects.filter(id__in=ids).delete()
+        result.batches += 1
+        logger.info(f"[ARCHIVE] Archived communications {ids[0]}..{ids[-1]} ({len(ids)})")
+    # The recipient snapshots of archived and deleted messages
+    result.snapshots = prune_snapshots()
+    return result
+
+
+def _collect(ids):
+    """Build one JSON-serialisable payload per communication using a fixed number of queries."""
+    payloads = {}
+    for comm in Communication.objects.filter(id__in=ids).values(
+        'id', 'sender_id', 'message_type', 'title', 'body', 'scheduled_time', 'sent_at',
+        'created_at', 'updated_at', 'selected_recipient_ids', 'manual_emails',
+        'requires_response', 'saved_filter_data',
+    ):
+        comm.update(attachments=[], recipients=[], replies=[], comments=[], sender_deleted=False)
+        payloads[comm['id']] = comm
+
+    for comm_id, sender_id in SentMessageDelete.objects.filter(
+        communication_id__in=ids, deleted=True
+    ).values_list('communication_id', 'sender_id'):
+        if payloads[comm_id]['sender_id'] == sender_id:
+            payloads[comm_id]['sender_deleted'] = True
+
+    for comm_id, name in CommunicationAttachment.objects.filter(
+        communication_id__in=ids
+    ).exclude(file='').values_list('communication_id', 'file'):
+        if name:
+            payloads[comm_id]['attachments'].append(name)
+
+    for row in CommunicationRecipient.objects.filter(communication_id__in=ids).values(*RECIPIENT_FIELDS):
+        payloads[row['communication_id']]['recipients'].append(row)
+
+    replies = {}
+    for row in MessageReply.objects.filter(communication_id__in=ids).values(
+        'id', 'recipient_entry_id', 'communication_id', 'responder_id', 'reply_text', 'replied_at',
+    ):
+        comm_id = row.pop('communication_id')
+        row['attachments'] = []
+        replies[row['id']] = row
+        payloads[comm_id]['replies'].append(row)
+
+    for reply_id, name in ReplyAttachment.objects.filter(reply_id__in=replies).values_list('reply_id', 'file'):
+        replies[reply_id]['attachments'].append(name)
+
+    for row in CommunicationComment.objects.filter(communication_id__in=ids).values(
+        'communication_id', 'commenter_id', 'comment', 'created_at'
+    ):
+        payloads[row.pop('communication_id')]['comments'].append(row)
+
+    return payloads
+
+
+def _preview(body):
+    text = strip_tags(body or '')
+    return text[:75] + "..." if len(text) > 75 else text
+
+
+def _store(payloads, result):
+    archives = []
+    for comm_id, payload in payloads.items():
+        archives.append(CommunicationArchive(
+            original_id=comm_id,
+            sender_id=payload['sender_id'],
+            message_type=payload['message_type'],
+            title=payload['title'],
+            preview=_preview(payload['body']),
+            sent_at=payload['sent_at'],
+            created_at=payload['created_at'],
+            recipient_count=len(payload['recipients']),
+            attachment_count=len(payload['attachments']),
+            reply_count=len(payload['replies']),
+            sender_deleted=payload['sender_deleted'],
+            payload=zlib.compress(json.dumps(payload, cls=DjangoJSONEncoder).encode()),
+        ))
+    CommunicationArchive.objects.bulk_create(archives)
+
+    # bulk_create does not return primary keys on every backend; look them up once
+    archive_ids = dict(
+        CommunicationArchive.objects.filter(original_id__in=payloads).values_list('original_id', 'id')
+    )
+    rows = [
+        ArchivedRecipient(
+            archive_id=archive_ids[comm_id],
+            recipient_id=r['recipient_id'],
+            read=r['read'],
+            deleted=r['deleted'],
+            requires_response=r['requires_response'],
+            has_responded=r['has_responded'],
+        )
+        for comm_id, payload in payloads.items()
+        for r in payload['recipients'] if r['recipient_id']
+    ]
+    ArchivedRecipient.objects.bulk_create(rows, batch_size=5000)
+
+    result.communications += len(payloads)
+    result.recipients += sum(len(p['recipients']) for p in payloads.values())
+    result.replies += sum(len(p['replies']) for p in payloads.values())
+
+
+def _export(payloads, export_dir):
+    directory = Path(export_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    ids = sorted(payloads)
+    path = directory / f"communications-{ids[0]}-{ids[-1]}.jsonl.gz"
+    with gzip.open(path, 'wt', encoding='utf-8') as fh:
+        for comm_id in ids:
+            fh.write(json.dumps(payloads[comm_id], cls=DjangoJSONEncoder))
+            fh.write('\n')
+    return str(path)
+
+
+def read_export(path):
+    """Stream communication payloads back out of an exported ``.jsonl.gz`` file."""
+    with gzip.open(path, 'rt', encoding='utf-8') as fh:
+        for line in fh:
+            yield json.loads(line)
@@ -0,0 +1,221 @@
+"""
+Saved audiences: recipient sets stored once as compact sorted ID arrays.
+
+A ``SavedAudience`` keeps its member IDs sorted, delta-encoded as an ``array('I')``
+and zlib-compressed; consecutive IDs (a class, an arm, a branch) shrink to a few
+bytes each instead of ~7 bytes of JSON per ID. Drafts and scheduled communications
+reference an audience by foreign key, so reopening a draft never loads the IDs and
+a named audience ("JSS2 Gold parents") can be reused across messages.
+
+In memory an audience is an ``Audience``: a bitmap held in a Python ``int`` (bit ``n``
+set means user ``n`` is a member). 50k members drawn from a 100k-ID range take
+~12KB instead of the ~2.5MB of a ``set`` of ints, and union, intersection and
+difference run as single C-level bitwise operations. ``Audience.id_join`` hands the
+members to ``accounts.id_joins`` so querysets join against a temporary table instead
+of carrying a huge ``IN (...)`` list.
+
+Unnamed snapshots last only as long as the message waits: a message drops its snapshot
+once sent (``release``; its recipients then have inbox rows) and a re-saved draft its
+previous one, and the nightly archive run prunes any left by deleted messages.
+"""
+# Standard Library
+import hashlib
+import sys
+import zlib
+from array import array
+from itertools import accumulate
+
+# Local App Imports
+from .id_joins import id_join
+
+# Bit positions set in each byte value, for iterating a bitmap without testing every bit
+_BYTE_BITS = [tuple(i for i in range(8) if value >> i & 1) for value in range(256)]
+
+
+def encode_ids(ids):
+    """Serialise an iterable of positive integer IDs (order and duplicates ignored)."""
+    return _encode_sorted(sorted(set(int(pk) for pk in ids)))
+
+
+def _encode_sorted(ids):
+    """``ids`` is a sorted list or array without duplicates."""
+    deltas = array('I', ids[:1])
+    deltas.extend(map(int.__sub__, ids[1:], ids[:-1]))
+    if sys.byteorder == 'big':
+        deltas.byteswap()
+    return zlib.compress(deltas.tobytes())
+
+
+def decode_ids(data):
+    """Inverse of ``encode_ids``: the sorted list of IDs."""
+    if not data:
+        return []
+    deltas = array('I')
+    deltas.frombytes(zlib.decompress(bytes(data)))
+    if sys.byteorder == 'big':
+        deltas.byteswap()
+    return list(accumulate(deltas))
+
+
+class Audience:
+    """An immutable set of positive integer IDs stored as a bitmap."""
+    __slots__ = ('_bits',)
+
+    def __init__(self, ids=()):
+        if isinstance(ids, Audience):
+            self._bits = ids._bits
+            return
+        ids = ids if isinstance(ids, (list, tuple, array, set, frozenset, range)) else list(ids)
+        if not ids:
+            self._bits = 0
+            return
+        bitmap = bytearray(max(ids) // 8 + 1)
+        for pk in ids:
+            bitmap[pk >> 3] |= 1 << (pk & 7)
+        self._bits = int.from_bytes(bitmap, 'little')
+
+    @classmethod
+    def _from_bits(cls, bits):
+        audience = cls.__new__(cls)
+        audience._bits = bits
+        return audience
+
+    @classmethod
+    def from_queryset(cls, queryset, field='id'):
+        return cls(queryset.values_list(field, flat=True).order_by().iterator(chunk_size=10000))
+
+    @classmethod
+    def decode(cls, data):
+        return cls(decode_ids(data))
+
+    def encode(self):
+        return _encode_sorted(self.to_array())
+
+    def __iter__(self):
+        """IDs in ascending order."""
+        data = self._bits.to_bytes((self._bits.bit_length() + 7) // 8, 'little')
+        for index, byte in enumerate(data):
+            if byte:
+                base = index << 3
+                for bit in _BYTE_BITS[byte]:
+                    yield base + bit
+
+    def __len__(self):
+        return self._bits.bit_count()
+
+    def __bool__(self):
+        return bool(self._bits)
+
+    def __contains__(self, pk):
+        return pk >= 0 and bool(self._bits >> pk & 1)
+
+    def __eq__(self, other):
+        return isinstance(other, Audience) and self._bits == other._bits
+
+    def __hash__(self):
+        return hash(self._bits)
+
+    def __or__(self, other):
+        return Audience._from_bits(self._bits | Audience(other)._bits)
+
+    def __and__(self, other):
+        return Audience._from_bits(self._bits & Audience(other)._bits)
+
+    def __sub__(self, other):
+        return Audience._from_bits(self._bits & ~Audience(other)._bits)
+
+    union, intersection, difference = __or__, __and__, __sub__
+
+    def __repr__(self):
+        return f"<Audience: {len(self)} members>"
+
+    def to_array(self):
+        return array('I', self)
+
+    def id_join(self, using='default'):
+        """Context manager yielding the members for ``filter(id__in=...)``; see ``id_joins.id_join``."""
+        return id_join(self, using)
+
+
+def digest(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def snapshot(owner, ids, filter_data=None, name=''):
+    """
+    Store ``ids`` (any iterable of IDs, or an ``Audience``) as an audience owned by
+    ``owner`` and return it.
+
+    A named audience is created or replaced by name. Messages keep the members they
+    were saved with: an audience that communications reference is renamed to an
+    unnamed snapshot and the name moves to a new row. An unnamed snapshot is shared
+    with any existing unnamed snapshot of the same owner and members.
+    """
+    from .models import SavedAudience
+
+    audience = Audience(ids)
+    members = audience.encode()
+    fields = {
+        'members': members,
+        'digest': digest(members),
+        'size': len(audience),
+        'filter_data': filter_data,
+    }
+    if name:
+        current = SavedAudience.objects.filter(owner=owner, name=name).first()
+        if current is None:
+            return SavedAudience.objects.create(owner=owner, name=name, **fields)
+        if current.digest != fields['digest'] and current.communications.exists():
+            SavedAudience.objects.filter(pk=current.pk).update(name='')
+            return SavedAudience.objects.create(owner=owner, name=name, **fields)
+        for field, value in fields.items():
+            setattr(current, field, value)
+        current.save()
+        return current
+
+    existing = SavedAudience.objects.filter(owner=owner, name='', digest=fields['digest']).first()
+    if existing:
+        return existing
+    return SavedAudience.objects.create(owner=owner, name='', **fields)
+
+
+def unreferenced_snapshots():
+    """Unnamed audiences that no communication or recurring schedule uses any more."""
+    from .models import RecurringCommunication, SavedAudience
+
+    return SavedAudience.objects.filter(name='', communications__isnull=True).exclude(
+        id__in=RecurringCommunication.objects.filter(extra_audience__isnull=False).values('extra_audience'),
+    )
+
+
+def discard(audience_id):
+    """Delete the audience ``audience_id`` if it is an unnamed snapshot nothing uses."""
+    if audience_id:
+        unreferenced_snapshots().filter(pk=audience_id).delete()
+
+
+def release(communication):
+    """
+    Detach a sent ``communication`` from its audience, as its recipients now have inbox
+    rows, and discard the audience if that was its snapshot.
+    """
+    from .models import Communication
+
+    audience_id = communication.audience_id
+    if not audience_id:
+        return
+    Communication.objects.filter(pk=communication.pk).update(audience=None)
+    communication.audience = None
+    discard(audience_id)
+
+
+def prune_snapshots():
+    """Delete every unreferenced unnamed audience (deleted drafts, archived messages)."""
+    return unreferenced_snapshots().delete()[0]
+
+
+def recipient_audience(communication):
+    """Who the communication is addressed to: its saved audience, or the legacy JSON list."""
+    if communication.audience_id:
+        return communication.audience.audience()
+    return Audience(int(pk) for pk in communication.selected_recipient_ids or [])
@@ -0,0 +1,159 @@
+"""
+Fan-out-on-read delivery for large announcements.
+
+A message sent to a whole branch (or every user of one role in it) would otherwise
+write one ``CommunicationRecipient`` row per user. Once the audience reaches
+``BROADCAST_THRESHOLD`` the communication is stored as a broadcast instead: only its
+``CommunicationTargetGroup`` is saved, and ``inbox_view`` merges the broadcasts whose
+target group matches the reader at read time.
+
+A reader's ``CommunicationRecipient`` row (read/deleted/replied state) is created
+lazily, the first time they open or delete the broadcast; from then on it behaves like
+any other inbox row. ``UserMessageStats`` only counts those rows, so the dashboard adds
+the reader's untouched broadcasts at read time (``pending_counts``).
+
+Only target groups that can be re-evaluated against a single reader qualify: a staff
+sender targeting one or more branches, each optionally narrowed to one role
+(accounts.targeting). Class, staff-type and position groups and hand-picked recipients
+are still fanned out on write. A user sees broadcasts sent after they joined, for as
+long as they match a target group.
+"""
+# Standard Library
+import logging
+
+# Django Core
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
+
+# Local App Imports
+from .targeting import audience, communication_specs, is_branch_role_only
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_THRESHOLD = getattr(settings, 'BROADCAST_THRESHOLD', 1000)
+BROADCAST_SENDER_ROLES = ('staff', 'branch_admin', 'superadmin')
+
+
+def is_broadcast(sender, specs, recipients):
+    """
+    Whether a message to the target groups ``specs`` (and nobody else) can be delivered
+    as a broadcast: every group is a branch with an optional role and ``recipients``
+    holds at least ``BROADCAST_THRESHOLD`` users.
+    """
+    if sender.role not in BROADCAST_SENDER_ROLES or not specs:
+        return False
+    if not all(is_branch_role_only(spec) for spec in specs):
+        return False
+    return recipients.count() >= BROADCAST_THRESHOLD
+
+
+def recipients(communication):
+    """The users a broadcast currently reaches (used for counts, never materialised)."""
+    return audience(communication_specs(communication), sender=communication.sender)
+
+
+def _matching_groups(user):
+    from .models import CommunicationTargetGroup
+
+    return CommunicationTargetGroup.objects.filter(branch_id=user.branch_id).filter(
+        Q(role__isnull=True) | Q(role=user.role)
+    )
+
+
+def visible_broadcasts(user):
+    """Sent broadcasts whose target group matches ``user``, touched or not."""
+    from .models import Communication
+
+    if not user.branch_id or not user.is_active:
+        return Communication.objects.none()
+    return Communication.objects.filter(
+        is_broadcast=True,
+        sent=True,
+        sent_at__gte=user.date_joined,
+        id__in=_matching_groups(user).values('communication_id'),
+    ).exclude(sender=user)
+
+
+def pending_broadcasts(user):
+    """Broadcasts ``user`` has not opened or deleted yet (no inbox row exists)."""
+    return visible_broadcasts(user).exclude(recipients__recipient=user)
+
+
+def inbox_entries(user):
+    """
+    Unsaved ``CommunicationRecipient`` stand-ins for ``user``'s pending broadcasts,
+    shaped like the rows ``inbox_view`` lists (``display_time`` included).
+    """
+    from .models import CommunicationRecipient
+
+    entries = []
+    for communication in pending_broadcasts(user).select_related('sender'):
+        entry = CommunicationRecipient(
+            communication=communication,
+            recipient=user,
+            requires_response=communication.requires_response,
+        )
+        entry.display_time = communication.sent_at or communication.created_at
+        entries.append(entry)
+    return entries
+
+
+def pending_counts(user):
+    """``received``/``unread``/``pending_replies`` contributed by untouched broadcasts."""
+    counts = pending_broadcasts(user).aggregate(
+        received=Count('id'),
+        pending_replies=Count('id', filter=Q(requires_response=True)),
+    )
+    return {
+        'received': counts['received'],
+        'unread': counts['received'],
+        'pending_replies': counts['pending_replies'],
+    }
+
+
+def materialize(user, communication_id):
+    """
+    The inbox row of ``user`` for a broadcast, created on first interaction.
+    Returns ``None`` if the broadcast is not visible to ``user``.
+    """
+    from .models import CommunicationRecipient
+    from .rollups import record_received
+
+    entry = CommunicationRecipient.objects.filter(communication_id=communication_id, recipient=user).first()
+    if entry is not None:
+        return entry
+
+    communication = visible_broadcasts(user).filter(pk=communication_id).first()
+    if communication is None:
+        return None
+
+    try:
+        with transaction.atomic():
+            entry = CommunicationRecipient.objects.create(
+                communication=communication,
+                recipient=user,
+                requires_response=communication.requires_response,
+            )
+    except IntegrityError:
+        # A concurrent request (e.g. a double click) created it first
+        return CommunicationRecipient.objects.get(communication_id=communication_id, recipient=user)
+
+    record_received(user, entry)
+    logger.debug(f"[BROADCAST] Materialised communication {communication_id} for user {user.pk}")
+    return entry
+
+
+def materialize_deleted(user):
+    """Hide every pending broadcast from ``user`` at once (clearing the inbox)."""
+    from .models import CommunicationRecipient
+
+    rows = [
+        CommunicationRecipient(
+            communication_id=pk, recipient=user, deleted=True,
+            requires_response=requires_response,
+        )
+        for pk, requires_response in pending_broadcasts(user).values_list('id', 'requires_response')
+    ]
+    CommunicationRecipient.objects.bulk_create(rows, ignore_conflicts=True, batch_size=1000)
+    return len(rows)
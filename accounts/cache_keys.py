@@ -0,0 +1,25 @@
+"""
+Cache key namespaces.
+
+Every cached value is keyed as ``<namespace>:v<version>:<parts...>`` (``CACHES``
+adds the project-wide ``KEY_PREFIX``). Bump a namespace's version to invalidate
+all of its keys at once, e.g. after changing what is stored under it.
+"""
+
+THUMBNAILS = 'thumb'
+AUDIENCE_SIZES = 'audsize'
+CIRCUIT_BREAKER = 'breaker'
+DELIVERY_RETRY_LOCK = 'retrylock'
+EMAIL_RATE_LIMIT = 'mailrate'
+
+VERSIONS = {
+    THUMBNAILS: 2,
+    AUDIENCE_SIZES: 2,
+    CIRCUIT_BREAKER: 1,
+    DELIVERY_RETRY_LOCK: 1,
+    EMAIL_RATE_LIMIT: 1,
+}
+
+
+def make_key(namespace, *parts):
+    return ':'.join([namespace, f"v{VERSIONS.get(namespace, 1)}", *map(str, parts)])
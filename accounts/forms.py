@@ -19,6 +19,8 @@ from django.utils.timezone import localtime
 from django.contrib.contenttypes.models import ContentType
 
 # Local App Imports
+from . import recurrence
+from .merge_fields import FIELDS as MERGE_FIELDS, unknown_fields
 from .models import (
     Branch, ClassArm, Communication, CommunicationAttachment, 
     CommunicationComment, CommunicationRecipient, CommunicationTargetGroup,
@@ -535,6 +537,11 @@ class ParentCreationForm(forms.ModelForm):
         ('email', 'Email'),
         ('sms', 'SMS')
     ])
+    digest_frequency = forms.ChoiceField(
+        choices=ParentProfile.DIGEST_CHOICES,
+        initial='off',
+        label="Email digest of posts and news"
+    )
 
     class Meta:
         model = CustomUser
@@ -578,6 +585,7 @@ class ParentCreationForm(forms.ModelForm):
                 self.fields['address'].initial = profile.address
                 self.fields['occupation'].initial = profile.occupation
                 self.fields['preferred_contact_method'].initial = profile.preferred_contact_method
+                self.fields['digest_frequency'].initial = profile.digest_frequency
                 self.fields['phone_number'].initial = profile.phone_number
                 self.fields['parent_number'].initial = profile.parent_number
             except ParentProfile.DoesNotExist:
@@ -668,6 +676,7 @@ class ParentCreationForm(forms.ModelForm):
                 profile.phone_number = self.cleaned_data['phone_number']
                 profile.occupation = self.cleaned_data['occupation']
                 profile.preferred_contact_method = self.cleaned_data['preferred_contact_method']
+                profile.digest_frequency = self.cleaned_data['digest_frequency']
                 profile.relationship_to_student = self.cleaned_data['relationship_to_student']
                 profile.nationality = self.cleaned_data['nationality']
                 profile.state = self.cleaned_data['state']
@@ -873,6 +882,19 @@ class CommunicationForm(forms.ModelForm):
         ),
         required=False
     )
+    repeat = forms.CharField(
+        required=False,
+        max_length=255,
+        label="Repeat",
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'e.g. 0 7 * * 1-5 or FREQ=WEEKLY;BYDAY=FR;BYHOUR=15;BYMINUTE=0',
+        }),
+        help_text=(
+            "Send this message again on a schedule: a cron expression (minute hour day month weekday) "
+            "or an RRULE. Starts from the scheduled time, if one is set."
+        ),
+    )
     class Meta:
         model = Communication
         fields = [
@@ -928,6 +950,10 @@ class CommunicationForm(forms.ModelForm):
             self.fields['message_type'].choices = [('', '--------------')] + filtered_choices
             self.fields['title'].required = True  
             self.fields['body'].required = True  
+            self.fields['body'].help_text = (
+                "Personalise with merge fields, filled in for each recipient: "
+                + ", ".join('{{ %s }}' % name for name in MERGE_FIELDS)
+            )
 
     def clean(self):
         cleaned_data = super().clean()
@@ -944,6 +970,12 @@ class CommunicationForm(forms.ModelForm):
             self.add_error('title', "Title is required.")
         if not body:
             self.add_error('body', "Body is required.")
+        elif unknown_fields(body):
+            self.add_error(
+                'body',
+                f"Unknown merge field(s): {', '.join(unknown_fields(body))}. "
+                f"Available: {', '.join('{{ %s }}' % name for name in MERGE_FIELDS)}."
+            )
 
         # Validate manual emails
         if manual_emails:
@@ -963,6 +995,17 @@ class CommunicationForm(forms.ModelForm):
         if scheduled_time and scheduled_time < timezone.now():
             self.add_error('scheduled_time', "Scheduled time cannot be in the past.")
 
+        repeat = (cleaned_data.get('repeat') or '').strip()
+        if repeat:
+            try:
+                occurrence = recurrence.next_occurrence(repeat, timezone.now(), scheduled_time or timezone.now())
+            except ValueError as e:
+                self.add_error('repeat', str(e))
+            else:
+                if occurrence is None:
+                    self.add_error('repeat', "This rule has no upcoming occurrences.")
+        cleaned_data['repeat'] = repeat
+
         return cleaned_data
 
 from django.forms.widgets import CheckboxSelectMultiple
@@ -1497,45 +1540,43 @@ class CommunicationTargetGroupForm(forms.ModelForm):
                     role__in=roles,
                     staff_type=s_type,
                     **{position_field: positions}
-                ).values_list('id', flat=True)
+                ).values('id')
 
                 if not positions:
                     return qs.filter(id__in=direct_ids)
 
-                # Only run this logic if positions are valid
-                result_ids = set(direct_ids)
-
-                if positions:
-                    # use TeachingPosition for type detection
-                    position_model = TeachingPosition if position_field.startswith('teaching') else StaffProfile
-                    content_type = ContentType.objects.get_for_model(position_model)
+                # use TeachingPosition for type detection
+                position_model = TeachingPosition if position_field.startswith('teaching') else StaffProfile
+                content_type = ContentType.objects.get_for_model(position_model)
 
-                    via_profile_ids = StaffProfile.objects.filter(
-                        position_content_type=content_type,
-                        position_object_id__in=positions,
-                        user__role__in=roles,
-                        user__staff_type=s_type
-                    ).values_list('user_id', flat=True)
+                via_profile_ids = StaffProfile.objects.filter(
+                    position_content_type=content_type,
+                    position_object_id__in=positions,
+                    user__role__in=roles,
+                    user__staff_type=s_type
+                ).values('user_id')
 
-                    result_ids.update(via_profile_ids)
+                # The audience is a union of subqueries evaluated by the database,
+                # so no ID sets are built in Python or sent back as IN lists
+                condition = Q(id__in=direct_ids) | Q(id__in=via_profile_ids)
 
-                    if any(getattr(p, 'is_class_teacher', False) for p in TeachingPosition.objects.filter(id__in=positions)):
-                        teaching_ct = ContentType.objects.get_for_model(TeachingPosition)
-                        class_teacher_ids = TeachingPosition.objects.filter(is_class_teacher=True).values_list('id', flat=True)
+                if TeachingPosition.objects.filter(id__in=positions, is_class_teacher=True).exists():
+                    teaching_ct = ContentType.objects.get_for_model(TeachingPosition)
+                    class_teacher_ids = TeachingPosition.objects.filter(is_class_teacher=True).values('id')
 
-                        staff_profiles = StaffProfile.objects.filter(
-                            position_content_type=teaching_ct,
-                            position_object_id__in=class_teacher_ids
-                        )
+                    staff_profiles = StaffProfile.objects.filter(
+                        position_content_type=teaching_ct,
+                        position_object_id__in=class_teacher_ids
+                    )
 
-                        if student_class:
-                            staff_profiles = staff_profiles.filter(managing_class_id=student_class)
-                        if class_arm:
-                            staff_profiles = staff_profiles.filter(managing_class_arm_id=class_arm)
+                    if student_class:
+                        staff_profiles = staff_profiles.filter(managing_class_id=student_class)
+                    if class_arm:
+                        staff_profiles = staff_profiles.filter(managing_class_arm_id=class_arm)
 
-                        result_ids.update(staff_profiles.values_list('user_id', flat=True))
+                    condition |= Q(id__in=staff_profiles.values('user_id'))
 
-                return qs.filter(id__in=result_ids)
+                return qs.filter(condition)
 
             user_role = self.user.role
 
@@ -1677,10 +1718,34 @@ class CommunicationCommentForm(forms.ModelForm):
         model = CommunicationComment
         fields = ['comment']
 
+class ReplyAttachmentModelForm(CommunicationAttachmentModelForm):
+    class Meta:
+        model = ReplyAttachment
+        fields = ['file']
+
+
 ReplyAttachmentFormSet = inlineformset_factory(
     MessageReply,  # Parent model for replies
     ReplyAttachment,  # Child model for reply attachments
-    fields=["file"],
+    form=ReplyAttachmentModelForm,
     extra=1,
+    max_num=settings.MAX_ATTACHMENT_COUNT,
+    validate_max=True,
     can_delete=True
 )
+
+
+class RosterImportForm(forms.Form):
+    file = forms.FileField(help_text="A .csv or .xlsx roster with a header row.")
+    branch = forms.ModelChoiceField(
+        queryset=Branch.objects.all(),
+        required=False,
+        help_text="Used for rows that leave the branch column empty."
+    )
+    dry_run = forms.BooleanField(required=False, label="Validate only (do not create users)")
+
+    def clean_file(self):
+        file = self.cleaned_data.get('file')
+        if file and not file.name.lower().endswith(('.csv', '.xlsx')):
+            raise ValidationError("Upload a .csv or .xlsx file.")
+        return file
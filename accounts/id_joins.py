@@ -0,0 +1,103 @@
+"""
+Filtering querysets by large sets of IDs.
+
+``filter(id__in=[...])`` with tens of thousands of IDs sends a statement of several
+hundred KB that MySQL must parse and range-optimise on every execution (and that can
+exceed ``max_allowed_packet``); SQLite refuses more than 32766 parameters outright.
+``id_join`` yields a value for ``filter(<field>__in=...)`` instead:
+
+* below ``ID_JOIN_THRESHOLD`` IDs, the plain list;
+* ``ID_JOIN_STRATEGY = 'temp_table'`` - a session temporary table with a primary key,
+  filled in batches, that the query joins against;
+* ``ID_JOIN_STRATEGY = 'values'`` - a derived table of inlined ``VALUES`` rows in
+  chunks joined by ``UNION ALL``, for connections without the CREATE TEMPORARY TABLES
+  privilege (e.g. behind some poolers or on a read replica).
+
+Querysets using the yielded value must be evaluated inside the block, on the same
+database connection. A MySQL temporary table cannot be opened twice in one
+statement, so use it in one subquery per query.
+"""
+# Standard Library
+import uuid
+from contextlib import contextmanager
+
+# Django Core
+from django.conf import settings
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+ID_JOIN_THRESHOLD = getattr(settings, 'ID_JOIN_THRESHOLD', 1000)
+ID_JOIN_STRATEGY = getattr(settings, 'ID_JOIN_STRATEGY', 'temp_table')
+
+# Rows per INSERT when filling a temporary ID table
+TEMP_TABLE_BATCH = 5000
+# Rows per VALUES list in the derived-table strategy
+VALUES_CHUNK = 1000
+
+STRATEGIES = ('in', 'temp_table', 'values')
+
+
+def _clean(ids):
+    # IDs are inlined (VALUES) or bulk-inserted, so coerce and dedupe them first
+    return sorted({int(pk) for pk in ids})
+
+
+@contextmanager
+def _temp_table(ids, using):
+    connection = connections[using]
+    table = f"tmp_ids_{uuid.uuid4().hex[:12]}"
+    quoted = connection.ops.quote_name(table)
+    column = 'BIGINT' if connection.vendor == 'postgresql' else 'INTEGER'
+    if connection.vendor == 'mysql':
+        column = 'INT UNSIGNED'
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE TEMPORARY TABLE {quoted} (id {column} NOT NULL PRIMARY KEY)")
+        try:
+            for start in range(0, len(ids), TEMP_TABLE_BATCH):
+                cursor.executemany(
+                    f"INSERT INTO {quoted} (id) VALUES (%s)",
+                    [(pk,) for pk in ids[start:start + TEMP_TABLE_BATCH]],
+                )
+            yield RawSQL(f"SELECT id FROM {quoted}", ())
+        finally:
+            drop = 'DROP TEMPORARY TABLE' if connection.vendor == 'mysql' else 'DROP TABLE'
+            cursor.execute(f"{drop} {quoted}")
+
+
+def values_sql(ids, vendor):
+    """A ``SELECT`` of ``ids`` from chunked ``VALUES`` rows, with the IDs inlined."""
+    selects = []
+    for start in range(0, len(ids), VALUES_CHUNK):
+        chunk = ids[start:start + VALUES_CHUNK]
+        if vendor == 'mysql':
+            rows = ','.join(f"ROW({pk})" for pk in chunk)
+            selects.append(f"SELECT v.id FROM (VALUES {rows}) AS v (id)")
+        elif vendor == 'postgresql':
+            rows = ','.join(f"({pk})" for pk in chunk)
+            selects.append(f"SELECT v.id FROM (VALUES {rows}) AS v (id)")
+        else:
+            rows = ','.join(f"({pk})" for pk in chunk)
+            selects.append(f"SELECT column1 FROM (VALUES {rows})")
+    return ' UNION ALL '.join(selects)
+
+
+@contextmanager
+def id_join(ids, using='default', strategy=None):
+    """
+    Yield ``ids`` in a form ``filter(<field>__in=...)`` can join against cheaply:
+    a list below ``ID_JOIN_THRESHOLD``, otherwise a ``RawSQL`` subquery built with
+    ``strategy`` (default ``ID_JOIN_STRATEGY``; see the module docstring).
+    """
+    ids = _clean(ids)
+    strategy = strategy or ID_JOIN_STRATEGY
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown ID join strategy '{strategy}'")
+
+    if strategy == 'in' or not ids or len(ids) < ID_JOIN_THRESHOLD:
+        yield ids
+    elif strategy == 'values':
+        yield RawSQL(values_sql(ids, connections[using].vendor), ())
+    else:
+        with _temp_table(ids, using) as subquery:
+            yield subquery
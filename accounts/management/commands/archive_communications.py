@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.archive import archive_communications
+
+
+class Command(BaseCommand):
+    help = (
+        "Move sent communications older than a cutoff (recipients, replies, attachment "
+        "references) out of the live tables into cold-storage archive tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int,
+                            help=f"Defaults to COMMUNICATION_ARCHIVE_AFTER_DAYS "
+                                 f"({settings.COMMUNICATION_ARCHIVE_AFTER_DAYS}).")
+        parser.add_argument('--before', help="Archive messages sent before this date (YYYY-MM-DD), "
+                                             "e.g. the start of the current academic session.")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--export-dir', help="Also write each batch as a .jsonl.gz file here.")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many would be archived.")
+
+    def handle(self, *args, **options):
+        if options['before'] and options['older_than_days'] is not None:
+            raise CommandError("Use either --before or --older-than-days, not both.")
+
+        if options['before']:
+            try:
+                day = datetime.strptime(options['before'], '%Y-%m-%d')
+            except ValueError:
+                raise CommandError("--before must be a date in YYYY-MM-DD format.")
+            before = timezone.make_aware(day)
+        else:
+            days = options['older_than_days']
+            if days is None:
+                days = settings.COMMUNICATION_ARCHIVE_AFTER_DAYS
+            before = timezone.now() - timedelta(days=days)
+
+        result = archive_communications(
+            before=before,
+            batch_size=options['batch_size'],
+            export_dir=options['export_dir'],
+            dry_run=options['dry_run'],
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f"{result.communications} communication(s) sent before {before:%Y-%m-%d %H:%M} would be archived.")
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {result.communications} communication(s), {result.recipients} recipient row(s) "
+            f"and {result.replies} repl(ies) in {result.batches} batch(es); "
+            f"pruned {result.snapshots} unused audience snapshot(s)."
+        ))
+        for path in result.files:
+            self.stdout.write(f"  exported {path}")
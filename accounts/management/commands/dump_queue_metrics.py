@@ -0,0 +1,70 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.metrics import read_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge the per-worker Celery task metric snapshots and print queue wait and "
+        "run times per queue (or JSON)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help="Snapshot directory (defaults to TASK_METRICS_SNAPSHOT_DIR).")
+        parser.add_argument('--json', action='store_true', help="Print merged metrics as JSON.")
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or getattr(settings, 'TASK_METRICS_SNAPSHOT_DIR', None)
+        if not directory:
+            raise CommandError("No snapshot directory. Set TASK_METRICS_SNAPSHOT_DIR for the workers or pass --dir.")
+
+        snapshots = read_snapshots(directory, prefix='tasks')
+        if not snapshots:
+            self.stdout.write(f"No snapshots found in {directory}.")
+            return
+
+        merged = merge_snapshots(snapshots)
+        if options['json']:
+            self.stdout.write(json.dumps(merged, indent=2))
+            return
+
+        self.stdout.write(f"{len(snapshots)} worker snapshot(s) from {directory}\n")
+        header = (
+            f"{'queue':12} {'tasks':>7} {'failed':>7} {'avg wait ms':>12} {'max wait ms':>12} "
+            f"{'avg run ms':>11} {'max run ms':>11}"
+        )
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for queue, entry in sorted(merged.items()):
+            self.stdout.write(
+                f"{queue[:12]:12} {entry['count']:>7} {entry['failures']:>7} {entry['avg_wait_ms']:>12.1f} "
+                f"{entry['max_wait_ms']:>12.1f} {entry['avg_run_ms']:>11.1f} {entry['max_run_ms']:>11.1f}"
+            )
+
+
+def merge_snapshots(snapshots):
+    """Combine per-process summaries, weighting averages by task count."""
+    merged = {}
+    for snapshot in snapshots:
+        for queue, entry in snapshot['queues'].items():
+            target = merged.setdefault(queue, {
+                'count': 0, 'failures': 0, 'avg_wait_ms': 0.0, 'max_wait_ms': 0.0,
+                'avg_run_ms': 0.0, 'max_run_ms': 0.0, 'wait_histogram': {},
+            })
+            total = target['count'] + entry['count']
+            if not total:
+                continue
+            for key in ('avg_wait_ms', 'avg_run_ms'):
+                target[key] = round(
+                    (target[key] * target['count'] + entry[key] * entry['count']) / total, 3
+                )
+            target['count'] = total
+            target['failures'] += entry['failures']
+            target['max_wait_ms'] = max(target['max_wait_ms'], entry['max_wait_ms'])
+            target['max_run_ms'] = max(target['max_run_ms'], entry['max_run_ms'])
+            for bucket, n in entry['wait_histogram'].items():
+                target['wait_histogram'][bucket] = target['wait_histogram'].get(bucket, 0) + n
+    return merged
@@ -0,0 +1,84 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.metrics import read_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge the per-worker request metric snapshots written by QueryTimingMiddleware "
+        "and print a per-URL summary (or JSON)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help="Snapshot directory (defaults to REQUEST_METRICS_SNAPSHOT_DIR).")
+        parser.add_argument('--json', action='store_true', help="Print merged metrics as JSON.")
+        parser.add_argument('--sort', default='avg_ms',
+                            choices=['avg_ms', 'max_ms', 'count', 'avg_queries', 'avg_sql_ms'])
+        parser.add_argument('--duplicates', action='store_true',
+                            help="Also list the most repeated query fingerprints per URL.")
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or getattr(settings, 'REQUEST_METRICS_SNAPSHOT_DIR', None)
+        if not directory:
+            raise CommandError(
+                "No snapshot directory. Set REQUEST_METRICS_SNAPSHOT_DIR for the web workers "
+                "or pass --dir; live numbers for one worker are at /metrics/requests/."
+            )
+
+        snapshots = read_snapshots(directory)
+        if not snapshots:
+            self.stdout.write(f"No snapshots found in {directory}.")
+            return
+
+        merged = merge_snapshots(snapshots)
+        if options['json']:
+            self.stdout.write(json.dumps(merged, indent=2))
+            return
+
+        self.stdout.write(f"{len(snapshots)} worker snapshot(s) from {directory}\n")
+        header = f"{'url':45} {'count':>7} {'avg ms':>9} {'max ms':>9} {'queries':>8} {'sql ms':>8} {'tpl ms':>8}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        rows = sorted(merged.items(), key=lambda item: item[1][options['sort']], reverse=True)
+        for url, entry in rows:
+            self.stdout.write(
+                f"{url[:45]:45} {entry['count']:>7} {entry['avg_ms']:>9.1f} {entry['max_ms']:>9.1f} "
+                f"{entry['avg_queries']:>8.1f} {entry['avg_sql_ms']:>8.1f} {entry['avg_template_ms']:>8.1f}"
+            )
+            if options['duplicates']:
+                for dup in entry['top_duplicate_queries'][:5]:
+                    self.stdout.write(f"    x{dup['repeats']:<5} {dup['fingerprint'][:120]}")
+
+
+def merge_snapshots(snapshots):
+    """Combine per-process summaries, weighting averages by request count."""
+    merged = {}
+    for snapshot in snapshots:
+        for url, entry in snapshot['urls'].items():
+            target = merged.setdefault(url, {
+                'count': 0, 'avg_ms': 0.0, 'max_ms': 0.0, 'avg_queries': 0.0, 'max_queries': 0,
+                'avg_sql_ms': 0.0, 'avg_template_ms': 0.0, 'histogram': {}, 'top_duplicate_queries': [],
+            })
+            total = target['count'] + entry['count']
+            if not total:
+                continue
+            for key in ('avg_ms', 'avg_queries', 'avg_sql_ms', 'avg_template_ms'):
+                target[key] = round(
+                    (target[key] * target['count'] + entry[key] * entry['count']) / total, 3
+                )
+            target['count'] = total
+            target['max_ms'] = max(target['max_ms'], entry['max_ms'])
+            target['max_queries'] = max(target['max_queries'], entry['max_queries'])
+            for bucket, n in entry['histogram'].items():
+                target['histogram'][bucket] = target['histogram'].get(bucket, 0) + n
+            repeats = {d['fingerprint']: d['repeats'] for d in target['top_duplicate_queries']}
+            for dup in entry['top_duplicate_queries']:
+                repeats[dup['fingerprint']] = repeats.get(dup['fingerprint'], 0) + dup['repeats']
+            target['top_duplicate_queries'] = [
+                {'fingerprint': fp, 'repeats': n}
+                for fp, n in sorted(repeats.items(), key=lambda item: item[1], reverse=True)[:10]
+            ]
+    return merged
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+
+from accounts.synthetic import SIZES, SchoolGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic synthetic school (branches, classes x arms, staff, parents, "
+        "students and historical communications) for load testing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=sorted(SIZES), default='small',
+                            help="Preset sizes; individual options below override them.")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--prefix', default='synth',
+                            help="Namespace for generated emails, usernames and branch names.")
+        parser.add_argument('--branches', type=int)
+        parser.add_argument('--classes', type=int)
+        parser.add_argument('--arms', type=int)
+        parser.add_argument('--students-per-arm', type=int)
+        parser.add_argument('--staff-per-branch', type=int)
+        parser.add_argument('--communications', type=int)
+        parser.add_argument('--audience-size', type=int, help="Recipients per historical communication.")
+        parser.add_argument('--scheduled', type=int, help="Due, unsent scheduled communications.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--reset', action='store_true',
+                            help="Delete an existing dataset with the same prefix first.")
+
+    def handle(self, *args, **options):
+        overrides = {
+            key: options[key]
+            for key in ['branches', 'classes', 'arms', 'students_per_arm', 'staff_per_branch',
+                        'communications', 'audience_size', 'scheduled']
+            if options[key] is not None
+        }
+        generator = SchoolGenerator.from_size(
+            options['size'],
+            seed=options['seed'],
+            prefix=options['prefix'],
+            batch_size=options['batch_size'],
+            stdout=self.stdout,
+            **overrides
+        )
+
+        if options['reset']:
+            generator.reset()
+
+        counts = generator.build()
+        summary = ", ".join(f"{count} {name}" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Synthetic school '{options['prefix']}' ready: {summary}."))
@@ -0,0 +1,58 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from accounts.thumbnails import DEFAULT_PICTURE, THUMBNAIL_SIZES, ensure_thumbnails
+
+
+def _init_worker(settings_module):
+    # Needed when the pool uses the "spawn" start method (Windows/macOS).
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+def _generate(name, force):
+    return name, ensure_thumbnails(name, force=force)
+
+
+class Command(BaseCommand):
+    help = (
+        f"Backfill {'/'.join(map(str, THUMBNAIL_SIZES))}px thumbnails for every profile picture "
+        f"referenced by a user, using a process pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--force', action='store_true', help="Regenerate thumbnails that already exist.")
+        parser.add_argument('--chunksize', type=int, default=16)
+
+    def handle(self, *args, **options):
+        names = list(
+            get_user_model().objects.exclude(profile_picture__in=['', DEFAULT_PICTURE])
+            .exclude(profile_picture__isnull=True)
+            .values_list('profile_picture', flat=True).distinct()
+        )
+        if not names:
+            self.stdout.write("No profile pictures to process.")
+            return
+
+        self.stdout.write(f"Processing {len(names)} picture(s) with {options['workers']} worker(s)...")
+        written = 0
+        force = options['force']
+        if options['workers'] > 1:
+            with ProcessPoolExecutor(
+                max_workers=options['workers'],
+                initializer=_init_worker,
+                initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'lagooz_coms.settings'),),
+            ) as pool:
+                results = pool.map(_generate, names, [force] * len(names), chunksize=options['chunksize'])
+                for _, count in results:
+                    written += count
+        else:
+            for name in names:
+                written += _generate(name, force)[1]
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} thumbnail(s) for {len(names)} picture(s)."))
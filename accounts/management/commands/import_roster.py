@@ -0,0 +1,62 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import Branch
+from accounts.roster_import import DEFAULT_BATCH_SIZE, RosterImporter, read_roster
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-import students, parents and staff from a CSV or XLSX roster. "
+        "Required columns: role, email, gender. Students also need parent_email; "
+        "list parents before their children."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Path to a .csv or .xlsx roster file.")
+        parser.add_argument('--branch', help="Default branch name for rows without a branch column.")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=None, help="Password hashing processes.")
+        parser.add_argument('--dry-run', action='store_true', help="Validate only; nothing is written.")
+        parser.add_argument('--errors', help="Write rejected rows to this CSV file.")
+
+    def handle(self, *args, **options):
+        default_branch = None
+        if options['branch']:
+            try:
+                default_branch = Branch.objects.get(name=options['branch'])
+            except Branch.DoesNotExist:
+                raise CommandError(f"Branch '{options['branch']}' does not exist.")
+
+        importer = RosterImporter(
+            batch_size=options['batch_size'],
+            hash_workers=options['workers'],
+            default_branch=default_branch,
+            allow_superadmin=True,
+            dry_run=options['dry_run'],
+        )
+
+        path = options['path']
+        try:
+            with open(path, 'rb') as roster:
+                result = importer.run(read_roster(roster, path))
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for error in result.errors:
+            self.stderr.write(f"Line {error.line} ({error.email or 'no email'}): {error.message}")
+
+        if options['errors'] and result.errors:
+            with open(options['errors'], 'w', newline='') as out:
+                writer = csv.writer(out)
+                writer.writerow(['line', 'email', 'error'])
+                for error in result.errors:
+                    writer.writerow([error.line, error.email, error.message])
+
+        summary = ", ".join(f"{count} {role}" for role, count in result.created.items() if count)
+        verb = "Validated" if options['dry_run'] else "Created"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result.total_created} of {result.rows_read} rows ({summary or 'none'}); "
+            f"{len(result.errors)} rejected."
+        ))
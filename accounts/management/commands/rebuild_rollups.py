@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accounts import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the dashboard rollup tables (per-user counters, per-branch daily "
+        "message stats, branch user totals and per-communication reply counts) from the source tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30,
+                            help="How many past days of BranchDailyStats to rebuild (including today).")
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        for offset in range(options['days']):
+            rollups.rebuild_daily_stats(today - timedelta(days=offset))
+        self.stdout.write(f"Rebuilt daily stats for {options['days']} day(s).")
+
+        branches = rollups.refresh_branch_stats()
+        self.stdout.write(f"Refreshed totals for {branches} branch(es).")
+
+        corrected = rollups.rebuild_reply_counts()
+        self.stdout.write(f"Corrected reply counts on {corrected} communication(s).")
+
+        users = rollups.rebuild_user_stats()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt message counters for {users} user(s)."))
@@ -0,0 +1,182 @@
+"""
+Merge fields in message bodies.
+
+A body such as ``Dear {{ parent_name }}, {{ student_name }}'s results are ready`` is
+sent as one communication and personalised per recipient, instead of one ``personal``
+message (and one set of rows and sends) per family:
+
+* the body is compiled once into a ``str.format`` template (``compile_body`` is
+  cached by body text), so rendering a recipient is a single ``format_map`` call;
+* ``variables`` prefetches the fields the body uses for a whole audience in at most
+  three queries (users, their student profiles, their children);
+* nothing rendered is stored: the inbox renders the reader's copy when it is read
+  (``render_for``, one set of queries per request), and delivery renders each
+  batch's bodies in bulk (``render_rows``).
+
+Recipients without a user (manual email addresses) and missing values get
+``DEFAULTS``. Unknown ``{{ names }}`` are rejected when the message is composed.
+"""
+# Standard Library
+import re
+from collections import defaultdict
+from functools import lru_cache
+
+FIELDS = {
+    'first_name': "Recipient's first name",
+    'last_name': "Recipient's last name",
+    'full_name': "Recipient's full name",
+    'parent_name': "Parent's name (the recipient, or a student's parent)",
+    'student_name': "Student's name (the recipient, or a parent's children)",
+    'class_name': "Student's class and arm",
+    'branch_name': "Recipient's branch",
+}
+DEFAULTS = {
+    'first_name': '',
+    'last_name': '',
+    'full_name': 'Parent/Guardian',
+    'parent_name': 'Parent/Guardian',
+    'student_name': 'your child',
+    'class_name': '',
+    'branch_name': '',
+}
+# Fields read from the recipient's own student profile or their children's
+STUDENT_FIELDS = {'parent_name', 'student_name', 'class_name'}
+
+FIELD_PATTERN = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+
+
+class CompiledBody:
+    def __init__(self, body):
+        self.body = body
+        self.fields = frozenset(name for name in FIELD_PATTERN.findall(body) if name in FIELDS)
+        parts = []
+        position = 0
+        for match in FIELD_PATTERN.finditer(body):
+            if match.group(1) not in FIELDS:
+                continue
+            parts.append(body[position:match.start()].replace('{', '{{').replace('}', '}}'))
+            parts.append(f"{{{match.group(1)}}}")
+            position = match.end()
+        parts.append(body[position:].replace('{', '{{').replace('}', '}}'))
+        self.template = ''.join(parts)
+
+    def render(self, values):
+        if not self.fields:
+            return self.body
+        return self.template.format_map(values)
+
+
+@lru_cache(maxsize=256)
+def compile_body(body):
+    return CompiledBody(body or '')
+
+
+def unknown_fields(body):
+    return sorted({name for name in FIELD_PATTERN.findall(body or '') if name not in FIELDS})
+
+
+def _name(first, last):
+    return f"{first or ''} {last or ''}".strip()
+
+
+def _join(names):
+    names = [name for name in dict.fromkeys(names) if name]
+    if len(names) < 2:
+        return ''.join(names)
+    return f"{', '.join(names[:-1])} and {names[-1]}"
+
+
+def variables(users, fields=FIELDS):
+    """``{user_id: {field: value}}`` for the users of queryset ``users``."""
+    from .models import StudentProfile
+
+    values = {}
+    for pk, first, last, role, branch in users.values_list('id', 'first_name', 'last_name', 'role', 'branch__name'):
+        full_name = _name(first, last)
+        values[pk] = {
+            **DEFAULTS,
+            'first_name': first or '',
+            'last_name': last or '',
+            'full_name': full_name or DEFAULTS['full_name'],
+            'branch_name': branch or '',
+            'parent_name': (full_name if role == 'parent' else '') or DEFAULTS['parent_name'],
+        }
+    if not STUDENT_FIELDS & set(fields):
+        return values
+
+    def class_name(class_, arm):
+        return ' '.join(filter(None, [class_, arm]))
+
+    # Students: their own name and class, and their parent
+    students = StudentProfile.objects.filter(user__in=users).values_list(
+        'user_id', 'user__first_name', 'user__last_name', 'guardian_name',
+        'parent__user__first_name', 'parent__user__last_name',
+        'current_class__name', 'current_class_arm__name',
+    )
+    for pk, first, last, guardian, parent_first, parent_last, class_, arm in students:
+        values[pk].update(
+            student_name=_name(first, last) or DEFAULTS['student_name'],
+            parent_name=_name(parent_first, parent_last) or guardian or DEFAULTS['parent_name'],
+            class_name=class_name(class_, arm),
+        )
+
+    # Parents: their children's first names and classes
+    children = defaultdict(list)
+    rows = StudentProfile.objects.filter(parent__user__in=users).order_by('user__first_name').values_list(
+        'parent__user_id', 'user__first_name', 'current_class__name', 'current_class_arm__name',
+    )
+    for parent_id, first, class_, arm in rows:
+        children[parent_id].append((first, class_name(class_, arm)))
+    for parent_id, kids in children.items():
+        values[parent_id].update(
+            student_name=_join(first for first, _ in kids) or DEFAULTS['student_name'],
+            class_name=_join(name for _, name in kids),
+        )
+    return values
+
+
+def render_many(communication, users):
+    """``{user_id: body}`` for the users of queryset ``users``."""
+    compiled = compile_body(communication.body)
+    if not compiled.fields:
+        return {}
+    return {pk: compiled.render(values) for pk, values in variables(users, compiled.fields).items()}
+
+
+def render_rows(communication, row_ids=None):
+    """
+    ``{row_id: body}`` for the communication's recipient rows (all, or ``row_ids``);
+    empty when the body has no merge fields.
+    """
+    from .id_joins import id_join
+    from .models import CommunicationRecipient, CustomUser
+
+    compiled = compile_body(communication.body)
+    if not compiled.fields:
+        return {}
+
+    rows = CommunicationRecipient.objects.filter(communication=communication)
+    with id_join(row_ids or []) as joined_ids:
+        if row_ids is not None:
+            rows = rows.filter(id__in=joined_ids)
+        owners = dict(rows.values_list('id', 'recipient_id'))
+        values = variables(CustomUser.objects.filter(id__in=rows.values('recipient_id')), compiled.fields)
+    default = compiled.render(DEFAULTS)
+    return {
+        row_id: compiled.render(values[user_id]) if user_id in values else default
+        for row_id, user_id in owners.items()
+    }
+
+
+def render_for(communication, user):
+    """The body as ``user`` reads it; their values are fetched once per user object."""
+    from .models import CustomUser
+
+    compiled = compile_body(communication.body)
+    if not compiled.fields:
+        return compiled.body
+    values = getattr(user, '_merge_values', None)
+    if values is None:
+        values = variables(CustomUser.objects.filter(pk=user.pk)).get(user.pk, DEFAULTS)
+        user._merge_values = values
+    return compiled.render(values)
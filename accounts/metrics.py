@@ -0,0 +1,262 @@
+# Standard Library
+import bisect
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+
+# Django Core
+from django.conf import settings
+
+
+# Latency histogram bucket upper bounds in milliseconds
+BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf')]
+# Celery queue-wait bucket upper bounds in milliseconds (waits behind bulk work run to minutes)
+QUEUE_BUCKETS_MS = [100, 500, 1000, 5000, 15000, 60000, 300000, float('inf')]
+# Cap on distinct duplicate-query fingerprints remembered per URL
+MAX_FINGERPRINTS = 50
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"IN \((?:\s*(?:\?|%s)\s*,?)+\)", re.IGNORECASE)
+_SPACE_RE = re.compile(r"\s+")
+
+# Per-request template timing; outermost render only, so includes are not double counted
+_template_state = ContextVar('template_state', default=None)
+
+
+def fingerprint(sql):
+    """Normalise SQL so queries that differ only by literal values compare equal."""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """``connection.execute_wrapper`` hook that counts, times and fingerprints SQL."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        return {fp: n for fp, n in self.fingerprints.items() if n > 1}
+
+
+class TemplateTimer:
+    def __init__(self):
+        self.duration = 0.0
+        self.depth = 0
+
+    def __enter__(self):
+        self.token = _template_state.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _template_state.reset(self.token)
+
+
+def instrument_templates():
+    """Wrap ``Template.render`` once so render time can be attributed to the request."""
+    from django.template.base import Template
+
+    if getattr(Template.render, '_lagooz_timed', False):
+        return
+
+    original_render = Template.render
+
+    def timed_render(self, context):
+        timer = _template_state.get()
+        if timer is None:
+            return original_render(self, context)
+        timer.depth += 1
+        start = time.perf_counter()
+        try:
+            return original_render(self, context)
+        finally:
+            timer.depth -= 1
+            if timer.depth == 0:
+                timer.duration += time.perf_counter() - start
+
+    timed_render._lagooz_timed = True
+    Template.render = timed_render
+
+
+class RequestMetrics:
+    """Thread-safe, in-process aggregation of per-URL request statistics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+        self._last_snapshot = time.monotonic()
+
+    def _empty(self):
+        return {
+            'count': 0,
+            'total_ms': 0.0,
+            'max_ms': 0.0,
+            'queries': 0,
+            'max_queries': 0,
+            'sql_ms': 0.0,
+            'template_ms': 0.0,
+            'buckets': [0] * len(BUCKETS_MS),
+            'duplicates': Counter(),
+        }
+
+    def record(self, key, total_ms, queries, sql_ms, template_ms, duplicates):
+        with self._lock:
+            entry = self._data.setdefault(key, self._empty())
+            entry['count'] += 1
+            entry['total_ms'] += total_ms
+            entry['max_ms'] = max(entry['max_ms'], total_ms)
+            entry['queries'] += queries
+            entry['max_queries'] = max(entry['max_queries'], queries)
+            entry['sql_ms'] += sql_ms
+            entry['template_ms'] += template_ms
+            entry['buckets'][bisect.bisect_left(BUCKETS_MS, total_ms)] += 1
+            for fp, n in duplicates.items():
+                if fp in entry['duplicates'] or len(entry['duplicates']) < MAX_FINGERPRINTS:
+                    entry['duplicates'][fp] += n
+        self._maybe_snapshot()
+
+    def snapshot(self):
+        with self._lock:
+            return {key: _serialise(entry) for key, entry in self._data.items()}
+
+    def reset(self):
+        with self._lock:
+            self._data = {}
+
+    def _maybe_snapshot(self):
+        directory = getattr(settings, 'REQUEST_METRICS_SNAPSHOT_DIR', None)
+        interval = getattr(settings, 'REQUEST_METRICS_SNAPSHOT_INTERVAL', 30)
+        if not directory or time.monotonic() - self._last_snapshot < interval:
+            return
+        self._last_snapshot = time.monotonic()
+        write_snapshot(self.snapshot(), directory)
+
+
+def _serialise(entry):
+    count = entry['count'] or 1
+    return {
+        'count': entry['count'],
+        'avg_ms': round(entry['total_ms'] / count, 3),
+        'max_ms': round(entry['max_ms'], 3),
+        'avg_queries': round(entry['queries'] / count, 2),
+        'max_queries': entry['max_queries'],
+        'avg_sql_ms': round(entry['sql_ms'] / count, 3),
+        'avg_template_ms': round(entry['template_ms'] / count, 3),
+        'histogram': {
+            ('+Inf' if bound == float('inf') else f"<={bound}ms"): n
+            for bound, n in zip(BUCKETS_MS, entry['buckets'])
+        },
+        'top_duplicate_queries': [
+            {'fingerprint': fp, 'repeats': n} for fp, n in entry['duplicates'].most_common(10)
+        ],
+    }
+
+
+def write_snapshot(data, directory, prefix='metrics', key='urls'):
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    target = path / f"{prefix}-{os.getpid()}.json"
+    tmp = target.with_suffix('.tmp')
+    with open(tmp, 'w') as fh:
+        json.dump({'pid': os.getpid(), 'written_at': time.time(), key: data}, fh)
+    os.replace(tmp, target)
+
+
+def read_snapshots(directory, prefix='metrics'):
+    """Load the per-process snapshot files written by web (or, with ``prefix='tasks'``, Celery) workers."""
+    snapshots = []
+    for path in sorted(Path(directory).glob(f"{prefix}-*.json")):
+        with open(path) as fh:
+            snapshots.append(json.load(fh))
+    return snapshots
+
+
+class TaskMetrics:
+    """
+    Per-queue Celery latency: how long tasks waited in the queue (publish to start,
+    stamped by the ``before_task_publish`` hook in lagooz_coms/celery.py) and how long
+    they ran. Snapshots go to ``TASK_METRICS_SNAPSHOT_DIR`` for ``manage.py dump_queue_metrics``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+        self._last_snapshot = time.monotonic()
+
+    def _empty(self):
+        return {
+            'count': 0,
+            'failures': 0,
+            'wait_ms': 0.0,
+            'max_wait_ms': 0.0,
+            'run_ms': 0.0,
+            'max_run_ms': 0.0,
+            'wait_buckets': [0] * len(QUEUE_BUCKETS_MS),
+        }
+
+    def record(self, queue, wait_ms, run_ms, failed=False):
+        with self._lock:
+            entry = self._data.setdefault(queue, self._empty())
+            entry['count'] += 1
+            entry['failures'] += int(failed)
+            entry['wait_ms'] += wait_ms
+            entry['max_wait_ms'] = max(entry['max_wait_ms'], wait_ms)
+            entry['run_ms'] += run_ms
+            entry['max_run_ms'] = max(entry['max_run_ms'], run_ms)
+            entry['wait_buckets'][bisect.bisect_left(QUEUE_BUCKETS_MS, wait_ms)] += 1
+        self._maybe_snapshot()
+
+    def snapshot(self):
+        with self._lock:
+            return {queue: _serialise_task(entry) for queue, entry in self._data.items()}
+
+    def reset(self):
+        with self._lock:
+            self._data = {}
+
+    def _maybe_snapshot(self):
+        directory = getattr(settings, 'TASK_METRICS_SNAPSHOT_DIR', None)
+        interval = getattr(settings, 'REQUEST_METRICS_SNAPSHOT_INTERVAL', 30)
+        if not directory or time.monotonic() - self._last_snapshot < interval:
+            return
+        self._last_snapshot = time.monotonic()
+        write_snapshot(self.snapshot(), directory, prefix='tasks', key='queues')
+
+
+def _serialise_task(entry):
+    count = entry['count'] or 1
+    return {
+        'count': entry['count'],
+        'failures': entry['failures'],
+        'avg_wait_ms': round(entry['wait_ms'] / count, 3),
+        'max_wait_ms': round(entry['max_wait_ms'], 3),
+        'avg_run_ms': round(entry['run_ms'] / count, 3),
+        'max_run_ms': round(entry['max_run_ms'], 3),
+        'wait_histogram': {
+            ('+Inf' if bound == float('inf') else f"<={bound}ms"): n
+            for bound, n in zip(QUEUE_BUCKETS_MS, entry['wait_buckets'])
+        },
+    }
+
+
+request_metrics = RequestMetrics()
+task_metrics = TaskMetrics()
@@ -0,0 +1,53 @@
+# Standard Library
+import time
+
+# Django Core
+from django.conf import settings
+from django.db import connection
+
+# Local App Imports
+from .metrics import QueryRecorder, TemplateTimer, instrument_templates, request_metrics
+
+
+class QueryTimingMiddleware:
+    """
+    Record SQL count, SQL time, duplicate-query fingerprints, template render
+    time and total latency for every request, keyed by URL name.
+
+    Timings are added to the in-process ``request_metrics`` registry and, for
+    staff users or when DEBUG is on, returned as a ``Server-Timing`` header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'REQUEST_METRICS_ENABLED', True)
+        if self.enabled:
+            instrument_templates()
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder), TemplateTimer() as templates:
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - start) * 1000
+        sql_ms = recorder.duration * 1000
+        template_ms = templates.duration * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        key = (match.view_name if match else None) or 'unresolved'
+        request_metrics.record(
+            key, total_ms, recorder.count, sql_ms, template_ms, recorder.duplicates()
+        )
+
+        user = getattr(request, 'user', None)
+        if settings.DEBUG or (user is not None and user.is_authenticated and user.is_staff):
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={sql_ms:.1f};desc="{recorder.count} queries"',
+                f'dup;desc="{sum(recorder.duplicates().values())} duplicate queries"',
+                f'tpl;dur={template_ms:.1f}',
+                f'total;dur={total_ms:.1f}',
+            ])
+        return response
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0038_communication_saved_filter_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommunicationArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.PositiveIntegerField(unique=True)),
+                ('message_type', models.CharField(choices=[('announcement', 'Announcement'), ('post', 'Post'), ('notification', 'Notification'), ('news', 'News'), ('personal', 'Personal'), ('group', 'Group')], max_length=20)),
+                ('title', models.CharField(blank=True, max_length=255, null=True)),
+                ('preview', models.CharField(blank=True, max_length=100)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('recipient_count', models.PositiveIntegerField(default=0)),
+                ('attachment_count', models.PositiveIntegerField(default=0)),
+                ('reply_count', models.PositiveIntegerField(default=0)),
+                ('sender_deleted', models.BooleanField(default=False)),
+                ('payload', models.BinaryField()),
+                ('sender', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_sent_communications', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedRecipient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('read', models.BooleanField(default=False)),
+                ('deleted', models.BooleanField(default=False)),
+                ('requires_response', models.BooleanField(default=False)),
+                ('has_responded', models.BooleanField(default=False)),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_received_communications', to=settings.AUTH_USER_MODEL)),
+                ('archive', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipients', to='accounts.communicationarchive')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='communicationarchive',
+            index=models.Index(fields=['sender', 'sent_at'], name='accounts_co_sender__5cbe46_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedrecipient',
+            index=models.Index(fields=['recipient', 'deleted'], name='accounts_ar_recipie_01ec6c_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0040_dashboard_rollups'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='communication',
+            index=models.Index(fields=['title'], name='accounts_co_title_1676eb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['last_name', 'first_name'], name='accounts_cu_last_na_7f00e5_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill(apps, schema_editor):
+    Communication = apps.get_model('accounts', 'Communication')
+    CommunicationRecipient = apps.get_model('accounts', 'CommunicationRecipient')
+    MessageReply = apps.get_model('accounts', 'MessageReply')
+
+    MessageReply.objects.update(communication_id=Subquery(
+        CommunicationRecipient.objects.filter(pk=OuterRef('recipient_entry_id')).values('communication_id')[:1]
+    ))
+
+    def count(queryset):
+        return Coalesce(Subquery(
+            queryset.filter(communication_id=OuterRef('pk')).order_by()
+            .values('communication_id').annotate(n=Count('id')).values('n')[:1]
+        ), 0)
+
+    Communication.objects.filter(requires_response=True).update(
+        reply_count=count(MessageReply.objects.all()),
+        responder_count=count(CommunicationRecipient.objects.filter(has_responded=True)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0041_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='communication',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='communication',
+            name='responder_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='messagereply',
+            name='communication',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='accounts.communication'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='messagereply',
+            name='communication',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='accounts.communication'),
+        ),
+        migrations.AddIndex(
+            model_name='messagereply',
+            index=models.Index(fields=['communication', 'replied_at'], name='accounts_me_communi_390d5f_idx'),
+        ),
+    ]
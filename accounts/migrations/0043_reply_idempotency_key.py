@@ -0,0 +1,22 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0042_reply_threads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messagereply',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='messagereply',
+            constraint=models.UniqueConstraint(fields=('recipient_entry', 'idempotency_key'), name='unique_reply_idempotency_key'),
+        ),
+    ]
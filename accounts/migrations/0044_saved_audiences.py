@@ -0,0 +1,62 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from accounts.audiences import digest, encode_ids
+
+
+def snapshot_pending_recipients(apps, schema_editor):
+    """Move the recipient lists of unsent drafts and scheduled messages into audiences."""
+    Communication = apps.get_model('accounts', 'Communication')
+    SavedAudience = apps.get_model('accounts', 'SavedAudience')
+
+    for comm in Communication.objects.filter(sent=False).iterator():
+        ids = {int(pk) for pk in comm.selected_recipient_ids or []}
+        if not ids:
+            continue
+        members = encode_ids(ids)
+        audience = SavedAudience.objects.create(
+            owner_id=comm.sender_id, name='', members=members, digest=digest(members),
+            size=len(ids), filter_data=comm.saved_filter_data,
+        )
+        Communication.objects.filter(pk=comm.pk).update(audience=audience, selected_recipient_ids=[])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0043_reply_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedAudience',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=100)),
+                ('members', models.BinaryField()),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('digest', models.CharField(editable=False, max_length=40)),
+                ('filter_data', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_audiences', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='communication',
+            name='audience',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='communications', to='accounts.savedaudience'),
+        ),
+        migrations.AddIndex(
+            model_name='savedaudience',
+            index=models.Index(fields=['owner', 'name'], name='accounts_sa_owner_i_576ef3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='savedaudience',
+            index=models.Index(fields=['owner', 'digest'], name='accounts_sa_owner_i_5aaf8f_idx'),
+        ),
+        migrations.RunPython(snapshot_pending_recipients, migrations.RunPython.noop),
+    ]
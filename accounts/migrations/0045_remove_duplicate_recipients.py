@@ -0,0 +1,39 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def remove_duplicate_recipients(apps, schema_editor):
+    # The old beat task could send a scheduled message twice; keep one row per user,
+    # preferring the one they replied to or read, and move any replies onto it
+    CommunicationRecipient = apps.get_model('accounts', 'CommunicationRecipient')
+    MessageReply = apps.get_model('accounts', 'MessageReply')
+
+    duplicates = (
+        CommunicationRecipient.objects.filter(recipient__isnull=False)
+        .values('communication_id', 'recipient_id').annotate(n=Count('id')).filter(n__gt=1).order_by()
+    )
+    for group in duplicates.iterator():
+        ids = list(
+            CommunicationRecipient.objects.filter(
+                communication_id=group['communication_id'], recipient_id=group['recipient_id'],
+            ).order_by('-has_responded', '-read', 'deleted', 'id').values_list('id', flat=True)
+        )
+        keep, extra = ids[0], ids[1:]
+        # Idempotency keys are only unique per row; the moved replies no longer need theirs
+        MessageReply.objects.filter(recipient_entry_id__in=extra).update(recipient_entry_id=keep, idempotency_key=None)
+        CommunicationRecipient.objects.filter(id__in=extra).delete()
+
+
+class Migration(migrations.Migration):
+    """
+    Runs before 0046_broadcasts adds ``unique_communication_recipient``. Kept apart from
+    that schema change: PostgreSQL cannot alter a table with pending deferred FK checks.
+    """
+
+    dependencies = [
+        ('accounts', '0044_saved_audiences'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_recipients, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-19 11:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0045_remove_duplicate_recipients'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='communication',
+            name='broadcast_size',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='communication',
+            name='is_broadcast',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='communication',
+            index=models.Index(fields=['is_broadcast', 'sent_at'], name='accounts_co_is_broa_d89d8c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='communicationtargetgroup',
+            index=models.Index(fields=['branch', 'role'], name='accounts_co_branch__d5db44_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='communicationrecipient',
+            constraint=models.UniqueConstraint(fields=('communication', 'recipient'), name='unique_communication_recipient'),
+        ),
+    ]
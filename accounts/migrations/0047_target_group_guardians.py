@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0046_broadcasts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='communicationtargetgroup',
+            name='guardians',
+            field=models.CharField(blank=True, choices=[('only', 'Their Guardians'), ('also', 'Students and Their Guardians')], max_length=10, null=True),
+        ),
+    ]
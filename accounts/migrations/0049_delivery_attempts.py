@@ -0,0 +1,34 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0048_push_devices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(max_length=10)),
+                ('address', models.CharField(max_length=255)),
+                ('recipient_ids', models.JSONField(blank=True, default=list)),
+                ('status', models.CharField(choices=[('retrying', 'Retrying'), ('sent', 'Sent'), ('dead', 'Dead')], default='retrying', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('communication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='delivery_attempts', to='accounts.communication')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='accounts_de_status_a50ea2_idx')],
+                'constraints': [models.UniqueConstraint(fields=('communication', 'channel', 'address'), name='unique_delivery_attempt')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0049_delivery_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='communication',
+            name='queued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0050_communication_queued_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='communicationrecipient',
+            name='digested_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='parentprofile',
+            name='digest_frequency',
+            field=models.CharField(choices=[('daily', 'Daily digest'), ('weekly', 'Weekly digest'), ('off', 'No digest')], default='off', max_length=10),
+        ),
+    ]
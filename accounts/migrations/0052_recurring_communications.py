@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:48
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0051_digests'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringCommunication',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rule', models.CharField(help_text="Cron expression or RRULE, in the school's time zone", max_length=255)),
+                ('starts_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('ends_at', models.DateTimeField(blank=True, null=True)),
+                ('next_run_at', models.DateTimeField(blank=True, editable=False, null=True)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('occurrences', models.PositiveIntegerField(default=0)),
+                ('active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('template', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='recurrence', to='accounts.communication')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['active', 'next_run_at'], name='accounts_re_active_ff8685_idx')],
+            },
+        ),
+    ]
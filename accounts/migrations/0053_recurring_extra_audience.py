@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-19 13:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0052_recurring_communications'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recurringcommunication',
+            name='extra_audience',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='+', to='accounts.savedaudience'),
+        ),
+    ]
@@ -1,4 +1,6 @@
+import json
 import os
+import zlib
 # Django Core
 from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
@@ -13,6 +15,8 @@ from django.utils import timezone
 from phonenumber_field.modelfields import PhoneNumberField
 
 # Local App Imports
+from accounts import audiences
+from accounts.thumbnails import DEFAULT_PICTURE, get_thumbnail_url
 from accounts.utils import generate_profile_number, get_prefix_for_user
 from django.utils.html import strip_tags
 
@@ -126,6 +130,11 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["last_name", "first_name"]),
+        ]
+
     def __str__(self):
         return self.email
 
@@ -135,9 +144,17 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     def get_short_name(self):
         return self.first_name
     
-    def get_profile_picture_url(self):
-        if self.profile_picture:
-            return self.profile_picture.url
+    def get_profile_picture_url(self, size=None):
+        """
+        URL of the profile picture; pass ``size`` (px) to get the nearest square
+        thumbnail (see ``accounts.thumbnails``) instead of the original upload.
+        """
+        if self.profile_picture and self.profile_picture.name != DEFAULT_PICTURE:
+            if size is None:
+                return self.profile_picture.url
+            url = get_thumbnail_url(self.profile_picture.name, size)
+            if url:
+                return url
         # return static('assets/img/profile-pic.png')
         return static('profile_pictures/default.png')
 
@@ -185,6 +202,13 @@ class ParentProfile(models.Model):
         ],
         default='phone' 
     )
+    # Posts and news arrive as one email per period (accounts.notifications.digests)
+    DIGEST_CHOICES = [
+        ('daily', 'Daily digest'),
+        ('weekly', 'Weekly digest'),
+        ('off', 'No digest'),
+    ]
+    digest_frequency = models.CharField(max_length=10, choices=DIGEST_CHOICES, default='off')
     nationality = models.CharField(max_length=50, default="Nigeria")
     state = models.CharField(max_length=50, default="Lagos")
     parent_number = models.CharField(max_length=50, unique=True, null=True, blank=True)
@@ -320,12 +344,29 @@ class Communication(models.Model):
     manual_emails = models.JSONField(blank=True, default=list)
     requires_response = models.BooleanField(default=False)
     saved_filter_data = models.JSONField(blank=True, null=True)
+    # Recipients of drafts and scheduled messages; selected_recipient_ids is only
+    # read for rows saved before audiences existed (see accounts.audiences)
+    audience = models.ForeignKey(
+        'SavedAudience', on_delete=models.RESTRICT, null=True, blank=True, related_name='communications'
+    )
+    # Maintained by accounts.rollups so the sender's reply thread never counts rows
+    reply_count = models.PositiveIntegerField(default=0)
+    responder_count = models.PositiveIntegerField(default=0)
+    # Delivered fan-out-on-read to its target groups (accounts.broadcasts): recipients'
+    # inbox rows are only created when they first open or delete it
+    is_broadcast = models.BooleanField(default=False)
+    broadcast_size = models.PositiveIntegerField(default=0)
+    # Set when a scheduled message is handed to a queue (accounts.queues), so the
+    # dispatcher does not enqueue it again on the next beat tick
+    queued_at = models.DateTimeField(null=True, blank=True)
 
     
     class Meta:
         indexes = [
             models.Index(fields=["sender", "is_draft"]),
             models.Index(fields=["sent", "scheduled_time"]),
+            models.Index(fields=["title"]),
+            models.Index(fields=["is_broadcast", "sent_at"]),
         ]
 
     def short_body(self):
@@ -339,6 +380,85 @@ class Communication(models.Model):
         return f"{self.message_type.title()} from {self.sender.username}"
 
 
+class SavedAudience(models.Model):
+    """
+    A recipient set stored once as a compressed sorted ID array (see ``accounts.audiences``).
+    Unnamed audiences are snapshots taken when a draft or scheduled message is saved.
+    """
+    owner = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='saved_audiences')
+    name = models.CharField(max_length=100, blank=True)
+    members = models.BinaryField()
+    size = models.PositiveIntegerField(default=0)
+    digest = models.CharField(max_length=40, editable=False)
+    filter_data = models.JSONField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'name']),
+            models.Index(fields=['owner', 'digest']),
+        ]
+
+    def member_ids(self):
+        return audiences.decode_ids(self.members)
+
+    def audience(self):
+        return audiences.Audience(self.member_ids())
+
+    def __str__(self):
+        return f"{self.name or 'Snapshot'} ({self.size} recipient{'s' if self.size != 1 else ''})"
+
+
+class RecurringCommunication(models.Model):
+    """
+    A message sent again on a cron or RRULE schedule (see ``accounts.recurrence``).
+    ``template`` holds the content and targeting and is never sent itself; each
+    occurrence is a copy of it. ``next_run_at`` is kept up to date on save so the
+    dispatcher finds due schedules with one range query.
+    """
+    template = models.OneToOneField(Communication, on_delete=models.CASCADE, related_name='recurrence')
+    # Recipients ticked by hand or from a saved audience alongside the target groups,
+    # added to each occurrence's freshly resolved groups
+    extra_audience = models.ForeignKey(
+        'SavedAudience', on_delete=models.RESTRICT, null=True, blank=True, related_name='+'
+    )
+    rule = models.CharField(max_length=255, help_text="Cron expression or RRULE, in the school's time zone")
+    starts_at = models.DateTimeField(default=timezone.now)
+    ends_at = models.DateTimeField(null=True, blank=True)
+    next_run_at = models.DateTimeField(null=True, blank=True, editable=False)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    occurrences = models.PositiveIntegerField(default=0)
+    active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["active", "next_run_at"]),
+        ]
+
+    def clean(self):
+        from accounts import recurrence
+
+        try:
+            recurrence.parse(self.rule)
+        except ValueError as e:
+            raise ValidationError({'rule': str(e)})
+
+    def save(self, *args, **kwargs):
+        from accounts import recurrence
+
+        self.next_run_at = recurrence.next_occurrence(
+            self.rule, timezone.now(), self.starts_at, self.ends_at,
+        ) if self.active else None
+        if self.next_run_at is None:
+            self.active = False
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.template.title or 'Untitled'} ({self.rule})"
+
+
 class CommunicationAttachment(models.Model):
     communication = models.ForeignKey(Communication, on_delete=models.CASCADE, related_name='attachments')
     file = models.FileField(upload_to='communication_attachments/', blank=True, null=True)
@@ -366,6 +486,11 @@ class CommunicationTargetGroup(models.Model):
         ('both', 'Teaching and Non-Teaching Staff'),
     ]
 
+    GUARDIAN_CHOICES = [
+        ('only', 'Their Guardians'),
+        ('also', 'Students and Their Guardians'),
+    ]
+
     communication = models.ForeignKey(
         Communication, on_delete=models.CASCADE, related_name='target_groups'
     )
@@ -389,6 +514,10 @@ class CommunicationTargetGroup(models.Model):
     class_arm = models.ForeignKey(
         'ClassArm', null=True, blank=True, on_delete=models.SET_NULL
     )
+    # Reach the parents of the matching students instead of (or as well as) them
+    guardians = models.CharField(
+        max_length=10, choices=GUARDIAN_CHOICES, null=True, blank=True
+    )
 
     def __str__(self):
         parts = []
@@ -406,8 +535,15 @@ class CommunicationTargetGroup(models.Model):
             parts.append(f"Class: {self.student_class.name}")
         if self.class_arm:
             parts.append(f"Arm: {self.class_arm.name}")
+        if self.guardians:
+            parts.append(f"Guardians: {self.get_guardians_display()}")
         return ' | '.join(parts) or "General"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["branch", "role"]),
+        ]
+
     
 class CommunicationRecipient(models.Model):
     communication = models.ForeignKey(Communication, on_delete=models.CASCADE, related_name='recipients')
@@ -427,9 +563,16 @@ class CommunicationRecipient(models.Model):
     read_at = models.DateTimeField(null=True, blank=True)
     delivered = models.BooleanField(default=False)
     delivered_at = models.DateTimeField(null=True, blank=True)
+    # Set once the message went out in the recipient's email digest
+    digested_at = models.DateTimeField(null=True, blank=True)
     requires_response = models.BooleanField(default=False)
     has_responded = models.BooleanField(default=False)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['communication', 'recipient'], name='unique_communication_recipient'),
+        ]
+
     def mark_as_read(self):
         if not self.read:
             self.read = True
@@ -469,9 +612,28 @@ class SentMessageDelete(models.Model):
 
 class MessageReply(models.Model):
     recipient_entry = models.ForeignKey(CommunicationRecipient, on_delete=models.CASCADE, related_name='replies')
+    # Copy of recipient_entry.communication: a communication's thread is one index range scan
+    communication = models.ForeignKey(Communication, on_delete=models.CASCADE, related_name='replies')
     responder = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     reply_text = models.TextField()
     replied_at = models.DateTimeField(auto_now_add=True)
+    # Client-generated per reply form; a resubmitted form returns the existing reply
+    idempotency_key = models.CharField(max_length=64, blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['communication', 'replied_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipient_entry', 'idempotency_key'], name='unique_reply_idempotency_key'
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.communication_id is None:
+            self.communication_id = self.recipient_entry.communication_id
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Reply by {self.responder.username} on {self.recipient_entry.communication.title or 'Untitled'}"
@@ -488,3 +650,156 @@ class ReplyAttachment(models.Model):
     @property
     def basename(self):
         return os.path.basename(self.file.name)
+
+
+class CommunicationArchive(models.Model):
+    """
+    Cold-storage copy of a sent communication that has been moved out of the live
+    tables by ``accounts.archive``. Recipients, replies and attachment names are kept
+    in a zlib-compressed JSON ``payload``; ``ArchivedRecipient`` indexes who can read it.
+    """
+    original_id = models.PositiveIntegerField(unique=True)
+    sender = models.ForeignKey(
+        'CustomUser', null=True, on_delete=models.SET_NULL, related_name='archived_sent_communications'
+    )
+    message_type = models.CharField(max_length=20, choices=Communication.MESSAGE_TYPE_CHOICES)
+    title = models.CharField(max_length=255, blank=True, null=True)
+    preview = models.CharField(max_length=100, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    recipient_count = models.PositiveIntegerField(default=0)
+    attachment_count = models.PositiveIntegerField(default=0)
+    reply_count = models.PositiveIntegerField(default=0)
+    sender_deleted = models.BooleanField(default=False)
+    payload = models.BinaryField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["sender", "sent_at"]),
+        ]
+
+    def get_payload(self):
+        return json.loads(zlib.decompress(bytes(self.payload)))
+
+    def __str__(self):
+        return f"Archived {self.message_type} #{self.original_id}"
+
+
+class ArchivedRecipient(models.Model):
+    archive = models.ForeignKey(CommunicationArchive, on_delete=models.CASCADE, related_name='recipients')
+    recipient = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='archived_received_communications'
+    )
+    read = models.BooleanField(default=False)
+    deleted = models.BooleanField(default=False)
+    requires_response = models.BooleanField(default=False)
+    has_responded = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["recipient", "deleted"]),
+        ]
+
+    def __str__(self):
+        return f"{self.recipient_id} -> archived #{self.archive.original_id}"
+
+
+class BranchDailyStats(models.Model):
+    """Per-branch, per-day message counters maintained by ``accounts.rollups``."""
+    branch = models.ForeignKey('Branch', on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    messages_sent = models.PositiveIntegerField(default=0)
+    recipients_reached = models.PositiveIntegerField(default=0)
+    messages_read = models.PositiveIntegerField(default=0)
+    replies = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["branch", "date"], name="unique_branch_daily_stats"),
+        ]
+        indexes = [
+            models.Index(fields=["date"]),
+        ]
+
+    def __str__(self):
+        return f"{self.branch} {self.date}"
+
+
+class BranchStats(models.Model):
+    """Snapshot of user totals per branch, refreshed periodically by Celery."""
+    branch = models.OneToOneField('Branch', on_delete=models.CASCADE, related_name='stats')
+    students = models.PositiveIntegerField(default=0)
+    parents = models.PositiveIntegerField(default=0)
+    staff = models.PositiveIntegerField(default=0)
+    branch_admins = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Stats for {self.branch}"
+
+
+class UserMessageStats(models.Model):
+    """Per-user inbox counters, updated incrementally on send, read, reply and delete."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='message_stats')
+    received = models.PositiveIntegerField(default=0)
+    unread = models.PositiveIntegerField(default=0)
+    pending_replies = models.PositiveIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Message stats for {self.user_id}"
+
+
+class PushDevice(models.Model):
+    """A device registered for push notifications (accounts.notifications.providers.PushProvider)."""
+    PLATFORM_CHOICES = [
+        ('android', 'Android'),
+        ('ios', 'iOS'),
+        ('web', 'Web'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='push_devices')
+    token = models.CharField(max_length=255, unique=True)
+    platform = models.CharField(max_length=10, choices=PLATFORM_CHOICES, default='android')
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.get_platform_display()} device of {self.user_id}"
+
+
+class DeliveryAttempt(models.Model):
+    """
+    A failed delivery of a communication to one address over one channel, retried with
+    backoff by accounts.notifications.retries until it is sent or dead-lettered.
+    """
+    STATUS_CHOICES = [
+        ('retrying', 'Retrying'),
+        ('sent', 'Sent'),
+        ('dead', 'Dead'),
+    ]
+
+    communication = models.ForeignKey(Communication, on_delete=models.CASCADE, related_name='delivery_attempts')
+    channel = models.CharField(max_length=10)
+    address = models.CharField(max_length=255)
+    # CommunicationRecipient rows reached through this address (none for broadcasts)
+    recipient_ids = models.JSONField(blank=True, default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='retrying')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['communication', 'channel', 'address'], name='unique_delivery_attempt'),
+        ]
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} to {self.address} ({self.get_status_display()})"
@@ -0,0 +1,88 @@
+"""
+Per-channel circuit breaker.
+
+Outcomes of provider calls are counted per channel in fixed windows of
+``DELIVERY_BREAKER_WINDOW`` seconds, in the shared cache so every worker sees them.
+Once a window holds at least ``DELIVERY_BREAKER_MIN_CALLS`` addresses and
+``DELIVERY_BREAKER_ERROR_RATE`` of them failed, the channel is opened (paused) for
+``DELIVERY_BREAKER_COOLDOWN`` seconds: its sends are deferred to the retry queue
+instead of hammering a broken provider. When the cooldown ends the next batch is a
+trial; failing again reopens it.
+"""
+# Standard Library
+import logging
+import time
+
+# Django Core
+from django.conf import settings
+from django.core.cache import cache
+
+# Local App Imports
+from .. import cache_keys
+
+logger = logging.getLogger(__name__)
+
+BREAKER_WINDOW = getattr(settings, 'DELIVERY_BREAKER_WINDOW', 60)
+BREAKER_MIN_CALLS = getattr(settings, 'DELIVERY_BREAKER_MIN_CALLS', 20)
+BREAKER_ERROR_RATE = getattr(settings, 'DELIVERY_BREAKER_ERROR_RATE', 0.5)
+BREAKER_COOLDOWN = getattr(settings, 'DELIVERY_BREAKER_COOLDOWN', 300)
+
+
+def _window_keys(channel):
+    window = int(time.time() // BREAKER_WINDOW)
+    return (
+        cache_keys.make_key(cache_keys.CIRCUIT_BREAKER, channel, window, 'ok'),
+        cache_keys.make_key(cache_keys.CIRCUIT_BREAKER, channel, window, 'failed'),
+    )
+
+
+def _open_key(channel):
+    return cache_keys.make_key(cache_keys.CIRCUIT_BREAKER, channel, 'open')
+
+
+def _incr(key, amount):
+    cache.add(key, 0, BREAKER_WINDOW * 2)
+    try:
+        return cache.incr(key, amount)
+    except ValueError:
+        # Expired between add and incr
+        cache.set(key, amount, BREAKER_WINDOW * 2)
+        return amount
+
+
+def opened_until(channel):
+    """Unix time the channel is paused until, or ``None`` if it is closed."""
+    return cache.get(_open_key(channel))
+
+
+def is_open(channel):
+    return opened_until(channel) is not None
+
+
+def record(channel, succeeded, failed):
+    """Count one provider call's outcome; opens the circuit when the error rate spikes."""
+    ok_key, failed_key = _window_keys(channel)
+    ok = _incr(ok_key, succeeded) if succeeded else (cache.get(ok_key) or 0)
+    failures = _incr(failed_key, failed) if failed else (cache.get(failed_key) or 0)
+
+    total = ok + failures
+    if failed and total >= BREAKER_MIN_CALLS and failures / total >= BREAKER_ERROR_RATE:
+        trip(channel)
+
+
+def trip(channel):
+    until = time.time() + BREAKER_COOLDOWN
+    cache.set(_open_key(channel), until, BREAKER_COOLDOWN)
+    # Start the next window from scratch so one trial batch decides
+    cache.delete_many(_window_keys(channel))
+    logger.warning(f"[BREAKER] {channel} paused for {BREAKER_COOLDOWN}s after a spike in errors")
+
+
+def reset(channel):
+    cache.delete_many([_open_key(channel), *_window_keys(channel)])
+
+
+def open_channels(channels):
+    """The channels of ``channels`` that are currently paused, with their reopening times."""
+    keys = {_open_key(channel): channel for channel in channels}
+    return {keys[key]: until for key, until in cache.get_many(list(keys)).items()}
@@ -0,0 +1,279 @@
+"""
+Multi-channel delivery of sent communications.
+
+Every registered recipient has an inbox row (the ``in_app`` channel). For the message
+types in ``CHANNEL_MESSAGE_TYPES`` (urgent notices by default), users are also
+reached on one external channel:
+
+* parents by ``ParentProfile.preferred_contact_method``: ``email``; ``sms`` (their
+  profile phone number); ``phone`` - push if they registered a device, else SMS;
+* anyone with a registered ``PushDevice`` (and no other preference) by push;
+
+falling back to email when the preferred channel has no address. Manual email
+addresses go out by email as before.
+
+``deliver`` groups the recipients by channel and address, so an address shared by
+several recipients (two parents on one phone) is sent to once, and hands each group
+to its provider (accounts.notifications.providers) in batches. Rows reached are
+marked ``delivered``; only undelivered rows are picked up, so running it again does
+not send twice. Failed addresses are queued for retry (accounts.notifications.retries)
+and a channel whose error rate spikes is paused (accounts.notifications.breaker).
+Email is sent interleaved by recipient domain and within each domain's rate limit
+(accounts.notifications.ratelimit); addresses over the limit wait their turn in the
+retry queue rather than fail. ``deliver`` itself never waits for tokens: it runs on
+the message's priority queue, where a wait would hold up urgent messages.
+Bodies with merge fields are rendered per recipient for each batch (accounts.merge_fields).
+Broadcasts have no rows (accounts.broadcasts): their external recipients are
+resolved from the target groups and only their failures are tracked.
+"""
+# Standard Library
+import logging
+import mimetypes
+import time
+from collections import defaultdict, namedtuple
+
+# Django Core
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+# Local App Imports
+from ..id_joins import id_join
+from ..merge_fields import render_rows
+from . import breaker, ratelimit
+from .providers import ProviderError
+from .retries import queue_failures, queued_addresses
+
+logger = logging.getLogger(__name__)
+
+CHANNELS = ('in_app', 'email', 'sms', 'push')
+EXTERNAL_CHANNELS = ('email', 'sms', 'push')
+DEFAULT_PROVIDERS = {
+    'in_app': 'accounts.notifications.providers.InAppProvider',
+    'email': 'accounts.notifications.providers.EmailProvider',
+    'sms': 'accounts.notifications.providers.SmsGatewayProvider',
+    'push': 'accounts.notifications.providers.PushProvider',
+}
+
+CHANNEL_MESSAGE_TYPES = tuple(getattr(settings, 'CHANNEL_MESSAGE_TYPES', ('announcement', 'notification')))
+CHANNEL_DELIVERY_ASYNC = getattr(settings, 'CHANNEL_DELIVERY_ASYNC', True)
+
+# bodies: {address: personalised body} for the current batch, when the body has merge fields
+Message = namedtuple('Message', 'communication_id subject body from_email attachments bodies', defaults=(None,))
+
+
+def get_provider(channel):
+    path = getattr(settings, 'CHANNEL_PROVIDERS', {}).get(channel, DEFAULT_PROVIDERS[channel])
+    return import_string(path)(channel)
+
+
+def build_message(communication, attachments=True):
+    """The content every channel sends; attachment files are read once, for email only."""
+    files = []
+    if attachments:
+        for attachment in communication.attachments.all():
+            try:
+                with attachment.file.open('rb') as fh:
+                    content = fh.read()
+            except (OSError, ValueError) as e:
+                logger.warning(f"[CHANNELS] Attachment issue for communication {communication.pk}: {e}")
+                continue
+            content_type = mimetypes.guess_type(attachment.basename)[0] or 'application/octet-stream'
+            files.append((attachment.basename, content, content_type))
+
+    sender_email = communication.sender.email if communication.sender_id else ''
+    return Message(
+        communication_id=communication.pk,
+        subject=communication.title or (communication.body[:50] + '...'),
+        body=communication.body,
+        from_email=sender_email or settings.DEFAULT_FROM_EMAIL,
+        attachments=files,
+    )
+
+
+def external_channel(preference, phone, has_device):
+    """The one external channel for a user, or ``None`` to reach them in-app only."""
+    if preference == 'email':
+        return 'email'
+    if preference == 'sms':
+        return 'sms' if phone else 'email'
+    if preference == 'phone':
+        if has_device:
+            return 'push'
+        return 'sms' if phone else 'email'
+    return 'push' if has_device else None
+
+
+def route(users):
+    """
+    ``{channel: {address: [user_id, ...]}}`` for the external channel of every user in
+    ``users`` (a queryset); users reached in-app only are left out.
+    """
+    from ..models import PushDevice
+
+    tokens = defaultdict(list)
+    for user_id, token in PushDevice.objects.filter(user_id__in=users.values('id')).values_list('user_id', 'token'):
+        tokens[user_id].append(token)
+
+    routes = {channel: defaultdict(list) for channel in EXTERNAL_CHANNELS}
+    rows = users.values_list(
+        'id', 'email', 'parentprofile__preferred_contact_method', 'parentprofile__phone_number',
+    )
+    for user_id, email, preference, phone in rows:
+        phone = str(phone or '')
+        channel = external_channel(preference, phone, user_id in tokens)
+        if channel == 'push':
+            addresses = tokens[user_id]
+        elif channel == 'sms':
+            addresses = [phone]
+        elif channel == 'email':
+            addresses = [email]
+        else:
+            continue
+        for address in addresses:
+            routes[channel][address].append(user_id)
+    return routes
+
+
+def _targets(communication):
+    """``{channel: {address: [row_id, ...]}}`` for the communication's undelivered rows."""
+    from ..broadcasts import recipients as broadcast_recipients
+    from ..models import CommunicationRecipient, CustomUser, PushDevice
+
+    targets = {channel: defaultdict(list) for channel in CHANNELS}
+    rows = CommunicationRecipient.objects.filter(communication=communication, delivered=False)
+    user_rows = dict(rows.filter(recipient__isnull=False).values_list('recipient_id', 'id'))
+
+    routed = set()
+    if communication.message_type in CHANNEL_MESSAGE_TYPES:
+        if communication.is_broadcast:
+            users = broadcast_recipients(communication).filter(
+                Q(role='parent') | Q(id__in=PushDevice.objects.values('user_id'))
+            )
+        else:
+            users = CustomUser.objects.filter(id__in=rows.values('recipient_id'))
+        for channel, addresses in route(users).items():
+            for address, user_ids in addresses.items():
+                targets[channel][address] = [user_rows[pk] for pk in user_ids if pk in user_rows]
+                routed.update(user_ids)
+
+    for user_id, row_id in user_rows.items():
+        if user_id not in routed:
+            targets['in_app'][row_id].append(row_id)
+
+    manual = list(rows.filter(recipient__isnull=True, email__isnull=False).values_list('id', 'email'))
+    if manual:
+        registered = set(
+            CustomUser.objects.annotate(lower_email=Lower('email'))
+            .filter(lower_email__in={email.lower() for _, email in manual})
+            .values_list('lower_email', flat=True)
+        )
+        for row_id, email in manual:
+            if email.lower() in registered:
+                logger.info(f"[CHANNELS] Skipping {email} (registered user)")
+                continue
+            targets['email'][email].append(row_id)
+    return targets
+
+
+def batch_message(message, row_bodies, addresses):
+    """``message`` with each address's personalised body (``row_bodies`` from accounts.merge_fields.render_rows)."""
+    if not row_bodies:
+        return message
+    return message._replace(bodies={
+        address: row_bodies.get(row_ids[0], message.body) if row_ids else message.body
+        for address, row_ids in addresses.items()
+    })
+
+
+def send_batch(provider, message, addresses):
+    """
+    Hand one batch to ``provider`` and feed the outcome to the channel's circuit
+    breaker. Returns the accepted addresses and the error for the rest.
+    """
+    try:
+        accepted = set(provider.send(message, addresses))
+        error = '' if len(accepted) == len(addresses) else 'Rejected by the provider'
+    except ProviderError as e:
+        logger.error(f"[CHANNELS] {provider.channel} batch of {len(addresses)} for communication {message.communication_id} failed: {e}")
+        accepted, error = set(), str(e)
+    breaker.record(provider.channel, len(accepted), len(addresses) - len(accepted))
+    return accepted, error
+
+
+def mark_delivered(row_ids):
+    from ..models import CommunicationRecipient
+
+    if not row_ids:
+        return
+    with id_join(row_ids) as joined_ids:
+        CommunicationRecipient.objects.filter(id__in=joined_ids).update(delivered=True, delivered_at=timezone.now())
+
+
+def deliver(communication):
+    """
+    Send ``communication`` through the channel of each undelivered recipient, in
+    provider-sized batches. Addresses that fail, or that wait on a paused channel, go
+    to the retry queue (accounts.notifications.retries). Returns the number of
+    addresses accepted per channel.
+    """
+    targets = _targets(communication)
+    message = build_message(communication, attachments=bool(targets['email']))
+    row_bodies = render_rows(communication)
+    delivered = {}
+
+    for channel, addresses in targets.items():
+        if addresses and channel != 'in_app':
+            # Addresses already in the retry queue are resent from there
+            for address in queued_addresses(communication, channel):
+                addresses.pop(address, None)
+        if not addresses:
+            continue
+        provider = get_provider(channel)
+        # No wait: over-limit addresses go straight to the retry queue, which paces them
+        pacer = ratelimit.Pacer(channel, addresses, provider.batch_size, give_up_at=time.time())
+        accepted_rows = []
+        delivered[channel] = 0
+        for batch in pacer:
+            until = breaker.opened_until(channel)
+            if until is not None:
+                rest = {address: addresses[address] for address in batch + pacer.stop()}
+                queue_failures(communication, channel, rest, f"{channel} paused by the circuit breaker", until)
+                logger.warning(f"[CHANNELS] {channel} is paused; deferred {len(rest)} address(es) of communication {communication.pk}")
+                break
+
+            batch_targets = {address: addresses[address] for address in batch}
+            accepted, error = send_batch(provider, batch_message(message, row_bodies, batch_targets), batch)
+            delivered[channel] += len(accepted)
+            accepted_rows.extend(row_id for address in accepted for row_id in addresses[address])
+            failed = {address: addresses[address] for address in batch if address not in accepted}
+            if failed:
+                queue_failures(communication, channel, failed, error)
+
+        mark_delivered(accepted_rows)
+        for ready_at, deferred in pacer.deferred.items():
+            queue_failures(
+                communication, channel, {address: addresses[address] for address in deferred},
+                f"{channel} rate limit reached for the recipient's domain", ready_at,
+            )
+        logger.info(f"[CHANNELS] Communication {communication.pk}: {delivered[channel]}/{len(addresses)} via {channel}")
+    return delivered
+
+
+def schedule_delivery(communication):
+    """
+    Deliver on a Celery worker of the communication's priority queue (accounts.queues)
+    once the transaction commits, or now if ``CHANNEL_DELIVERY_ASYNC`` is off.
+    """
+    if not CHANNEL_DELIVERY_ASYNC:
+        return deliver(communication)
+
+    from ..queues import queue_for
+    from ..tasks import send_all_notifications
+
+    queue = queue_for(communication)
+    transaction.on_commit(lambda: send_all_notifications.apply_async((communication.pk,), queue=queue))
+    return None
@@ -0,0 +1,200 @@
+"""
+Daily and weekly email digests of low-priority messages.
+
+Posts and news (``DIGEST_MESSAGE_TYPES``) reach parents in the inbox only; rather than
+an email per message, each parent gets one email per period
+(``ParentProfile.digest_frequency``) listing what they have not read yet. Celery beat
+runs ``send_digests`` for each period (``CELERY_BEAT_SCHEDULE``).
+
+A run assembles every digest of the period in one pass over ``CommunicationRecipient``
+(the unread, undigested rows of the last ``DIGEST_MAX_AGE``, ordered by recipient)
+plus one query per broadcast sent during the period, whose readers have no row
+(accounts.broadcasts). Digests go out through the email provider in batches, paced by
+the domain rate limits (accounts.notifications.ratelimit ``Pacer``). A run waits for
+tokens for at most ``EMAIL_RATE_LIMIT_MAX_WAIT`` seconds, so it never holds a bulk
+worker for long: the digests still waiting then are handed to follow-up runs of the
+task, queued for when their tokens are due, which assemble the same period (same
+``now``) for just those addresses. A digest that fails leaves its rows for the next
+period's run (broadcasts are only listed in the run covering their send time).
+
+Parents are on ``'off'`` until they choose a digest.
+"""
+# Standard Library
+import logging
+import time
+from collections import Counter, OrderedDict, namedtuple
+from datetime import timedelta
+
+# Django Core
+from django.conf import settings
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+# Local App Imports
+from . import ratelimit
+
+logger = logging.getLogger(__name__)
+
+DIGEST_MESSAGE_TYPES = tuple(getattr(settings, 'DIGEST_MESSAGE_TYPES', ('post', 'news')))
+PERIODS = {'daily': timedelta(days=1), 'weekly': timedelta(days=7)}
+# Unread rows older than this are left out (and never digested)
+DIGEST_MAX_AGE = timedelta(days=getattr(settings, 'DIGEST_MAX_AGE_DAYS', 8))
+# Messages listed in full per digest; the rest are counted
+DIGEST_MAX_ITEMS = getattr(settings, 'DIGEST_MAX_ITEMS', 20)
+EXCERPT_LENGTH = 160
+
+Digest = namedtuple('Digest', 'user_id email first_name communication_ids row_ids')
+
+
+def collect(frequency, now=None):
+    """
+    ``{email: Digest}`` for the parents on ``frequency`` with unread posts or news, and
+    ``{communication_id: Communication}`` for everything listed.
+    """
+    from ..broadcasts import recipients as broadcast_recipients
+    from ..models import Communication, CommunicationRecipient
+
+    now = now or timezone.now()
+    digests = OrderedDict()
+
+    rows = CommunicationRecipient.objects.filter(
+        communication__message_type__in=DIGEST_MESSAGE_TYPES,
+        communication__sent=True,
+        communication__sent_at__gte=now - DIGEST_MAX_AGE,
+        recipient__role='parent',
+        recipient__is_active=True,
+        recipient__parentprofile__digest_frequency=frequency,
+        read=False, deleted=False, digested_at__isnull=True,
+    ).order_by('recipient_id', 'communication__sent_at').values_list(
+        'id', 'recipient_id', 'recipient__email', 'recipient__first_name', 'communication_id',
+    )
+    for row_id, user_id, email, first_name, communication_id in rows.iterator(chunk_size=2000):
+        digest = digests.get(email)
+        if digest is None:
+            digest = digests[email] = Digest(user_id, email, first_name, [], [])
+        digest.communication_ids.append(communication_id)
+        digest.row_ids.append(row_id)
+
+    # Broadcasts of the period: readers who have not opened (or deleted) them have no row
+    sent_broadcasts = Communication.objects.filter(
+        is_broadcast=True, message_type__in=DIGEST_MESSAGE_TYPES, sent=True,
+        sent_at__gt=now - PERIODS[frequency], sent_at__lte=now,
+    ).order_by('sent_at')
+    for communication in sent_broadcasts:
+        readers = broadcast_recipients(communication).filter(
+            role='parent', parentprofile__digest_frequency=frequency,
+        ).exclude(received_communications__communication=communication)
+        for user_id, email, first_name in readers.values_list('id', 'email', 'first_name').iterator(chunk_size=2000):
+            digest = digests.get(email)
+            if digest is None:
+                digest = digests[email] = Digest(user_id, email, first_name, [], [])
+            digest.communication_ids.append(communication.pk)
+
+    ids = {pk for digest in digests.values() for pk in digest.communication_ids}
+    communications = Communication.objects.select_related('sender').in_bulk(ids)
+    return digests, communications
+
+
+def summaries(communications):
+    """``{communication_id: text}``: each listed message's entry, built once per run."""
+    from ..merge_fields import DEFAULTS, compile_body
+
+    entries = {}
+    for pk, communication in communications.items():
+        body = strip_tags(compile_body(communication.body).render(DEFAULTS)).strip()
+        excerpt = body[:EXCERPT_LENGTH] + ('...' if len(body) > EXCERPT_LENGTH else '')
+        sent_at = timezone.localtime(communication.sent_at).strftime('%a %d %b, %H:%M')
+        sender = communication.sender.get_full_name() if communication.sender_id else ''
+        entries[pk] = f"* {communication.title or '(Untitled)'} - {sender}, {sent_at}\n  {excerpt}\n"
+    return entries
+
+
+def render(digest, entries, frequency):
+    """The plain-text body of one digest."""
+    count = len(digest.communication_ids)
+    lines = [
+        f"Hello {digest.first_name}," if digest.first_name else "Hello,",
+        '',
+        f"You have {count} unread message{'s' if count != 1 else ''} from the school:",
+        '',
+    ]
+    lines.extend(entries[pk] for pk in digest.communication_ids[:DIGEST_MAX_ITEMS])
+    if count > DIGEST_MAX_ITEMS:
+        lines.append(f"...and {count - DIGEST_MAX_ITEMS} more.\n")
+    lines.append(f"Sign in to read them in full. You get this {frequency} digest instead of an email per message.")
+    return '\n'.join(lines)
+
+
+def mark_digested(row_ids, now):
+    from ..id_joins import id_join
+    from ..models import CommunicationRecipient
+
+    if not row_ids:
+        return
+    with id_join(row_ids) as joined_ids:
+        CommunicationRecipient.objects.filter(id__in=joined_ids).update(digested_at=now)
+
+
+def schedule_follow_ups(frequency, now, deferred):
+    """
+    Queue the digests left waiting on the rate limits (``{unix time: [email, ...]}``),
+    one follow-up run per ``EMAIL_RATE_LIMIT_MAX_WAIT`` window of ready times, each
+    starting when its first token is due.
+    """
+    from ..tasks import send_digests as send_digests_task
+
+    window = max(ratelimit.max_wait(), 1)
+    first = min(deferred)
+    follow_ups = OrderedDict()
+    for ready_at in sorted(deferred):
+        follow_ups.setdefault(int((ready_at - first) // window), (ready_at, []))[1].extend(deferred[ready_at])
+    for ready_at, emails in follow_ups.values():
+        send_digests_task.apply_async(
+            (frequency, now.isoformat(), emails), countdown=max(0, ready_at - time.time()),
+        )
+    return len(follow_ups)
+
+
+def send_digests(frequency, now=None, only=None):
+    """
+    Assemble and send every ``frequency`` digest, or only those to the addresses in
+    ``only`` (a follow-up run). Returns counts of what happened.
+    """
+    from .channels import Message, get_provider, send_batch
+
+    now = now or timezone.now()
+    digests, communications = collect(frequency, now)
+    if only is not None:
+        only = set(only)
+        digests = OrderedDict((email, digest) for email, digest in digests.items() if email in only)
+    counts = Counter(digests=0, items=0, failed=0, deferred=0)
+    if not digests:
+        return counts
+
+    entries = summaries(communications)
+    bodies = {email: render(digest, entries, frequency) for email, digest in digests.items()}
+    message = Message(
+        communication_id=None,
+        subject=f"Your {frequency} message digest",
+        body='',
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        attachments=[],
+        bodies=bodies,
+    )
+    provider = get_provider('email')
+    pacer = ratelimit.Pacer('email', list(digests), provider.batch_size)
+    sent_rows = []
+    for batch in pacer:
+        accepted, _ = send_batch(provider, message, batch)
+        counts['digests'] += len(accepted)
+        counts['failed'] += len(batch) - len(accepted)
+        for email in accepted:
+            counts['items'] += len(digests[email].communication_ids)
+            sent_rows.extend(digests[email].row_ids)
+
+    mark_digested(sent_rows, now)
+    if pacer.deferred:
+        counts['deferred'] = sum(map(len, pacer.deferred.values()))
+        counts['follow_ups'] = schedule_follow_ups(frequency, now, pacer.deferred)
+    logger.info(f"[DIGESTS] {frequency}: {dict(counts)}")
+    return counts
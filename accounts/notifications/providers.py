@@ -0,0 +1,189 @@
+"""
+Delivery providers, one per channel (see accounts.notifications.channels).
+
+A provider sends one message to a batch of addresses per call and returns the
+addresses it accepted; anything else counts as failed. A message with merge fields
+(accounts.merge_fields) carries a body per address; gateways that take one text per
+request are called once per distinct body. Providers are configured by
+dotted path in ``CHANNEL_PROVIDERS`` and built with their channel name, so a channel
+can be switched to ``FakeProvider`` (an in-memory outbox) to test throughput offline.
+"""
+# Standard Library
+import json
+import time
+import urllib.request
+from collections import defaultdict
+
+# Django Core
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+try:
+    import firebase_admin
+    from firebase_admin import credentials, messaging
+except ImportError:  # optional: pip install firebase-admin
+    firebase_admin = None
+
+
+class ProviderError(Exception):
+    """A whole batch could not be handed to the provider."""
+
+
+class Provider:
+    # Addresses per call to the provider's API
+    batch_size = 100
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    def send(self, message, addresses):
+        """Send ``message`` to ``addresses``; returns the addresses that were accepted."""
+        raise NotImplementedError
+
+    def body_groups(self, message, addresses):
+        """``[(body, [address, ...]), ...]``, one group per distinct personalised body."""
+        if not message.bodies:
+            return [(message.body, list(addresses))]
+        groups = defaultdict(list)
+        for address in addresses:
+            groups[message.bodies.get(address, message.body)].append(address)
+        return list(groups.items())
+
+    def send_groups(self, message, addresses, send_one):
+        """
+        Call ``send_one(body, addresses)`` per body group. A failure after some groups
+        went out leaves the rest as rejected rather than failing (and resending) all.
+        """
+        accepted = []
+        for body, group in self.body_groups(message, addresses):
+            try:
+                accepted.extend(send_one(body, group))
+            except ProviderError:
+                if not accepted:
+                    raise
+                break
+        return accepted
+
+
+class InAppProvider(Provider):
+    """The inbox row is the delivery; it is written before any channel runs."""
+    batch_size = 1000
+
+    def send(self, message, addresses):
+        return list(addresses)
+
+
+class EmailProvider(Provider):
+    """One ``EmailMessage`` per address, sent over a single SMTP connection per batch."""
+
+    def send(self, message, addresses):
+        emails = []
+        for address in addresses:
+            body = message.bodies.get(address, message.body) if message.bodies else message.body
+            email = EmailMessage(
+                subject=message.subject, body=body, from_email=message.from_email, to=[address],
+            )
+            for name, content, content_type in message.attachments:
+                email.attach(name, content, content_type)
+            emails.append(email)
+
+        try:
+            with get_connection(fail_silently=False) as connection:
+                sent = connection.send_messages(emails)
+        except Exception as e:
+            raise ProviderError(f"Email batch failed: {e}") from e
+        # send_messages only reports a count; a short count means the tail was not sent
+        return list(addresses)[:sent or 0]
+
+
+class SmsGatewayProvider(Provider):
+    """
+    Bulk SMS through an HTTP gateway that takes a JSON list of numbers per request
+    (``SMS_GATEWAY_URL``/``SMS_GATEWAY_API_KEY``/``SMS_SENDER_ID``).
+    """
+
+    def __init__(self, channel):
+        super().__init__(channel)
+        self.url = getattr(settings, 'SMS_GATEWAY_URL', '')
+        self.api_key = getattr(settings, 'SMS_GATEWAY_API_KEY', '')
+        self.sender_id = getattr(settings, 'SMS_SENDER_ID', 'Lagooz')
+        self.max_length = getattr(settings, 'SMS_MAX_LENGTH', 459)
+        self.timeout = getattr(settings, 'SMS_GATEWAY_TIMEOUT', 10)
+
+    def send(self, message, addresses):
+        if not self.url:
+            raise ProviderError("SMS_GATEWAY_URL is not configured")
+        return self.send_groups(message, addresses, lambda body, group: self._send(message, body, group))
+
+    def _send(self, message, body, addresses):
+        text = f"{message.subject}: {body}" if message.subject else body
+        payload = json.dumps({
+            'api_key': self.api_key,
+            'from': self.sender_id,
+            'to': list(addresses),
+            'sms': text[:self.max_length],
+        }).encode()
+        request = urllib.request.Request(self.url, data=payload, headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = json.loads(response.read() or b'{}')
+        except (OSError, ValueError) as e:
+            raise ProviderError(f"SMS gateway request failed: {e}") from e
+        # Gateways that report per-number results list the rejected ones
+        rejected = set(body.get('rejected', []))
+        return [address for address in addresses if address not in rejected]
+
+
+class PushProvider(Provider):
+    """Firebase Cloud Messaging multicast (at most 500 tokens per call)."""
+    batch_size = 500
+
+    def __init__(self, channel):
+        super().__init__(channel)
+        if firebase_admin is None:
+            return
+        if not firebase_admin._apps and getattr(settings, 'FIREBASE_CREDENTIALS', ''):
+            firebase_admin.initialize_app(credentials.Certificate(settings.FIREBASE_CREDENTIALS))
+
+    def send(self, message, addresses):
+        if firebase_admin is None or not firebase_admin._apps:
+            raise ProviderError("firebase-admin is not installed or FIREBASE_CREDENTIALS is not set")
+        return self.send_groups(message, addresses, lambda body, group: self._send(message, body, group))
+
+    def _send(self, message, body, addresses):
+        tokens = list(addresses)
+        multicast = messaging.MulticastMessage(
+            notification=messaging.Notification(title=message.subject, body=body[:200]),
+            data={'communication_id': str(message.communication_id)},
+            tokens=tokens,
+        )
+        try:
+            response = messaging.send_each_for_multicast(multicast)
+        except Exception as e:
+            raise ProviderError(f"Push batch failed: {e}") from e
+        return [token for token, result in zip(tokens, response.responses) if result.success]
+
+
+# Batches handed to FakeProvider, per channel: [(communication_id, [addresses]), ...]
+outbox = defaultdict(list)
+
+
+class FakeProvider(Provider):
+    """
+    Records batches in ``outbox`` instead of sending them. ``FAKE_CHANNEL_LATENCY_MS``
+    adds a per-call delay standing in for the provider's round trip.
+    """
+
+    # The batch sizes of the providers being stood in for
+    BATCH_SIZES = {'in_app': InAppProvider.batch_size, 'push': PushProvider.batch_size}
+
+    def __init__(self, channel):
+        super().__init__(channel)
+        self.batch_size = self.BATCH_SIZES.get(channel, Provider.batch_size)
+        self.latency = getattr(settings, 'FAKE_CHANNEL_LATENCY_MS', 0) / 1000
+
+    def send(self, message, addresses):
+        if self.latency:
+            time.sleep(self.latency)
+        outbox[self.channel].append((message.communication_id, list(addresses)))
+        return list(addresses)
@@ -0,0 +1,230 @@
+"""
+Per-domain rate limiting of outbound email.
+
+Parent addresses are concentrated on a few mailbox providers, and a burst to one of
+them gets us throttled or greylisted. Each recipient domain has a token bucket
+(``EMAIL_DOMAIN_RATES``, else ``EMAIL_DEFAULT_DOMAIN_RATE``: messages per second and
+burst size). ``admit`` takes a token per address before a batch goes to the provider;
+addresses whose domain is out of tokens are not failed but handed back with the time
+their token will be ready.
+
+``Pacer`` hands a run's addresses out in provider batches as tokens allow, waiting in
+process for them, so a domain's backlog drains at its configured rate rather than a
+burst per beat tick. A run waits for at most ``EMAIL_RATE_LIMIT_MAX_WAIT`` seconds in
+all; whatever is still waiting then goes to the retry queue
+(accounts.notifications.retries) without spending a try, the n-th address of a domain
+due when the n-th token of its whole backlog is, and the next run paces it again.
+Only the retry and digest runs (default and bulk queues) wait; the first send of a
+message, on its priority queue, takes what the buckets allow and defers the rest.
+
+``interleave`` orders addresses round-robin by domain, so every batch spreads over
+many domains and a throttled one only holds back its own addresses.
+
+The buckets live in Redis (``EMAIL_RATE_LIMIT_REDIS_URL``) so every Celery worker
+draws from the same ones; a Lua script refills and takes tokens atomically against
+the Redis clock. Without a URL (``manage.py test``, ``CACHE_BACKEND=locmem``) the
+same bucket runs in process memory.
+"""
+# Standard Library
+import math
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+# Django Core
+from django.conf import settings
+
+# Local App Imports
+from .. import cache_keys
+
+RATE_LIMITED_CHANNELS = ('email',)
+
+# Refill and take in one step. Returns the tokens granted and the tokens left (as a
+# string: Redis truncates Lua numbers to integers).
+TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local granted = math.min(requested, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return {granted, tostring(tokens)}
+"""
+
+
+def domain_rate(domain):
+    """``(messages per second, burst)`` for ``domain``."""
+    rates = getattr(settings, 'EMAIL_DOMAIN_RATES', {})
+    return tuple(rates.get(domain) or getattr(settings, 'EMAIL_DEFAULT_DOMAIN_RATE', (5, 20)))
+
+
+def domain_of(address):
+    return address.rpartition('@')[2].lower()
+
+
+class RedisBuckets:
+    def __init__(self, url):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(TAKE_SCRIPT)
+
+    def take(self, key, requested, rate, capacity):
+        granted, tokens = self.script(keys=[key], args=[rate, capacity, requested])
+        return int(granted), float(tokens)
+
+
+class LocalBuckets:
+    """The same bucket for one process, for runs without Redis."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {}
+
+    def take(self, key, requested, rate, capacity):
+        with self._lock:
+            now = time.monotonic()
+            tokens, ts = self._state.get(key, (capacity, now))
+            tokens = min(capacity, tokens + max(0.0, now - ts) * rate)
+            granted = min(requested, math.floor(tokens))
+            tokens -= granted
+            self._state[key] = (tokens, now)
+        return granted, tokens
+
+    def reset(self):
+        with self._lock:
+            self._state.clear()
+
+
+_buckets = None
+
+
+def get_buckets():
+    global _buckets
+    if _buckets is None:
+        url = getattr(settings, 'EMAIL_RATE_LIMIT_REDIS_URL', '')
+        _buckets = RedisBuckets(url) if url else LocalBuckets()
+    return _buckets
+
+
+def interleave(addresses):
+    """``addresses`` reordered round-robin by domain, keeping each domain's order."""
+    by_domain = OrderedDict()
+    for address in addresses:
+        by_domain.setdefault(domain_of(address), []).append(address)
+    queues = list(by_domain.values())
+    ordered = []
+    for position in range(max(map(len, queues), default=0)):
+        ordered.extend(queue[position] for queue in queues if position < len(queue))
+    return ordered
+
+
+def admit(channel, addresses):
+    """
+    Take a token per address. Returns the addresses that may be sent now and
+    ``{unix time: [address, ...]}`` for those that must wait (when their token is ready).
+    """
+    if channel not in RATE_LIMITED_CHANNELS or not getattr(settings, 'EMAIL_RATE_LIMIT_ENABLED', True):
+        return list(addresses), {}
+
+    by_domain = defaultdict(list)
+    for address in addresses:
+        by_domain[domain_of(address)].append(address)
+
+    buckets = get_buckets()
+    now = time.time()
+    admitted, deferred = [], defaultdict(list)
+    for domain, domain_addresses in by_domain.items():
+        rate, capacity = domain_rate(domain)
+        key = cache_keys.make_key(cache_keys.EMAIL_RATE_LIMIT, domain)
+        granted, tokens = buckets.take(key, len(domain_addresses), rate, capacity)
+        admitted.extend(domain_addresses[:granted])
+        # The n-th waiting address gets the n-th token to come
+        for n, address in enumerate(domain_addresses[granted:], start=1):
+            deferred[now + (n - tokens) / rate].append(address)
+    return admitted, dict(deferred)
+
+
+def max_wait():
+    return getattr(settings, 'EMAIL_RATE_LIMIT_MAX_WAIT', 45)
+
+
+def ready_times(channel, addresses):
+    """
+    ``{unix time: [address, ...]}`` for ``addresses`` left waiting: the n-th address
+    of a domain is due when the n-th token to come is.
+    """
+    if channel not in RATE_LIMITED_CHANNELS or not getattr(settings, 'EMAIL_RATE_LIMIT_ENABLED', True):
+        return {math.ceil(time.time()): list(addresses)} if addresses else {}
+
+    by_domain = defaultdict(list)
+    for address in addresses:
+        by_domain[domain_of(address)].append(address)
+
+    buckets = get_buckets()
+    now = time.time()
+    deferred = defaultdict(list)
+    for domain, domain_addresses in by_domain.items():
+        rate, capacity = domain_rate(domain)
+        _, tokens = buckets.take(cache_keys.make_key(cache_keys.EMAIL_RATE_LIMIT, domain), 0, rate, capacity)
+        for n, address in enumerate(domain_addresses, start=1):
+            deferred[math.ceil(now + max(0, n - tokens) / rate)].append(address)
+    return dict(deferred)
+
+
+class Pacer:
+    """
+    Provider batches of ``addresses`` (interleaved by domain) as their domains' tokens
+    allow. Iterating waits for tokens until ``give_up_at`` (a unix time, by default
+    ``EMAIL_RATE_LIMIT_MAX_WAIT`` from now); the addresses still waiting then are in
+    ``deferred`` (see ``ready_times``). ``stop`` ends the run early and returns the
+    addresses not handed out.
+    """
+
+    def __init__(self, channel, addresses, batch_size, give_up_at=None):
+        self.channel = channel
+        self.batch_size = batch_size
+        limited = channel in RATE_LIMITED_CHANNELS
+        self.pending = interleave(addresses) if limited else list(addresses)
+        self.give_up_at = time.time() + max_wait() if give_up_at is None else give_up_at
+        self.deferred = {}
+
+    def __iter__(self):
+        while self.pending:
+            batch, waiting = admit(self.channel, self.pending[:self.batch_size])
+            self.pending = self.pending[self.batch_size:]
+            if waiting:
+                waiting_addresses = [address for ready_at in sorted(waiting) for address in waiting[ready_at]]
+                if min(waiting) > self.give_up_at:
+                    self.deferred = ready_times(self.channel, waiting_addresses + self.pending)
+                    self.pending = []
+                else:
+                    self.pending.extend(waiting_addresses)
+                    if not batch:
+                        time.sleep(max(0, min(self._wake_at(waiting), self.give_up_at) - time.time()))
+            if batch:
+                yield batch
+
+    @staticmethod
+    def _wake_at(waiting):
+        # When the first domain has a full burst for its waiting addresses: waking for
+        # every token would send tiny batches, waking later would waste its refill
+        times = defaultdict(list)
+        for ready_at in sorted(waiting):
+            for address in waiting[ready_at]:
+                times[domain_of(address)].append(ready_at)
+        return min(
+            domain_times[min(len(domain_times), domain_rate(domain)[1]) - 1]
+            for domain, domain_times in times.items()
+        )
+
+    def stop(self):
+        rest, self.pending = self.pending, []
+        return rest
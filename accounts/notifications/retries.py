@@ -0,0 +1,200 @@
+"""
+Retry queue for failed deliveries.
+
+When a provider rejects an address or a whole batch fails, ``deliver`` (see
+accounts.notifications.channels) records a ``DeliveryAttempt`` per address instead of
+leaving the recipient undelivered for good. ``retry_due`` runs from Celery beat every
+minute and resends the attempts that are due, grouped by communication and channel
+so they still go out in provider batches:
+
+* a failure schedules the next try with exponential backoff and full jitter
+  (``DELIVERY_RETRY_BASE`` doubling up to ``DELIVERY_RETRY_MAX`` seconds), so a burst
+  of failures does not come back as a burst of retries;
+* after ``DELIVERY_MAX_ATTEMPTS`` tries the attempt is dead-lettered (``dead``) and
+  left for an admin to inspect, retry or drop (``DeliveryAttempt`` admin);
+* while a channel's circuit breaker is open (accounts.notifications.breaker), its
+  attempts are pushed back to the reopening time without spending a try; so are
+  emails still over their domain's rate limit once the run has paced them for
+  ``EMAIL_RATE_LIMIT_MAX_WAIT`` seconds (accounts.notifications.ratelimit).
+"""
+# Standard Library
+import logging
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+# Django Core
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+# Third-Party
+from celery.utils.time import get_exponential_backoff_interval
+
+# Local App Imports
+from .. import cache_keys
+from ..id_joins import id_join
+from . import breaker, ratelimit
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_MAX_ATTEMPTS = getattr(settings, 'DELIVERY_MAX_ATTEMPTS', 6)
+DELIVERY_RETRY_BASE = getattr(settings, 'DELIVERY_RETRY_BASE', 60)
+DELIVERY_RETRY_MAX = getattr(settings, 'DELIVERY_RETRY_MAX', 6 * 60 * 60)
+
+# Attempts picked up per run
+RETRY_BATCH = 2000
+# A run holds this lock so overlapping beat ticks do not send the same attempt twice
+RETRY_LOCK_TIMEOUT = 10 * 60
+# Retrying attempts this far past their due time are listed as stuck
+STUCK_AFTER = timedelta(minutes=30)
+
+
+def backoff(attempts):
+    """Seconds to wait after failed try number ``attempts``."""
+    return get_exponential_backoff_interval(
+        DELIVERY_RETRY_BASE, attempts - 1, DELIVERY_RETRY_MAX, full_jitter=True,
+    )
+
+
+def reopens_at(until):
+    return datetime.fromtimestamp(until, tz=dt_timezone.utc)
+
+
+def queued_addresses(communication, channel):
+    """Addresses of ``communication`` on ``channel`` that the retry queue already owns."""
+    from ..models import DeliveryAttempt
+
+    return set(
+        DeliveryAttempt.objects.filter(communication=communication, channel=channel)
+        .values_list('address', flat=True)
+    )
+
+
+def queue_failures(communication, channel, targets, error, deferred_until=None):
+    """
+    Queue ``targets`` (``{address: [row_id, ...]}``) for retry. ``deferred_until`` (a
+    paused channel's reopening time) defers them without counting a try.
+    """
+    from ..models import DeliveryAttempt
+
+    now = timezone.now()
+    attempts = 0 if deferred_until else 1
+    next_attempt_at = reopens_at(deferred_until) if deferred_until else now + timedelta(seconds=backoff(1))
+    DeliveryAttempt.objects.bulk_create(
+        [
+            DeliveryAttempt(
+                communication=communication, channel=channel, address=address[:255],
+                recipient_ids=row_ids, attempts=attempts, next_attempt_at=next_attempt_at,
+                last_error=error,
+                status='dead' if attempts >= DELIVERY_MAX_ATTEMPTS else 'retrying',
+            )
+            for address, row_ids in targets.items()
+        ],
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+
+
+def _retry_group(communication, channel, attempts, now, give_up_at):
+    from ..merge_fields import render_rows
+    from .channels import batch_message, build_message, get_provider, mark_delivered, send_batch
+
+    provider = get_provider(channel)
+    message = build_message(communication, attachments=channel == 'email')
+    row_bodies = render_rows(communication, [pk for attempt in attempts for pk in attempt.recipient_ids])
+    by_address = {attempt.address: attempt for attempt in attempts}
+    pacer = ratelimit.Pacer(channel, list(by_address), provider.batch_size, give_up_at)
+    for addresses in pacer:
+        until = breaker.opened_until(channel)
+        if until is not None:
+            for address in addresses + pacer.stop():
+                by_address[address].next_attempt_at = reopens_at(until)
+            return
+
+        batch = [by_address[address] for address in addresses]
+        targets = {attempt.address: attempt.recipient_ids for attempt in batch}
+        accepted, error = send_batch(provider, batch_message(message, row_bodies, targets), addresses)
+        for attempt in batch:
+            if attempt.address in accepted:
+                attempt.status = 'sent'
+                attempt.next_attempt_at = None
+                continue
+            attempt.attempts += 1
+            attempt.last_error = error
+            if attempt.attempts >= DELIVERY_MAX_ATTEMPTS:
+                attempt.status = 'dead'
+                attempt.next_attempt_at = None
+                logger.warning(
+                    f"[RETRIES] Dead-lettered {channel} delivery of communication {communication.pk} "
+                    f"to {attempt.address} after {attempt.attempts} attempts: {error}"
+                )
+            else:
+                attempt.next_attempt_at = now + timedelta(seconds=backoff(attempt.attempts))
+        mark_delivered([pk for attempt in batch if attempt.status == 'sent' for pk in attempt.recipient_ids])
+
+    # Still over the domain's rate limit: wait for its tokens without spending a try
+    for ready_at, addresses in pacer.deferred.items():
+        for address in addresses:
+            by_address[address].next_attempt_at = reopens_at(ready_at)
+
+
+def retry_due(limit=RETRY_BATCH):
+    """Resend the attempts that are due. Returns how many ended up in each status."""
+    from ..models import DeliveryAttempt
+
+    lock = cache_keys.make_key(cache_keys.DELIVERY_RETRY_LOCK)
+    if not cache.add(lock, True, RETRY_LOCK_TIMEOUT):
+        logger.info("[RETRIES] Previous retry run still in progress; skipping")
+        return {}
+
+    try:
+        now = timezone.now()
+        due = list(
+            DeliveryAttempt.objects.filter(status='retrying', next_attempt_at__lte=now)
+            .select_related('communication__sender')
+            .order_by('next_attempt_at')[:limit]
+        )
+        paused = breaker.open_channels({attempt.channel for attempt in due})
+
+        groups = defaultdict(list)
+        for attempt in due:
+            if attempt.channel in paused:
+                attempt.next_attempt_at = reopens_at(paused[attempt.channel])
+            else:
+                groups[(attempt.communication_id, attempt.channel)].append(attempt)
+
+        # One budget for waiting on rate limits across the run, well inside the beat interval
+        give_up_at = time.time() + ratelimit.max_wait()
+        for (_, channel), attempts in groups.items():
+            _retry_group(attempts[0].communication, channel, attempts, now, give_up_at)
+
+        # Attempts that went through only change status: one UPDATE rather than a CASE per row
+        sent = [attempt.pk for attempt in due if attempt.status == 'sent']
+        with id_join(sent) as sent_ids:
+            DeliveryAttempt.objects.filter(id__in=sent_ids).update(status='sent', next_attempt_at=None, updated_at=now)
+        rest = [attempt for attempt in due if attempt.status != 'sent']
+        for attempt in rest:
+            attempt.updated_at = now
+        DeliveryAttempt.objects.bulk_update(
+            rest, ['status', 'attempts', 'next_attempt_at', 'last_error', 'updated_at'], batch_size=500,
+        )
+    finally:
+        cache.delete(lock)
+
+    return dict(Counter(attempt.status for attempt in due))
+
+
+def requeue(attempts):
+    """Give dead or stuck attempts a fresh set of tries, due now (admin action)."""
+    return attempts.exclude(status='sent').update(
+        status='retrying', attempts=0, next_attempt_at=timezone.now(), updated_at=timezone.now(),
+    )
+
+
+def stuck(queryset):
+    """Dead attempts and retrying ones overdue by more than ``STUCK_AFTER``."""
+    return queryset.filter(
+        Q(status='dead') | Q(status='retrying', next_attempt_at__lt=timezone.now() - STUCK_AFTER)
+    )
@@ -0,0 +1,57 @@
+"""
+Priority routing of Celery work.
+
+Sending a communication (and delivering it over email/SMS/push) runs on one of three
+queues, so a large newsletter never sits in front of a message a parent must see now:
+
+* ``urgent`` - ``personal``/``notification`` messages and any message to at most
+  ``URGENT_MAX_RECIPIENTS`` people;
+* ``bulk`` - ``announcement``/``news`` fan-outs to at least ``BULK_MIN_RECIPIENTS``
+  people (broadcasts always qualify), plus maintenance tasks (archive, rollups);
+* ``default`` - everything else.
+
+Each queue gets its own worker so bulk work cannot occupy urgent slots, and the bulk
+worker's concurrency caps how much of the database fan-outs may use at once::
+
+    celery -A lagooz_coms worker -Q urgent -c 4
+    celery -A lagooz_coms worker -Q default -c 4
+    celery -A lagooz_coms worker -Q bulk -c 2
+
+(a worker started without ``-Q`` consumes all three). Queue waits and run times are
+recorded per queue by ``accounts.metrics.task_metrics``.
+"""
+# Django Core
+from django.conf import settings
+
+URGENT_QUEUE = 'urgent'
+DEFAULT_QUEUE = 'default'
+BULK_QUEUE = 'bulk'
+QUEUES = (URGENT_QUEUE, DEFAULT_QUEUE, BULK_QUEUE)
+
+URGENT_MESSAGE_TYPES = ('personal', 'notification')
+BULK_MESSAGE_TYPES = ('announcement', 'news')
+URGENT_MAX_RECIPIENTS = getattr(settings, 'URGENT_MAX_RECIPIENTS', 50)
+BULK_MIN_RECIPIENTS = getattr(settings, 'BULK_MIN_RECIPIENTS', 1000)
+
+
+def recipient_count(communication):
+    """How many people the communication is addressed to, without resolving them."""
+    if communication.is_broadcast:
+        return max(communication.broadcast_size, BULK_MIN_RECIPIENTS)
+    count = len(communication.manual_emails or [])
+    if communication.audience_id:
+        return count + communication.audience.size
+    # Once sent, its inbox rows are the audience
+    rows = communication.recipients.filter(recipient__isnull=False).count()
+    return count + (rows or len(communication.selected_recipient_ids or []))
+
+
+def queue_for(communication):
+    if communication.message_type in URGENT_MESSAGE_TYPES:
+        return URGENT_QUEUE
+    count = recipient_count(communication)
+    if count <= URGENT_MAX_RECIPIENTS:
+        return URGENT_QUEUE
+    if communication.message_type in BULK_MESSAGE_TYPES and count >= BULK_MIN_RECIPIENTS:
+        return BULK_QUEUE
+    return DEFAULT_QUEUE
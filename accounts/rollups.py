@@ -0,0 +1,330 @@
+"""
+Precomputed dashboard statistics.
+
+Three rollup tables back the role dashboards so a page view never runs COUNT/GROUP BY
+over the message tables:
+
+* ``UserMessageStats`` - per-user received/unread/pending-reply/sent counters, bumped
+  incrementally by the send, read, reply and delete paths.
+* ``BranchDailyStats`` - per-branch, per-day message counters, bumped on the same
+  events and rebuilt nightly from source to correct any drift.
+* ``BranchStats`` - user totals per branch, refreshed periodically by Celery.
+
+``Communication.reply_count``/``responder_count`` are maintained the same way for the
+sender's reply thread. Broadcasts (accounts.broadcasts) only count towards a user's
+``UserMessageStats`` once their inbox row exists; ``dashboard_stats`` adds the rest.
+"""
+# Standard Library
+import logging
+from datetime import timedelta
+
+# Django Core
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+# Local App Imports
+from .broadcasts import pending_counts, recipients
+from .id_joins import id_join
+from .models import (
+    Branch, BranchDailyStats, BranchStats, Communication, CommunicationRecipient,
+    CustomUser, MessageReply, UserMessageStats,
+)
+
+logger = logging.getLogger(__name__)
+
+DAILY_FIELDS = ('messages_sent', 'recipients_reached', 'messages_read', 'replies')
+USER_FIELDS = ('received', 'unread', 'pending_replies', 'sent')
+
+
+# ---------------------------------------------------------------------------
+# Incremental updates
+# ---------------------------------------------------------------------------
+
+def _bump_daily(branch_id, day, **deltas):
+    deltas = {name: n for name, n in deltas.items() if n}
+    if not branch_id or not deltas:
+        return
+    updates = {name: F(name) + n for name, n in deltas.items()}
+    if BranchDailyStats.objects.filter(branch_id=branch_id, date=day).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            BranchDailyStats.objects.create(branch_id=branch_id, date=day, **deltas)
+    except IntegrityError:
+        # Another request created the row first
+        BranchDailyStats.objects.filter(branch_id=branch_id, date=day).update(**updates)
+
+
+def _ensure_user_stats(user_ids, joined_ids=None):
+    # ``joined_ids``: the same IDs as yielded by ``id_join``, for the lookup
+    existing = set(
+        UserMessageStats.objects.filter(user_id__in=user_ids if joined_ids is None else joined_ids)
+        .values_list('user_id', flat=True)
+    )
+    missing = [UserMessageStats(user_id=pk) for pk in set(user_ids) - existing]
+    if missing:
+        UserMessageStats.objects.bulk_create(missing, ignore_conflicts=True, batch_size=5000)
+
+
+def record_sent(communication, recipient_ids):
+    """A communication was delivered in-app to ``recipient_ids``."""
+    day = timezone.localdate(communication.sent_at or timezone.now())
+    recipient_ids = list(recipient_ids)
+
+    _bump_daily(communication.sender.branch_id, day, messages_sent=1)
+    with id_join(recipient_ids) as joined_ids:
+        for branch_id, n in (
+            CustomUser.objects.filter(id__in=joined_ids, branch__isnull=False)
+            .values_list('branch_id').annotate(n=Count('id')).order_by()
+        ):
+            _bump_daily(branch_id, day, recipients_reached=n)
+
+        _ensure_user_stats(recipient_ids, joined_ids)
+        UserMessageStats.objects.filter(user_id__in=joined_ids).update(
+            received=F('received') + 1,
+            unread=F('unread') + 1,
+            pending_replies=F('pending_replies') + (1 if communication.requires_response else 0),
+        )
+    _ensure_user_stats([communication.sender_id])
+    UserMessageStats.objects.filter(user_id=communication.sender_id).update(sent=F('sent') + 1)
+
+
+def record_broadcast_sent(communication):
+    """A communication was sent as a broadcast; its audience is counted, not written."""
+    day = timezone.localdate(communication.sent_at or timezone.now())
+    reached = dict(
+        recipients(communication).filter(branch__isnull=False)
+        .values_list('branch_id').annotate(n=Count('id')).order_by()
+    )
+    communication.broadcast_size = sum(reached.values())
+    Communication.objects.filter(pk=communication.pk).update(broadcast_size=communication.broadcast_size)
+
+    _bump_daily(communication.sender.branch_id, day, messages_sent=1)
+    for branch_id, n in reached.items():
+        _bump_daily(branch_id, day, recipients_reached=n)
+
+    _ensure_user_stats([communication.sender_id])
+    UserMessageStats.objects.filter(user_id=communication.sender_id).update(sent=F('sent') + 1)
+
+
+def record_received(user, entry):
+    """A broadcast's inbox row was created for ``user`` (see ``broadcasts.materialize``)."""
+    _ensure_user_stats([user.pk])
+    UserMessageStats.objects.filter(user=user).update(
+        received=F('received') + 1,
+        unread=F('unread') + (0 if entry.read else 1),
+        pending_replies=F('pending_replies') + (1 if entry.requires_response and not entry.has_responded else 0),
+    )
+
+
+def record_read(user):
+    """``user`` opened one of their unread messages for the first time."""
+    UserMessageStats.objects.filter(user=user, unread__gt=0).update(unread=F('unread') - 1)
+    _bump_daily(user.branch_id, timezone.localdate(), messages_read=1)
+
+
+def record_reply(user, communication_id, first_reply):
+    """``user`` replied to ``communication_id``; ``first_reply`` if they had not replied before."""
+    Communication.objects.filter(pk=communication_id).update(
+        reply_count=F('reply_count') + 1,
+        responder_count=F('responder_count') + (1 if first_reply else 0),
+    )
+    if first_reply:
+        UserMessageStats.objects.filter(user=user, pending_replies__gt=0).update(
+            pending_replies=F('pending_replies') - 1
+        )
+    _bump_daily(user.branch_id, timezone.localdate(), replies=1)
+
+
+def record_deleted(user, entry):
+    """The recipient soft-deleted ``entry`` from their inbox."""
+    qs = UserMessageStats.objects.filter(user=user)
+    qs.filter(received__gt=0).update(received=F('received') - 1)
+    if not entry.read:
+        qs.filter(unread__gt=0).update(unread=F('unread') - 1)
+    if entry.requires_response and not entry.has_responded:
+        qs.filter(pending_replies__gt=0).update(pending_replies=F('pending_replies') - 1)
+
+
+def record_inbox_cleared(user):
+    UserMessageStats.objects.filter(user=user).update(received=0, unread=0, pending_replies=0)
+
+
+# ---------------------------------------------------------------------------
+# Periodic rebuilds
+# ---------------------------------------------------------------------------
+
+def _upsert(model, rows, unique_field, update_fields, batch_size=None):
+    """Insert ``rows``, updating ``update_fields`` of those whose ``unique_field`` exists."""
+    if connection.features.supports_update_conflicts_with_target:
+        model.objects.bulk_create(
+            rows, batch_size=batch_size, update_conflicts=True, unique_fields=[unique_field],
+            update_fields=update_fields,
+        )
+        return
+
+    # MySQL cannot name the conflict target: update the rows present, then insert the rest
+    attname = model._meta.get_field(unique_field).attname
+    existing = dict(model.objects.values_list(attname, 'pk').iterator(chunk_size=10000))
+    present, missing = [], []
+    for row in rows:
+        row.pk = existing.get(getattr(row, attname))
+        (missing if row.pk is None else present).append(row)
+    with transaction.atomic():
+        model.objects.bulk_update(present, update_fields, batch_size=batch_size or 1000)
+        model.objects.bulk_create(missing, batch_size=batch_size, ignore_conflicts=True)
+
+
+def refresh_branch_stats():
+    """Recompute user totals for every branch with one GROUP BY."""
+    totals = {}
+    for branch_id, role, n in (
+        CustomUser.objects.filter(branch__isnull=False, is_active=True)
+        .values_list('branch_id', 'role').annotate(n=Count('id')).order_by()
+    ):
+        totals.setdefault(branch_id, {})[role] = n
+
+    rows = [
+        BranchStats(
+            branch_id=branch_id,
+            students=totals.get(branch_id, {}).get('student', 0),
+            parents=totals.get(branch_id, {}).get('parent', 0),
+            staff=totals.get(branch_id, {}).get('staff', 0),
+            branch_admins=totals.get(branch_id, {}).get('branch_admin', 0),
+            updated_at=timezone.now(),
+        )
+        for branch_id in Branch.objects.values_list('id', flat=True)
+    ]
+    _upsert(BranchStats, rows, 'branch', ['students', 'parents', 'staff', 'branch_admins', 'updated_at'])
+    return len(rows)
+
+
+def rebuild_daily_stats(day):
+    """Recompute one day's ``BranchDailyStats`` from the message tables."""
+    counts = {}
+
+    def add(rows, name):
+        for branch_id, n in rows:
+            if branch_id:
+                counts.setdefault(branch_id, dict.fromkeys(DAILY_FIELDS, 0))[name] = n
+
+    add(Communication.objects.filter(sent=True, sent_at__date=day)
+        .values_list('sender__branch_id').annotate(n=Count('id')).order_by(), 'messages_sent')
+    reached = {}
+    for branch_id, n in (
+        CommunicationRecipient.objects.filter(
+            communication__sent=True, communication__sent_at__date=day, communication__is_broadcast=False
+        ).values_list('recipient__branch_id').annotate(n=Count('id')).order_by()
+    ):
+        reached[branch_id] = reached.get(branch_id, 0) + n
+    # Broadcasts have no row per recipient; count their target groups' current members
+    for communication in Communication.objects.filter(is_broadcast=True, sent=True, sent_at__date=day):
+        for branch_id, n in (
+            recipients(communication).values_list('branch_id').annotate(n=Count('id')).order_by()
+        ):
+            reached[branch_id] = reached.get(branch_id, 0) + n
+    add(reached.items(), 'recipients_reached')
+    add(CommunicationRecipient.objects.filter(read=True, read_at__date=day)
+        .values_list('recipient__branch_id').annotate(n=Count('id')).order_by(), 'messages_read')
+    add(MessageReply.objects.filter(replied_at__date=day)
+        .values_list('responder__branch_id').annotate(n=Count('id')).order_by(), 'replies')
+
+    with transaction.atomic():
+        BranchDailyStats.objects.filter(date=day).delete()
+        BranchDailyStats.objects.bulk_create(
+            [BranchDailyStats(branch_id=branch_id, date=day, **values) for branch_id, values in counts.items()]
+        )
+    return len(counts)
+
+
+def rebuild_user_stats(batch_size=5000):
+    """Recompute every ``UserMessageStats`` row; corrects drift from archival or missed events."""
+    inbox = {
+        row['recipient_id']: row
+        for row in CommunicationRecipient.objects.filter(
+            recipient__isnull=False, deleted=False, communication__sent=True
+        ).values('recipient_id').annotate(
+            received=Count('id'),
+            unread=Count('id', filter=Q(read=False)),
+            pending_replies=Count('id', filter=Q(requires_response=True, has_responded=False)),
+        ).order_by()
+    }
+    sent = dict(
+        Communication.objects.filter(sent=True, is_draft=False)
+        .values_list('sender_id').annotate(n=Count('id')).order_by()
+    )
+
+    rows = []
+    now = timezone.now()
+    for user_id in CustomUser.objects.values_list('id', flat=True).iterator(chunk_size=batch_size):
+        counts = inbox.get(user_id, {})
+        rows.append(UserMessageStats(
+            user_id=user_id,
+            received=counts.get('received', 0),
+            unread=counts.get('unread', 0),
+            pending_replies=counts.get('pending_replies', 0),
+            sent=sent.get(user_id, 0),
+            updated_at=now,
+        ))
+    _upsert(UserMessageStats, rows, 'user', [*USER_FIELDS, 'updated_at'], batch_size=batch_size)
+    return len(rows)
+
+
+def rebuild_reply_counts(batch_size=1000):
+    """Recompute ``Communication.reply_count``/``responder_count``; returns how many were corrected."""
+    replies = dict(
+        MessageReply.objects.values_list('communication_id').annotate(n=Count('id')).order_by()
+    )
+    responders = dict(
+        CommunicationRecipient.objects.filter(has_responded=True)
+        .values_list('communication_id').annotate(n=Count('id')).order_by()
+    )
+
+    stale = []
+    for pk, reply_count, responder_count in (
+        Communication.objects.filter(requires_response=True)
+        .values_list('id', 'reply_count', 'responder_count').iterator(chunk_size=batch_size)
+    ):
+        counts = (replies.get(pk, 0), responders.get(pk, 0))
+        if counts != (reply_count, responder_count):
+            stale.append(Communication(id=pk, reply_count=counts[0], responder_count=counts[1]))
+    Communication.objects.bulk_update(stale, ['reply_count', 'responder_count'], batch_size=batch_size)
+    return len(stale)
+
+
+# ---------------------------------------------------------------------------
+# Read path
+# ---------------------------------------------------------------------------
+
+def dashboard_stats(user, days=7):
+    """Everything a role dashboard shows, in at most four indexed queries."""
+    since = timezone.localdate() - timedelta(days=days - 1)
+    own = UserMessageStats.objects.filter(user=user).first()
+    stats = {name: getattr(own, name, 0) for name in USER_FIELDS}
+    for name, n in pending_counts(user).items():
+        stats[name] += n
+
+    if user.role == 'superadmin':
+        branch_stats = BranchStats.objects.all()
+        daily = BranchDailyStats.objects.filter(date__gte=since)
+    elif user.branch_id:
+        branch_stats = BranchStats.objects.filter(branch_id=user.branch_id)
+        daily = BranchDailyStats.objects.filter(branch_id=user.branch_id, date__gte=since)
+    else:
+        branch_stats = daily = None
+
+    for name in ('students', 'parents', 'staff', 'branch_admins'):
+        stats[name] = 0
+    for name in DAILY_FIELDS:
+        stats[f"{name}_week"] = 0
+
+    if branch_stats is not None:
+        totals = branch_stats.aggregate(
+            students=Sum('students'), parents=Sum('parents'),
+            staff=Sum('staff'), branch_admins=Sum('branch_admins'),
+        )
+        week = daily.aggregate(**{f"{name}_week": Sum(name) for name in DAILY_FIELDS})
+        stats.update({key: value or 0 for key, value in {**totals, **week}.items()})
+
+    return stats
@@ -0,0 +1,574 @@
+# Standard Library
+import csv
+import io
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime
+
+# Django Core
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+# Third-Party
+from phonenumber_field.phonenumber import to_python as to_phone_number
+
+# Local App Imports
+from .models import (
+    Branch, ClassArm, CustomUser, NonTeachingPosition, ParentProfile,
+    StaffProfile, StudentClass, StudentProfile, TeachingPosition
+)
+from .utils import allocate_profile_numbers, get_prefix_for_user
+
+logger = logging.getLogger(__name__)
+
+
+STAFF_ROLES = ['staff', 'branch_admin', 'superadmin']
+IMPORTABLE_ROLES = ['student', 'parent'] + STAFF_ROLES
+GENDERS = ['male', 'female', 'others']
+RELATIONSHIPS = ['father', 'mother', 'guardian', 'other']
+CONTACT_METHODS = ['phone', 'email', 'sms']
+STAFF_TYPES = ['teaching', 'non_teaching', 'both']
+
+ADMISSION_NUMBER_PATTERN = r'^LAGS/STU/\d{4}/\d{4}$'
+PARENT_NUMBER_PATTERN = r'^LAGS/PAR/\d{4}/\d{4}$'
+
+DEFAULT_BATCH_SIZE = 500
+
+
+@dataclass
+class RowError:
+    line: int
+    email: str
+    message: str
+
+
+@dataclass
+class ImportResult:
+    created: dict = field(default_factory=lambda: {role: 0 for role in IMPORTABLE_ROLES})
+    errors: list = field(default_factory=list)
+    rows_read: int = 0
+
+    @property
+    def total_created(self):
+        return sum(self.created.values())
+
+
+class RowInvalid(Exception):
+    pass
+
+
+def read_roster(file_obj, filename):
+    """
+    Yield ``(line_number, row)`` pairs from a CSV or XLSX roster without loading
+    the whole file into memory. Header names are lower-cased and stripped.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.xlsx':
+        yield from _read_xlsx(file_obj)
+    elif extension == '.csv':
+        yield from _read_csv(file_obj)
+    else:
+        raise ValueError(f"Unsupported roster format '{extension}'. Use a .csv or .xlsx file.")
+
+
+def _read_csv(file_obj):
+    if isinstance(file_obj, io.TextIOBase):
+        text = file_obj
+    else:
+        text = io.TextIOWrapper(file_obj, encoding='utf-8-sig', newline='')
+
+    reader = csv.DictReader(text)
+    reader.fieldnames = [(name or '').strip().lower() for name in reader.fieldnames or []]
+    for row in reader:
+        yield reader.line_num, {key: _clean_cell(value) for key, value in row.items() if key}
+
+
+def _read_xlsx(file_obj):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_obj, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if not header:
+            return
+        keys = [str(name or '').strip().lower() for name in header]
+        for line, values in enumerate(rows, start=2):
+            if not any(value not in (None, '') for value in values):
+                continue
+            yield line, {key: _clean_cell(value) for key, value in zip(keys, values) if key}
+    finally:
+        workbook.close()
+
+
+def _clean_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _init_hash_worker(settings_module):
+    # Needed when the pool uses the "spawn" start method (Windows/macOS).
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+class RosterImporter:
+    """
+    Bulk-create students, parents and staff from roster rows.
+
+    Rows are validated in batches against lookups preloaded once per run, so no
+    per-row ``exists()`` queries are needed. Passwords are hashed in a process
+    pool and each batch is written with ``bulk_create`` inside one transaction.
+    Parents must appear before (or in the same batch as) their children.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, hash_workers=None,
+                 default_branch=None, restrict_branch=None, allow_superadmin=False, dry_run=False):
+        self.batch_size = batch_size
+        self.hash_workers = hash_workers if hash_workers is not None else getattr(
+            settings, 'ROSTER_IMPORT_HASH_WORKERS', os.cpu_count() or 1
+        )
+        self.default_branch = default_branch
+        # Branch admins may only import into their own branch
+        self.restrict_branch = restrict_branch
+        # Superadmin rows become Django superusers; only trusted callers may create them
+        self.allow_superadmin = allow_superadmin
+        self.dry_run = dry_run
+        self.result = ImportResult()
+        self._executor = None
+
+    def run(self, rows):
+        self._load_lookups()
+
+        if self.hash_workers > 1 and not self.dry_run:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.hash_workers,
+                initializer=_init_hash_worker,
+                initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'lagooz_coms.settings'),),
+            )
+
+        try:
+            batch = []
+            for line, row in rows:
+                self.result.rows_read += 1
+                batch.append((line, row))
+                if len(batch) >= self.batch_size:
+                    self._process_batch(batch)
+                    batch = []
+            if batch:
+                self._process_batch(batch)
+        finally:
+            if self._executor:
+                self._executor.shutdown()
+                self._executor = None
+
+        logger.info(
+            f"[ROSTER] Read {self.result.rows_read} rows, created {self.result.total_created} users, "
+            f"{len(self.result.errors)} rows rejected{' (dry run)' if self.dry_run else ''}."
+        )
+        return self.result
+
+    # --- Lookups ---
+
+    def _load_lookups(self):
+        self.emails = set(email.lower() for email in CustomUser.objects.values_list('email', flat=True))
+        self.usernames = set(CustomUser.objects.values_list('username', flat=True))
+        self.admission_numbers = set(
+            StudentProfile.objects.values_list('admission_number', flat=True)
+        )
+        self.parent_numbers = set(
+            ParentProfile.objects.exclude(parent_number__isnull=True).values_list('parent_number', flat=True)
+        )
+        self.branches = {name.lower(): pk for pk, name in Branch.objects.values_list('id', 'name')}
+        self.classes = {name.lower(): pk for pk, name in StudentClass.objects.values_list('id', 'name')}
+        self.arms = {name.lower(): pk for pk, name in ClassArm.objects.values_list('id', 'name')}
+        self.class_arms = set(StudentClass.arms.through.objects.values_list('studentclass_id', 'classarm_id'))
+        self.teaching_positions = {
+            name.lower(): pk for pk, name in TeachingPosition.objects.values_list('id', 'name')
+        }
+        self.non_teaching_positions = {
+            name.lower(): pk for pk, name in NonTeachingPosition.objects.values_list('id', 'name')
+        }
+        # parent email -> (ParentProfile id, branch id)
+        self.parents = {
+            email.lower(): (profile_id, branch_id)
+            for profile_id, email, branch_id in ParentProfile.objects.values_list(
+                'id', 'user__email', 'user__branch_id'
+            )
+        }
+
+    # --- Validation ---
+
+    def _process_batch(self, batch):
+        pending = []
+        batch_parents = {}
+
+        for line, row in batch:
+            try:
+                entry = self._validate_row(row, batch_parents)
+            except RowInvalid as e:
+                self.result.errors.append(RowError(line, row.get('email', ''), str(e)))
+                continue
+
+            # Reserve identifiers so duplicates later in the file are rejected
+            self.emails.add(entry['user']['email'].lower())
+            self.usernames.add(entry['user']['username'])
+            if entry['role'] == 'parent':
+                batch_parents[entry['user']['email'].lower()] = entry['user']['branch_id']
+                if entry['profile'].get('parent_number'):
+                    self.parent_numbers.add(entry['profile']['parent_number'])
+            elif entry['role'] == 'student' and entry['profile'].get('admission_number'):
+                self.admission_numbers.add(entry['profile']['admission_number'])
+
+            entry['line'] = line
+            pending.append(entry)
+
+        if not pending:
+            return
+
+        if self.dry_run:
+            for entry in pending:
+                self.result.created[entry['role']] += 1
+            for email, branch_id in batch_parents.items():
+                self.parents[email] = (None, branch_id)
+            return
+
+        passwords = self._hash_passwords([entry.pop('password') for entry in pending])
+        self._new_parents = {}
+        try:
+            with transaction.atomic():
+                self._write_batch(pending, passwords)
+        except Exception as e:
+            logger.error(f"[ROSTER] Failed to write batch starting at line {pending[0]['line']}: {e}", exc_info=True)
+            for entry in pending:
+                self.emails.discard(entry['user']['email'].lower())
+                self.usernames.discard(entry['user']['username'])
+                self.result.errors.append(
+                    RowError(entry['line'], entry['user']['email'], f"Batch could not be saved: {e}")
+                )
+            return
+
+        self.parents.update(self._new_parents)
+        for entry in pending:
+            self.result.created[entry['role']] += 1
+
+    def _validate_row(self, row, batch_parents):
+        role = row.get('role', '').lower().replace(' ', '_')
+        if role not in IMPORTABLE_ROLES:
+            raise RowInvalid(f"Unknown role '{row.get('role', '')}'.")
+        if role == 'superadmin' and not self.allow_superadmin:
+            raise RowInvalid("Only superusers can import superadmin accounts.")
+
+        email = row.get('email', '')
+        if not email:
+            raise RowInvalid("Email is required.")
+        try:
+            validate_email(email)
+        except ValidationError:
+            raise RowInvalid(f"Invalid email '{email}'.")
+        email = CustomUser.objects.normalize_email(email)
+        if email.lower() in self.emails:
+            raise RowInvalid("This email is already in use.")
+
+        username = row.get('username') or email.split('@')[0]
+        if username in self.usernames:
+            raise RowInvalid(f"The username '{username}' is already taken.")
+
+        gender = row.get('gender', '').lower()
+        if gender not in GENDERS:
+            raise RowInvalid("Gender must be one of: male, female, others.")
+
+        branch_id = self._resolve_branch(row.get('branch', ''))
+
+        user = {
+            'email': email,
+            'username': username,
+            'first_name': row.get('first_name', ''),
+            'last_name': row.get('last_name', ''),
+            'role': role,
+            'gender': gender,
+            'branch_id': branch_id,
+        }
+        entry = {'role': role, 'user': user, 'password': row.get('password') or None}
+
+        if role == 'student':
+            entry['profile'] = self._validate_student(row, batch_parents, user)
+        elif role == 'parent':
+            entry['profile'] = self._validate_parent(row)
+        else:
+            entry.update(self._validate_staff(row, user))
+        return entry
+
+    def _resolve_branch(self, name):
+        if name:
+            branch_id = self.branches.get(name.lower())
+            if not branch_id:
+                raise RowInvalid(f"Branch '{name}' does not exist.")
+        elif self.default_branch:
+            branch_id = self.default_branch.id
+        else:
+            branch_id = None
+
+        if self.restrict_branch and branch_id not in (None, self.restrict_branch.id):
+            raise RowInvalid("You can only import users into your own branch.")
+        if self.restrict_branch:
+            branch_id = self.restrict_branch.id
+        return branch_id
+
+    def _common_profile_fields(self, row):
+        profile = {
+            'address': row.get('address') or None,
+            'nationality': row.get('nationality') or 'Nigeria',
+            'state': row.get('state') or 'Lagos',
+            'date_of_birth': self._parse_date(row.get('date_of_birth')),
+        }
+        phone = row.get('phone_number')
+        if phone:
+            number = to_phone_number(phone)
+            if not number or not number.is_valid():
+                raise RowInvalid(f"Invalid phone number '{phone}'. Include the country code.")
+            profile['phone_number'] = number
+        return profile
+
+    def _parse_date(self, value):
+        if not value:
+            return None
+        if isinstance(value, date):
+            return value
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            parsed = None
+        if not parsed:
+            raise RowInvalid(f"Invalid date '{value}'. Use YYYY-MM-DD.")
+        return parsed
+
+    def _validate_student(self, row, batch_parents, user):
+        profile = self._common_profile_fields(row)
+
+        parent_email = row.get('parent_email', '').lower()
+        if not parent_email:
+            raise RowInvalid("parent_email is required for students.")
+        if parent_email in self.parents:
+            profile['parent_id'], parent_branch_id = self.parents[parent_email]
+        elif parent_email in batch_parents:
+            profile['parent_email'] = parent_email
+            parent_branch_id = batch_parents[parent_email]
+        else:
+            raise RowInvalid(f"No parent found with email '{parent_email}'. List parents before their children.")
+        # Students always take the parent's branch (same as create_student)
+        user['branch_id'] = parent_branch_id
+
+        class_name = row.get('current_class', '')
+        profile['current_class_id'] = self.classes.get(class_name.lower()) if class_name else None
+        if class_name and not profile['current_class_id']:
+            raise RowInvalid(f"Class '{class_name}' does not exist.")
+
+        arm_name = row.get('current_class_arm', '')
+        profile['current_class_arm_id'] = self.arms.get(arm_name.lower()) if arm_name else None
+        if arm_name and not profile['current_class_arm_id']:
+            raise RowInvalid(f"Class arm '{arm_name}' does not exist.")
+        if profile['current_class_arm_id'] and (
+            (profile['current_class_id'], profile['current_class_arm_id']) not in self.class_arms
+        ):
+            raise RowInvalid(f"Class '{class_name}' has no arm '{arm_name}'.")
+
+        admission_number = row.get('admission_number', '')
+        if admission_number:
+            if not re.match(ADMISSION_NUMBER_PATTERN, admission_number):
+                raise RowInvalid("Admission number must be in the format 'LAGS/STU/YYYY/XXXX'.")
+            if admission_number in self.admission_numbers:
+                raise RowInvalid("This admission number has already been assigned to another student.")
+        profile['admission_number'] = admission_number
+        profile['guardian_name'] = row.get('guardian_name') or None
+        return profile
+
+    def _validate_parent(self, row):
+        profile = self._common_profile_fields(row)
+
+        relationship = (row.get('relationship_to_student') or 'father').lower()
+        if relationship not in RELATIONSHIPS:
+            raise RowInvalid(f"Invalid relationship_to_student '{relationship}'.")
+        contact_method = (row.get('preferred_contact_method') or 'phone').lower()
+        if contact_method not in CONTACT_METHODS:
+            raise RowInvalid(f"Invalid preferred_contact_method '{contact_method}'.")
+
+        parent_number = row.get('parent_number', '')
+        if parent_number:
+            if not re.match(PARENT_NUMBER_PATTERN, parent_number):
+                raise RowInvalid("Invalid format. Use: LAGS/PAR/YYYY/XXXX")
+            if parent_number in self.parent_numbers:
+                raise RowInvalid("This parent number is already in use.")
+
+        profile.update({
+            'occupation': row.get('occupation') or None,
+            'relationship_to_student': relationship,
+            'preferred_contact_method': contact_method,
+            'parent_number': parent_number or None,
+        })
+        return profile
+
+    def _validate_staff(self, row, user):
+        profile = self._common_profile_fields(row)
+
+        staff_type = row.get('staff_type', '').lower() or None
+        if staff_type and staff_type not in STAFF_TYPES:
+            raise RowInvalid(f"Invalid staff_type '{staff_type}'.")
+        user['staff_type'] = staff_type
+        user['is_staff'] = user['role'] == 'superadmin'
+        user['is_superuser'] = user['role'] == 'superadmin'
+
+        years = row.get('years_of_experience') or 0
+        try:
+            profile['years_of_experience'] = int(years)
+        except (TypeError, ValueError):
+            raise RowInvalid(f"Invalid years_of_experience '{years}'.")
+        profile['qualification'] = row.get('qualification') or None
+
+        return {
+            'profile': profile,
+            'teaching_positions': self._resolve_positions(
+                row.get('teaching_positions', ''), self.teaching_positions, 'teaching'
+            ),
+            'non_teaching_positions': self._resolve_positions(
+                row.get('non_teaching_positions', ''), self.non_teaching_positions, 'non-teaching'
+            ),
+        }
+
+    def _resolve_positions(self, raw, lookup, label):
+        ids = []
+        for name in [n.strip() for n in str(raw).split(';') if n.strip()]:
+            position_id = lookup.get(name.lower())
+            if not position_id:
+                raise RowInvalid(f"Unknown {label} position '{name}'.")
+            ids.append(position_id)
+        return ids
+
+    # --- Writing ---
+
+    def _hash_passwords(self, passwords):
+        if self._executor:
+            chunksize = max(1, len(passwords) // (self.hash_workers * 4))
+            return list(self._executor.map(make_password, passwords, chunksize=chunksize))
+        return [make_password(password) for password in passwords]
+
+    def _write_batch(self, pending, passwords):
+        users = []
+        for entry, password in zip(pending, passwords):
+            users.append(CustomUser(password=password, **entry['user']))
+        CustomUser.objects.bulk_create(users, batch_size=self.batch_size)
+
+        # MySQL does not return primary keys from bulk_create
+        if any(user.pk is None for user in users):
+            ids = dict(
+                CustomUser.objects.filter(email__in=[u.email for u in users]).values_list('email', 'id')
+            )
+            for user in users:
+                user.pk = ids[user.email]
+        for entry, user in zip(pending, users):
+            entry['user_obj'] = user
+
+        by_role = {}
+        for entry in pending:
+            group = 'staff' if entry['role'] in STAFF_ROLES else entry['role']
+            by_role.setdefault(group, []).append(entry)
+
+        # Parents first so students in the same batch can link to them
+        self._write_parents(by_role.get('parent', []))
+        self._write_students(by_role.get('student', []))
+        self._write_staff(by_role.get('staff', []))
+
+    def _write_parents(self, entries):
+        if not entries:
+            return
+        numbers = iter(allocate_profile_numbers(
+            'PAR', ParentProfile,
+            sum(1 for e in entries if not e['profile']['parent_number']),
+            taken=self.parent_numbers,
+        ))
+        profiles = []
+        for entry in entries:
+            data = entry['profile']
+            data['parent_number'] = data['parent_number'] or next(numbers)
+            profiles.append(ParentProfile(user_id=entry['user_obj'].pk, **data))
+        ParentProfile.objects.bulk_create(profiles, batch_size=self.batch_size)
+
+        if any(profile.pk is None for profile in profiles):
+            ids = dict(
+                ParentProfile.objects.filter(
+                    user_id__in=[p.user_id for p in profiles]
+                ).values_list('user_id', 'id')
+            )
+            for profile in profiles:
+                profile.pk = ids[profile.user_id]
+
+        for entry, profile in zip(entries, profiles):
+            self.parent_numbers.add(profile.parent_number)
+            self._new_parents[entry['user']['email'].lower()] = (profile.pk, entry['user']['branch_id'])
+
+    def _write_students(self, entries):
+        if not entries:
+            return
+        numbers = iter(allocate_profile_numbers(
+            'STU', StudentProfile,
+            sum(1 for e in entries if not e['profile']['admission_number']),
+            taken=self.admission_numbers,
+        ))
+        profiles = []
+        for entry in entries:
+            data = entry['profile']
+            parent_email = data.pop('parent_email', None)
+            if parent_email:
+                data['parent_id'] = self._new_parents[parent_email][0]
+            data['admission_number'] = data['admission_number'] or next(numbers)
+            self.admission_numbers.add(data['admission_number'])
+            profiles.append(StudentProfile(user_id=entry['user_obj'].pk, **data))
+        StudentProfile.objects.bulk_create(profiles, batch_size=self.batch_size)
+
+    def _write_staff(self, entries):
+        if not entries:
+            return
+        # The create_staff_profile signal does not fire for bulk_create
+        numbers = {}
+        for prefix in set(get_prefix_for_user(e['user_obj']) for e in entries):
+            count = sum(1 for e in entries if get_prefix_for_user(e['user_obj']) == prefix)
+            numbers[prefix] = iter(allocate_profile_numbers(prefix, StaffProfile, count))
+
+        profiles = []
+        teaching_links = []
+        non_teaching_links = []
+        TeachingLink = CustomUser.teaching_positions.through
+        NonTeachingLink = CustomUser.non_teaching_positions.through
+
+        for entry in entries:
+            user_id = entry['user_obj'].pk
+            profiles.append(StaffProfile(
+                user_id=user_id,
+                staff_number=next(numbers[get_prefix_for_user(entry['user_obj'])]),
+                **entry['profile']
+            ))
+            teaching_links += [
+                TeachingLink(customuser_id=user_id, teachingposition_id=pk) for pk in entry['teaching_positions']
+            ]
+            non_teaching_links += [
+                NonTeachingLink(customuser_id=user_id, nonteachingposition_id=pk) for pk in entry['non_teaching_positions']
+            ]
+
+        StaffProfile.objects.bulk_create(profiles, batch_size=self.batch_size)
+        TeachingLink.objects.bulk_create(teaching_links, batch_size=self.batch_size)
+        NonTeachingLink.objects.bulk_create(non_teaching_links, batch_size=self.batch_size)
@@ -1,6 +1,7 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from .models import CustomUser, StaffProfile
+from .thumbnails import DEFAULT_PICTURE, ensure_thumbnails
 
 @receiver(post_save, sender=CustomUser)
 def create_staff_profile(sender, instance, created, **kwargs):
@@ -8,6 +9,16 @@ def create_staff_profile(sender, instance, created, **kwargs):
         StaffProfile.objects.create(user=instance)
 
 
+@receiver(post_save, sender=CustomUser)
+def generate_profile_thumbnails(sender, instance, update_fields=None, **kwargs):
+    # Saves such as the last_login update on every login don't touch the picture
+    if update_fields is not None and 'profile_picture' not in update_fields:
+        return
+    name = instance.profile_picture.name if instance.profile_picture else None
+    if name and name != DEFAULT_PICTURE:
+        ensure_thumbnails(name)
+
+
 # @receiver(post_save, sender=Communication)
 # def send_notification(sender, instance, created, **kwargs):
 #     if created and instance.message_type == 'notification':
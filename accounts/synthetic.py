@@ -0,0 +1,400 @@
+# Standard Library
+import logging
+import random
+from datetime import datetime, time, timedelta
+
+# Django Core
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+# Local App Imports
+from .models import (
+    Branch, ClassArm, Communication, CommunicationAttachment, CommunicationRecipient,
+    CustomUser, MessageReply, NonTeachingPosition, ParentProfile, ReplyAttachment,
+    SavedAudience, StaffProfile, StudentClass, StudentProfile, TeachingPosition
+)
+from .audiences import digest, encode_ids
+from .utils import allocate_profile_numbers
+
+logger = logging.getLogger(__name__)
+
+
+# Preset sizes shared by the generate_school_data command and the benchmarks
+SIZES = {
+    'small': {
+        'branches': 1, 'classes': 3, 'arms': 2, 'students_per_arm': 10,
+        'staff_per_branch': 10, 'communications': 50, 'audience_size': 30, 'scheduled': 5,
+    },
+    'medium': {
+        'branches': 2, 'classes': 6, 'arms': 3, 'students_per_arm': 40,
+        'staff_per_branch': 40, 'communications': 1000, 'audience_size': 200, 'scheduled': 20,
+    },
+    'large': {
+        'branches': 5, 'classes': 6, 'arms': 4, 'students_per_arm': 150,
+        'staff_per_branch': 150, 'communications': 20000, 'audience_size': 500, 'scheduled': 100,
+    },
+}
+
+CLASS_NAMES = ['JSS1', 'JSS2', 'JSS3', 'SS1', 'SS2', 'SS3']
+ARM_NAMES = ['Alpha', 'Gold', 'Apex', 'Diamond', 'Emerald', 'Ruby']
+TEACHING_POSITIONS = [('Class Teacher', True), ('Subject Teacher', False), ('Head of Department', False)]
+NON_TEACHING_POSITIONS = ['Bursar', 'Librarian', 'Driver', 'Cook', 'Security']
+FIRST_NAMES = ['Ade', 'Bola', 'Chidi', 'Dayo', 'Emeka', 'Funke', 'Gbenga', 'Halima', 'Ife', 'Kemi', 'Tunde', 'Zainab']
+LAST_NAMES = ['Adeyemi', 'Bello', 'Okafor', 'Eze', 'Musa', 'Ogunleye', 'Balogun', 'Nwosu', 'Lawal', 'Afolabi']
+MESSAGE_TYPES = [choice for choice, _ in Communication.MESSAGE_TYPE_CHOICES]
+
+SAMPLE_ATTACHMENT = 'communication_attachments/synthetic/sample.txt'
+
+
+class SchoolGenerator:
+    """
+    Build a deterministic synthetic school (branches, classes, staff, parents,
+    students and historical communications) for load testing.
+
+    Every row is written with ``bulk_create`` using pre-assigned primary keys, so
+    no per-row round trips or id re-fetches are needed even on MySQL.
+    """
+
+    def __init__(self, seed=1, prefix='synth', batch_size=5000, branches=1, classes=3, arms=2,
+                 students_per_arm=10, staff_per_branch=10, children_per_parent=2,
+                 communications=50, audience_size=30, scheduled=5, reply_rate=0.3, stdout=None):
+        self.random = random.Random(seed)
+        self.prefix = prefix
+        self.domain = f"{prefix}.lagooz.test"
+        self.batch_size = batch_size
+        self.branch_count = branches
+        self.class_count = classes
+        self.arm_count = arms
+        self.students_per_arm = students_per_arm
+        self.staff_per_branch = staff_per_branch
+        self.children_per_parent = children_per_parent
+        self.communication_count = communications
+        self.audience_size = audience_size
+        self.scheduled_count = scheduled
+        self.reply_rate = reply_rate
+        self.stdout = stdout
+        # Fixed anchor keeps timestamps reproducible within a day
+        self.anchor = timezone.make_aware(datetime.combine(timezone.localdate(), time(8, 0)))
+        # Hashing once keeps 100k users fast; every synthetic user shares it
+        self.password = make_password('password')
+        self.counts = {}
+
+    @classmethod
+    def from_size(cls, size, **overrides):
+        options = dict(SIZES[size])
+        options.update(overrides)
+        return cls(**options)
+
+    def _log(self, message):
+        logger.info(f"[SYNTHETIC] {message}")
+        if self.stdout:
+            self.stdout.write(message)
+
+    # --- Helpers ---
+
+    def _next_ids(self, model, count):
+        start = (model.objects.aggregate(m=Max('pk'))['m'] or 0) + 1
+        return range(start, start + count)
+
+    def _bulk(self, model, objs):
+        model.objects.bulk_create(objs, batch_size=self.batch_size)
+        self.counts[model.__name__] = self.counts.get(model.__name__, 0) + len(objs)
+
+    def _reset_sequences(self, models):
+        # Explicit primary keys leave PostgreSQL sequences behind; MySQL and
+        # SQLite return no statements here.
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+    def _name(self):
+        return self.random.choice(FIRST_NAMES), self.random.choice(LAST_NAMES)
+
+    # --- Build ---
+
+    def reset(self):
+        """Delete everything previously generated with this prefix."""
+        deleted, _ = CustomUser.objects.filter(email__endswith=f"@{self.domain}").delete()
+        Branch.objects.filter(name__startswith=f"{self.prefix} ").delete()
+        self._log(f"Removed {deleted} rows from an earlier '{self.prefix}' dataset.")
+
+    def build(self):
+        with transaction.atomic():
+            self._build_reference_data()
+            self._build_people()
+        self._build_communications()
+        self._reset_sequences([CustomUser, StaffProfile, ParentProfile, StudentProfile, Communication,
+                               CommunicationRecipient, CommunicationAttachment, MessageReply, ReplyAttachment,
+                               SavedAudience])
+        return self.counts
+
+    def _build_reference_data(self):
+        self.branches = [
+            Branch.objects.get_or_create(
+                name=f"{self.prefix} Branch {i + 1}",
+                defaults={'address': f"{i + 1} Synthetic Road, Lagos", 'city': 'Lagos', 'state': 'Lagos'}
+            )[0]
+            for i in range(self.branch_count)
+        ]
+
+        class_names = (CLASS_NAMES + [f"Class {n}" for n in range(7, self.class_count + 1)])[:self.class_count]
+        arm_names = (ARM_NAMES + [f"Arm {n}" for n in range(7, self.arm_count + 1)])[:self.arm_count]
+        self.arms = [ClassArm.objects.get_or_create(name=name)[0] for name in arm_names]
+        self.classes = []
+        for name in class_names:
+            student_class = StudentClass.objects.get_or_create(name=name)[0]
+            student_class.arms.add(*self.arms)
+            self.classes.append(student_class)
+
+        self.teaching_positions = [
+            TeachingPosition.objects.get_or_create(name=name, defaults={'is_class_teacher': is_ct})[0]
+            for name, is_ct in TEACHING_POSITIONS
+        ]
+        self.class_teacher_position = next(p for p in self.teaching_positions if p.is_class_teacher)
+        self.non_teaching_positions = [
+            NonTeachingPosition.objects.get_or_create(name=name)[0] for name in NON_TEACHING_POSITIONS
+        ]
+
+    def _build_people(self):
+        students_per_branch = self.class_count * self.arm_count * self.students_per_arm
+        parents_per_branch = -(-students_per_branch // self.children_per_parent)
+        staff_total = self.branch_count * (self.staff_per_branch + 1)  # +1 branch admin
+        total_users = self.branch_count * (students_per_branch + parents_per_branch) + staff_total
+
+        user_ids = iter(self._next_ids(CustomUser, total_users))
+        serial = {'n': 0}
+
+        def new_user(role, branch, **extra):
+            serial['n'] += 1
+            first, last = self._name()
+            user = CustomUser(
+                id=next(user_ids),
+                email=f"{role}{serial['n']}@{self.domain}",
+                username=f"{self.prefix}_{role}{serial['n']}",
+                first_name=first, last_name=last,
+                role=role, gender=self.random.choice(['male', 'female']),
+                branch_id=branch.id, password=self.password, **extra
+            )
+            users.append(user)
+            return user
+
+        users = []
+        staff_rows = []   # (user, kind, position)
+        parent_users = []
+        student_rows = []  # (user, parent_index, class, arm)
+        self.users_by_branch = {}
+
+        for branch in self.branches:
+            members = []
+            admin = new_user('branch_admin', branch, staff_type='teaching')
+            staff_rows.append((admin, 'teaching', self.teaching_positions[2]))
+            members.append(admin.id)
+
+            class_slots = [(c, a) for c in self.classes for a in self.arms]
+            for n in range(self.staff_per_branch):
+                # Roughly a quarter of staff are non-teaching
+                if n % 4 == 3:
+                    user = new_user('staff', branch, staff_type='non_teaching')
+                    staff_rows.append((user, 'non_teaching', self.non_teaching_positions[n % len(self.non_teaching_positions)]))
+                elif n < len(class_slots):
+                    user = new_user('staff', branch, staff_type='teaching')
+                    staff_rows.append((user, 'class_teacher', class_slots[n]))
+                else:
+                    user = new_user('staff', branch, staff_type='teaching')
+                    staff_rows.append((user, 'teaching', self.teaching_positions[1]))
+                members.append(user.id)
+
+            first_parent = len(parent_users)
+            for _ in range(parents_per_branch):
+                parent = new_user('parent', branch)
+                parent_users.append(parent)
+                members.append(parent.id)
+
+            child = 0
+            for student_class, arm in class_slots:
+                for _ in range(self.students_per_arm):
+                    user = new_user('student', branch)
+                    parent_index = first_parent + child // self.children_per_parent
+                    student_rows.append((user, parent_index, student_class, arm))
+                    members.append(user.id)
+                    child += 1
+
+            self.users_by_branch[branch.id] = members
+
+        self._bulk(CustomUser, users)
+        self._log(f"Created {len(users)} users.")
+
+        # Staff profiles (the create_staff_profile signal does not fire for bulk_create)
+        teaching_ct = ContentType.objects.get_for_model(TeachingPosition)
+        non_teaching_ct = ContentType.objects.get_for_model(NonTeachingPosition)
+        sta_numbers = iter(allocate_profile_numbers('STA', StaffProfile, len(staff_rows)))
+        adm_numbers = iter(allocate_profile_numbers('ADM', StaffProfile, len(self.branches)))
+        TeachingLink = CustomUser.teaching_positions.through
+        NonTeachingLink = CustomUser.non_teaching_positions.through
+        profiles, teaching_links, non_teaching_links = [], [], []
+
+        for user, kind, detail in staff_rows:
+            profile = StaffProfile(
+                user_id=user.id,
+                staff_number=next(adm_numbers if user.role == 'branch_admin' else sta_numbers),
+                years_of_experience=self.random.randint(0, 25),
+            )
+            if kind == 'class_teacher':
+                student_class, arm = detail
+                profile.managing_class_id = student_class.id
+                profile.managing_class_arm_id = arm.id
+                profile.position_content_type = teaching_ct
+                profile.position_object_id = self.class_teacher_position.id
+                teaching_links.append(TeachingLink(customuser_id=user.id, teachingposition_id=self.class_teacher_position.id))
+            elif kind == 'teaching':
+                profile.position_content_type = teaching_ct
+                profile.position_object_id = detail.id
+                teaching_links.append(TeachingLink(customuser_id=user.id, teachingposition_id=detail.id))
+            else:
+                profile.position_content_type = non_teaching_ct
+                profile.position_object_id = detail.id
+                non_teaching_links.append(NonTeachingLink(customuser_id=user.id, nonteachingposition_id=detail.id))
+            profiles.append(profile)
+
+        self._bulk(StaffProfile, profiles)
+        self._bulk(TeachingLink, teaching_links)
+        self._bulk(NonTeachingLink, non_teaching_links)
+
+        parent_ids = list(self._next_ids(ParentProfile, len(parent_users)))
+        parent_numbers = allocate_profile_numbers('PAR', ParentProfile, len(parent_users))
+        self._bulk(ParentProfile, [
+            ParentProfile(
+                id=pk, user_id=user.id, parent_number=number,
+                relationship_to_student=self.random.choice(['father', 'mother', 'guardian']),
+                preferred_contact_method=self.random.choice(['phone', 'email', 'sms']),
+            )
+            for pk, user, number in zip(parent_ids, parent_users, parent_numbers)
+        ])
+
+        admission_numbers = allocate_profile_numbers('STU', StudentProfile, len(student_rows))
+        self._bulk(StudentProfile, [
+            StudentProfile(
+                user_id=user.id, parent_id=parent_ids[parent_index], admission_number=number,
+                current_class_id=student_class.id, current_class_arm_id=arm.id,
+            )
+            for (user, parent_index, student_class, arm), number in zip(student_rows, admission_numbers)
+        ])
+        self._log(f"Created {len(profiles)} staff, {len(parent_users)} parents, {len(student_rows)} students.")
+
+    def _build_communications(self):
+        if not self.communication_count and not self.scheduled_count:
+            return
+
+        if not default_storage.exists(SAMPLE_ATTACHMENT):
+            default_storage.save(SAMPLE_ATTACHMENT, ContentFile(b"Synthetic attachment for load testing.\n"))
+
+        senders = {
+            branch.id: list(
+                CustomUser.objects.filter(
+                    branch=branch, role__in=['staff', 'branch_admin'], email__endswith=f"@{self.domain}"
+                ).values_list('id', flat=True)
+            )
+            for branch in self.branches
+        }
+
+        comm_ids = iter(self._next_ids(Communication, self.communication_count + self.scheduled_count))
+        recipient_ids = iter(self._next_ids(
+            CommunicationRecipient, self.communication_count * self.audience_size
+        ))
+
+        communications, recipients, attachments, replies, reply_attachments = [], [], [], [], []
+
+        def flush(force=False):
+            nonlocal communications, recipients, attachments, replies, reply_attachments
+            if not force and len(recipients) < self.batch_size * 4:
+                return
+            with transaction.atomic():
+                self._bulk(Communication, communications)
+                self._bulk(CommunicationRecipient, recipients)
+                self._bulk(CommunicationAttachment, attachments)
+                self._bulk(MessageReply, replies)
+                self._bulk(ReplyAttachment, reply_attachments)
+            communications, recipients, attachments, replies, reply_attachments = [], [], [], [], []
+
+        next_reply_id = (MessageReply.objects.aggregate(m=Max('pk'))['m'] or 0) + 1
+
+        for n in range(self.communication_count):
+            branch = self.branches[n % len(self.branches)]
+            members = self.users_by_branch[branch.id]
+            sender_id = self.random.choice(senders[branch.id])
+            sent_at = self.anchor - timedelta(minutes=self.random.randint(0, 365 * 24 * 60))
+            requires_response = self.random.random() < 0.2
+            comm = Communication(
+                id=next(comm_ids), sender_id=sender_id,
+                message_type=self.random.choice(MESSAGE_TYPES),
+                title=f"Synthetic message {n + 1}",
+                body=f"Synthetic body {n + 1} for branch {branch.name}.",
+                sent=True, sent_at=sent_at, requires_response=requires_response,
+            )
+            communications.append(comm)
+
+            if n % 10 == 0:
+                attachments.append(CommunicationAttachment(communication_id=comm.id, file=SAMPLE_ATTACHMENT))
+
+            audience = self.random.sample(members, min(self.audience_size, len(members)))
+            for user_id in audience:
+                if user_id == sender_id:
+                    continue
+                read = self.random.random() < 0.6
+                entry = CommunicationRecipient(
+                    id=next(recipient_ids), communication_id=comm.id, recipient_id=user_id,
+                    delivered=True, delivered_at=sent_at,
+                    read=read, read_at=sent_at + timedelta(hours=1) if read else None,
+                    requires_response=requires_response,
+                )
+                if requires_response and read and self.random.random() < self.reply_rate:
+                    entry.has_responded = True
+                    comm.reply_count += 1
+                    comm.responder_count += 1
+                    replies.append(MessageReply(
+                        id=next_reply_id, recipient_entry_id=entry.id, communication_id=comm.id,
+                        responder_id=user_id,
+                        reply_text=f"Synthetic reply to message {n + 1}.",
+                    ))
+                    if next_reply_id % 20 == 0:
+                        reply_attachments.append(ReplyAttachment(reply_id=next_reply_id, file=SAMPLE_ATTACHMENT))
+                    next_reply_id += 1
+                recipients.append(entry)
+            flush()
+
+        # Unsent, already-due messages for the scheduled dispatcher
+        audience_ids = iter(self._next_ids(SavedAudience, self.scheduled_count))
+        audiences = []
+        for n in range(self.scheduled_count):
+            branch = self.branches[n % len(self.branches)]
+            members = self.users_by_branch[branch.id]
+            sender_id = self.random.choice(senders[branch.id])
+            encoded = encode_ids(self.random.sample(members, min(self.audience_size, len(members))))
+            audiences.append(SavedAudience(
+                id=next(audience_ids), owner_id=sender_id, members=encoded, digest=digest(encoded),
+                size=min(self.audience_size, len(members)),
+            ))
+            communications.append(Communication(
+                id=next(comm_ids), sender_id=sender_id,
+                message_type=self.random.choice(MESSAGE_TYPES),
+                title=f"Synthetic scheduled message {n + 1}",
+                body=f"Synthetic scheduled body {n + 1}.",
+                scheduled_time=self.anchor - timedelta(minutes=n + 1),
+                audience_id=audiences[-1].id,
+            ))
+        self._bulk(SavedAudience, audiences)
+        flush(force=True)
+
+        self._log(
+            f"Created {self.counts.get('Communication', 0)} communications, "
+            f"{self.counts.get('CommunicationRecipient', 0)} recipient rows, "
+            f"{self.counts.get('MessageReply', 0)} replies."
+        )
@@ -0,0 +1,286 @@
+"""
+Multi-group targeting with ``CommunicationTargetGroup``.
+
+A communication can target several groups at once, e.g. "JSS1 parents + all class
+teachers + Branch B admins". Each group is turned into a ``Q`` over ``CustomUser`` made
+only of column filters and ``id__in`` subqueries, so any number of groups ORed together
+is still a single ``SELECT`` with no joins that could repeat a user. The database
+computes the union and removes duplicates; no ID sets are built in Python.
+
+Groups travel as plain dicts ("specs") keyed by the model's field names:
+``branch``, ``role``, ``staff_type``, ``student_class`` and ``class_arm`` hold IDs or
+choice values, and ``teaching_positions``/``non_teaching_positions`` hold lists of IDs.
+Each group's size is cached under ``cache_keys.AUDIENCE_SIZES`` so the compose form can
+show it without counting again.
+
+Within a group, every field narrows the audience:
+
+* ``role`` - ``student``/``parent`` with a class (and arm) means the students in that
+  class or the parents of those students;
+* ``guardians`` (student groups only) - ``only`` swaps the students for the users of
+  their ``ParentProfile``, ``also`` adds those parents to the students. The parents
+  come from one ``StudentProfile`` -> ``ParentProfile`` join, so a parent with several
+  matching children is still one recipient, whatever branch the parent belongs to;
+* staff roles with ``staff_type`` match that type or ``both``; positions match users who
+  hold any of them (directly or as their profile position); a class (and arm) keeps
+  only the staff managing it, e.g. class teachers of JSS1;
+* no role means everyone in the branch.
+"""
+# Standard Library
+import json
+
+# Django Core
+from django.core.cache import cache
+from django.db.models import Q
+
+# Local App Imports
+from . import cache_keys
+
+AUDIENCE_SIZE_TIMEOUT = 10 * 60
+# Upper bound on groups per message
+MAX_GROUPS = 20
+
+ROLES = ('superadmin', 'branch_admin', 'staff', 'student', 'parent')
+STAFF_ROLES = ('superadmin', 'branch_admin', 'staff')
+STAFF_TYPES = ('teaching', 'non_teaching', 'both')
+GUARDIAN_MODES = ('only', 'also')
+ID_FIELDS = ('branch', 'student_class', 'class_arm')
+POSITION_FIELDS = ('teaching_positions', 'non_teaching_positions')
+SPEC_FIELDS = (*ID_FIELDS, 'role', 'staff_type', 'guardians', *POSITION_FIELDS)
+
+
+def _int_or_none(value):
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def clean_spec(data):
+    """
+    Normalise one group (form data or a decoded JSON object); ``None`` if it is unusable.
+    Model instances are accepted in place of IDs.
+    """
+    if not isinstance(data, dict):
+        return None
+    spec = {name: _int_or_none(getattr(data.get(name), 'pk', data.get(name))) for name in ID_FIELDS}
+    if spec['branch'] is None:
+        return None
+    spec['role'] = data.get('role') if data.get('role') in ROLES else None
+    spec['staff_type'] = data.get('staff_type') if data.get('staff_type') in STAFF_TYPES else None
+    guardians = data.get('guardians')
+    spec['guardians'] = guardians if spec['role'] == 'student' and guardians in GUARDIAN_MODES else None
+    for name in POSITION_FIELDS:
+        values = data.get(name) or []
+        if isinstance(values, str):
+            values = values.split(',')
+        spec[name] = sorted({pk for pk in (_int_or_none(getattr(v, 'pk', v)) for v in values) if pk})
+    return spec
+
+
+def parse_specs(raw):
+    """Groups posted by the compose form as a JSON array; invalid entries are dropped."""
+    try:
+        data = json.loads(raw or '[]')
+    except ValueError:
+        return []
+    if not isinstance(data, list):
+        return []
+
+    specs, seen = [], set()
+    for item in data[:MAX_GROUPS]:
+        spec = clean_spec(item)
+        if spec is not None and spec_key(spec) not in seen:
+            seen.add(spec_key(spec))
+            specs.append(spec)
+    return specs
+
+
+def spec_key(spec):
+    return ':'.join(
+        ','.join(map(str, spec[name])) if name in POSITION_FIELDS else str(spec[name] or '')
+        for name in SPEC_FIELDS
+    )
+
+
+def is_branch_role_only(spec):
+    """Whether the group is just a branch and an optional role (see accounts.broadcasts)."""
+    return not (
+        spec['staff_type'] or spec['student_class'] or spec['class_arm'] or spec['guardians']
+        or spec['teaching_positions'] or spec['non_teaching_positions']
+    )
+
+
+def _position_condition(spec):
+    from django.contrib.contenttypes.models import ContentType
+    from .models import CustomUser, NonTeachingPosition, StaffProfile, TeachingPosition
+
+    condition = Q()
+    for name, model, through_field in (
+        ('teaching_positions', TeachingPosition, 'teachingposition_id'),
+        ('non_teaching_positions', NonTeachingPosition, 'nonteachingposition_id'),
+    ):
+        ids = spec[name]
+        if not ids:
+            continue
+        through = getattr(CustomUser, name).through
+        condition |= Q(id__in=through.objects.filter(**{f"{through_field}__in": ids}).values('customuser_id'))
+        condition |= Q(id__in=StaffProfile.objects.filter(
+            position_content_type=ContentType.objects.get_for_model(model),
+            position_object_id__in=ids,
+        ).values('user_id'))
+    return condition
+
+
+def guardians_condition(spec):
+    """A ``Q`` over ``CustomUser`` matching the parents of a student group's students."""
+    from .models import StudentProfile
+
+    students = StudentProfile.objects.filter(user__branch_id=spec['branch'], user__is_active=True)
+    if spec['student_class']:
+        students = students.filter(current_class_id=spec['student_class'])
+    if spec['class_arm']:
+        students = students.filter(current_class_arm_id=spec['class_arm'])
+    return Q(id__in=students.values('parent__user_id'), role='parent')
+
+
+def group_condition(spec):
+    """A ``Q`` over ``CustomUser`` matching the members of one group."""
+    from .models import ParentProfile, StaffProfile, StudentProfile
+
+    if spec['guardians'] == 'only':
+        return guardians_condition(spec)
+
+    condition = Q(branch_id=spec['branch'])
+    role = spec['role']
+    if role:
+        condition &= Q(role=role)
+
+    classes = {}
+    if spec['student_class']:
+        classes['current_class_id'] = spec['student_class']
+    if spec['class_arm']:
+        classes['current_class_arm_id'] = spec['class_arm']
+
+    if role == 'student' and classes:
+        condition &= Q(id__in=StudentProfile.objects.filter(**classes).values('user_id'))
+    elif role == 'parent' and classes:
+        condition &= Q(id__in=ParentProfile.objects.filter(
+            **{f"students__{name}": value for name, value in classes.items()}
+        ).values('user_id'))
+    elif role in STAFF_ROLES:
+        if spec['staff_type'] in ('teaching', 'non_teaching'):
+            condition &= Q(staff_type__in=[spec['staff_type'], 'both'])
+        if spec['teaching_positions'] or spec['non_teaching_positions']:
+            condition &= _position_condition(spec)
+        if classes:
+            condition &= Q(id__in=StaffProfile.objects.filter(**{
+                name.replace('current_', 'managing_'): value for name, value in classes.items()
+            }).values('user_id'))
+    if spec['guardians'] == 'also':
+        condition |= guardians_condition(spec)
+    return condition
+
+
+def describe(spec):
+    """A short label for a group, e.g. "Lekki: Parent, JSS1"."""
+    from .models import (
+        Branch, ClassArm, CommunicationTargetGroup, NonTeachingPosition, StudentClass, TeachingPosition,
+    )
+
+    parts = []
+    if spec['guardians'] == 'only':
+        parts.append('Guardians of Students')
+    elif spec['guardians'] == 'also':
+        parts.append('Students and Guardians')
+    elif spec['role']:
+        parts.append(dict(CommunicationTargetGroup.ROLE_CHOICES)[spec['role']])
+    if spec['staff_type']:
+        parts.append(dict(CommunicationTargetGroup.STAFF_TYPE_CHOICES)[spec['staff_type']])
+    for model, name in ((TeachingPosition, 'teaching_positions'), (NonTeachingPosition, 'non_teaching_positions')):
+        if spec[name]:
+            parts.extend(model.objects.filter(pk__in=spec[name]).values_list('name', flat=True))
+    for model, name in ((StudentClass, 'student_class'), (ClassArm, 'class_arm')):
+        if spec[name]:
+            parts.extend(model.objects.filter(pk=spec[name]).values_list('name', flat=True))
+
+    branch = Branch.objects.filter(pk=spec['branch']).values_list('name', flat=True).first()
+    return f"{branch or 'Unknown branch'}: {', '.join(parts) or 'Everyone'}"
+
+
+def preview(spec):
+    """What the compose form shows for a group."""
+    return {'group': spec, 'label': describe(spec), 'size': group_size(spec)}
+
+
+def audience(specs, sender=None, extra=None):
+    """
+    Active users in any of ``specs``, plus the users matched by the ``extra`` ``Q``
+    (e.g. recipients ticked by hand), as one de-duplicated queryset.
+    """
+    from .models import CustomUser
+
+    condition = Q()
+    for spec in specs:
+        condition |= group_condition(spec)
+    if extra is not None:
+        condition |= extra
+    if not condition:
+        return CustomUser.objects.none()
+
+    qs = CustomUser.objects.filter(condition, is_active=True)
+    if sender is not None:
+        qs = qs.exclude(id=sender.pk)
+    return qs
+
+
+def group_size(spec):
+    """Active members of one group, cached for ``AUDIENCE_SIZE_TIMEOUT`` seconds."""
+    key = cache_keys.make_key(cache_keys.AUDIENCE_SIZES, spec_key(spec))
+    size = cache.get(key)
+    if size is None:
+        size = audience([spec]).count()
+        cache.set(key, size, AUDIENCE_SIZE_TIMEOUT)
+    return size
+
+
+def save_groups(communication, specs):
+    """Replace the communication's ``CommunicationTargetGroup`` rows with ``specs``."""
+    from .models import CommunicationTargetGroup
+
+    communication.target_groups.all().delete()
+    groups = []
+    for spec in specs:
+        group = CommunicationTargetGroup.objects.create(
+            communication=communication,
+            branch_id=spec['branch'],
+            role=spec['role'],
+            staff_type=spec['staff_type'],
+            student_class_id=spec['student_class'],
+            class_arm_id=spec['class_arm'],
+            guardians=spec['guardians'],
+        )
+        if spec['teaching_positions']:
+            group.teaching_positions.set(spec['teaching_positions'])
+        if spec['non_teaching_positions']:
+            group.non_teaching_positions.set(spec['non_teaching_positions'])
+        groups.append(group)
+    return groups
+
+
+def communication_specs(communication):
+    """The specs of a communication's saved target groups."""
+    groups = communication.target_groups.prefetch_related('teaching_positions', 'non_teaching_positions')
+    return [
+        clean_spec({
+            'branch': group.branch_id,
+            'role': group.role,
+            'staff_type': group.staff_type,
+            'student_class': group.student_class_id,
+            'class_arm': group.class_arm_id,
+            'guardians': group.guardians,
+            'teaching_positions': [p.pk for p in group.teaching_positions.all()],
+            'non_teaching_positions': [p.pk for p in group.non_teaching_positions.all()],
+        })
+        for group in groups
+    ]
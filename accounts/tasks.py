@@ -1,28 +1,116 @@
+from datetime import timedelta
+
 from celery import shared_task
+from django.db.models import F, Q
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.contrib.auth import get_user_model
-from .models import Communication
+from . import recurrence, rollups
+from .archive import archive_communications
+from .audiences import recipient_audience, release
+from .models import Communication, RecurringCommunication
+from .notifications import digests
+from .notifications.channels import deliver
+from .notifications.retries import retry_due
+from .queues import queue_for
 from .utils import send_communication_to_recipients
 import logging
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
+# A message queued this long ago and still unsent is taken to be lost (its worker
+# died before sending) and dispatched again
+REQUEUE_AFTER = timedelta(hours=1)
+
+
 @shared_task
 def send_scheduled_communications():
+    """Hand each due scheduled message to its priority queue (accounts.queues)."""
+    now = timezone.now()
     due_comms = Communication.objects.filter(
         sent=False,
-        scheduled_time__lte=timezone.now(),
+        scheduled_time__lte=now,
         is_draft=False
-    )
+    ).filter(
+        Q(queued_at__isnull=True) | Q(queued_at__lt=now - REQUEUE_AFTER)
+    ).select_related('audience')
 
+    dispatched = 0
     for comm in due_comms:
+        # Claim it first so an overlapping beat tick does not queue it twice
+        claimed = Communication.objects.filter(pk=comm.pk, queued_at=comm.queued_at).update(queued_at=now)
+        if not claimed:
+            continue
+        queue = queue_for(comm)
+        try:
+            send_communication.apply_async((comm.pk,), queue=queue)
+        except Exception as e:
+            Communication.objects.filter(pk=comm.pk).update(queued_at=None)
+            logger.error(f"Failed to queue scheduled communication ID {comm.id}: {e}", exc_info=True)
+            continue
+        dispatched += 1
+        logger.info(f"Queued scheduled message ID {comm.id} on '{queue}'")
+    return dispatched
+
+
+@shared_task
+def send_recurring_communications():
+    """Create and queue the due occurrence of each recurring message (accounts.recurrence)."""
+    now = timezone.now()
+    due = RecurringCommunication.objects.filter(
+        active=True,
+        next_run_at__lte=now,
+    ).select_related('template__audience', 'template__sender')
+
+    dispatched = 0
+    for schedule in due:
+        try:
+            next_run_at = recurrence.next_occurrence(schedule.rule, now, schedule.starts_at, schedule.ends_at)
+        except ValueError as e:
+            RecurringCommunication.objects.filter(pk=schedule.pk).update(active=False, next_run_at=None)
+            logger.error(f"Deactivated recurring schedule ID {schedule.pk}: {e}")
+            continue
+        # Claim the occurrence by moving the schedule on, so an overlapping tick skips it
+        claimed = RecurringCommunication.objects.filter(
+            pk=schedule.pk, next_run_at=schedule.next_run_at,
+        ).update(
+            next_run_at=next_run_at,
+            active=next_run_at is not None,
+            last_run_at=now,
+            occurrences=F('occurrences') + 1,
+        )
+        if not claimed:
+            continue
+        comm = recurrence.instantiate(schedule, schedule.next_run_at)
+        queue = queue_for(comm)
         try:
-            logger.info(f"Sending scheduled message ID {comm.id} titled '{comm.title}' from sender {comm.sender}'")
+            send_communication.apply_async((comm.pk,), queue=queue)
+        except Exception as e:
+            # The occurrence is an ordinary scheduled message now; the scheduled dispatcher retries it
+            Communication.objects.filter(pk=comm.pk).update(queued_at=None)
+            logger.error(f"Failed to queue occurrence ID {comm.id} of recurring schedule ID {schedule.pk}: {e}", exc_info=True)
+            continue
+        dispatched += 1
+        logger.info(f"Queued occurrence ID {comm.id} of recurring schedule ID {schedule.pk} on '{queue}'")
+    return dispatched
 
-            # Reconstruct recipients
-            selected_recipients = User.objects.filter(id__in=comm.selected_recipient_ids or [])
-            manual_emails = comm.manual_emails or []
+
+@shared_task
+def send_communication(communication_id):
+    """Send one scheduled message to its recipients."""
+    comm = Communication.objects.select_related('audience', 'sender').filter(pk=communication_id).first()
+    if comm is None or comm.sent:
+        logger.info(f"Scheduled communication ID {communication_id} is gone or already sent; skipping")
+        return False
+
+    try:
+        logger.info(f"Sending scheduled message ID {comm.id} titled '{comm.title}' from sender {comm.sender}'")
+
+        # Reconstruct recipients, joined against a temporary table rather than a huge IN list
+        manual_emails = comm.manual_emails or []
+        with recipient_audience(comm).id_join() as member_ids:
+            selected_recipients = User.objects.filter(id__in=member_ids)
 
             # Pass them to the sender
             send_communication_to_recipients(
@@ -31,12 +119,71 @@ def send_scheduled_communications():
                 manual_emails=manual_emails
             )
 
-            # Mark as sent
-            comm.sent = True
-            comm.sent_at = timezone.now()
-            comm.save()
+        # Mark as sent
+        comm.sent = True
+        comm.sent_at = timezone.now()
+        comm.save()
+        release(comm)
+
+        logger.info(f"Marked communication ID {comm.id} as sent at {comm.sent_at}")
+        return True
+    except Exception as e:
+        # Release the claim so the next beat tick tries again
+        Communication.objects.filter(pk=comm.pk).update(queued_at=None)
+        logger.error(f"Failed to send scheduled communication ID {comm.id}: {e}", exc_info=True)
+        return False
 
-            logger.info(f"Marked communication ID {comm.id} as sent at {comm.sent_at}")
-        except Exception as e:
-            logger.error(f"Failed to send scheduled communication ID {comm.id}: {e}", exc_info=True)
 
+@shared_task
+def archive_old_communications():
+    result = archive_communications()
+    logger.info(
+        f"Archived {result.communications} communication(s) with {result.recipients} recipient row(s)"
+    )
+    return result.communications
+
+
+@shared_task
+def refresh_branch_stats():
+    return rollups.refresh_branch_stats()
+
+
+@shared_task
+def rebuild_dashboard_rollups():
+    """Nightly correction of the incrementally maintained counters."""
+    yesterday = timezone.localdate() - timedelta(days=1)
+    rollups.rebuild_daily_stats(yesterday)
+    users = rollups.rebuild_user_stats()
+    corrected = rollups.rebuild_reply_counts()
+    logger.info(
+        f"Rebuilt dashboard rollups for {yesterday} and {users} user(s); "
+        f"corrected reply counts on {corrected} communication(s)"
+    )
+
+
+@shared_task
+def send_all_notifications(communication_id):
+    """Deliver a sent communication through its recipients' channels (accounts.notifications.channels)."""
+    communication = Communication.objects.select_related('sender').filter(pk=communication_id).first()
+    if communication is None:
+        logger.warning(f"Communication ID {communication_id} no longer exists; nothing to deliver")
+        return {}
+    return deliver(communication)
+
+
+@shared_task
+def retry_failed_deliveries():
+    counts = retry_due()
+    if counts:
+        logger.info(f"Retried failed deliveries: {counts}")
+    return counts
+
+
+@shared_task
+def send_digests(frequency, now=None, only=None):
+    """
+    Daily or weekly email digest of unread posts and news (accounts.notifications.digests).
+    ``now`` (ISO format) and ``only`` are set on the follow-up runs for digests that
+    waited on the rate limits.
+    """
+    return dict(digests.send_digests(frequency, now and parse_datetime(now), only))
@@ -1,8 +1,26 @@
 import os
 from django import template
+from django.utils.html import strip_tags
+
+from accounts.merge_fields import render_for
 
 register = template.Library()
 
 @register.filter
 def basename(value):
-    return os.path.basename(value)
\ No newline at end of file
+    return os.path.basename(value)
+
+@register.filter
+def avatar_url(user, size):
+    """Thumbnail URL for an avatar rendered at ``size`` px, e.g. ``{{ user|avatar_url:32 }}``."""
+    return user.get_profile_picture_url(size=int(size))
+
+@register.filter
+def body_for(communication, user):
+    """The body as ``user`` reads it, merge fields filled in: ``{{ message|body_for:request.user }}``."""
+    return render_for(communication, user)
+
+@register.filter
+def short_body_for(communication, user):
+    clean_text = strip_tags(render_for(communication, user))
+    return clean_text[:75] + "..." if len(clean_text) > 75 else clean_text
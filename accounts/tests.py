@@ -1,3 +1,244 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+try:
+    import fakeredis
+except ImportError:  # optional: pip install -r requirements-dev.txt
+    fakeredis = None
+
+from . import rollups, tasks
+from .archive import archive_communications
+from .notifications import ratelimit
+from .models import (
+    BranchDailyStats, BranchStats, Communication, CommunicationRecipient, CustomUser, RecurringCommunication,
+    SavedAudience, UserMessageStats,
+)
+from .synthetic import SchoolGenerator
+from .utils import send_communication_to_recipients
+
+
+def _user_stats():
+    return {
+        row[0]: row[1:]
+        for row in UserMessageStats.objects.values_list('user_id', *rollups.USER_FIELDS)
+        if any(row[1:])
+    }
+
+
+def _daily_stats(day):
+    return {
+        row[0]: row[1:]
+        for row in BranchDailyStats.objects.filter(date=day).values_list('branch_id', *rollups.DAILY_FIELDS)
+        if any(row[1:])
+    }
+
+
+@override_settings(EMAIL_RATE_LIMIT_ENABLED=False)
+class RollupTests(TestCase):
+    """The incremental rollup counters agree with a rebuild from the message tables."""
+
+    @classmethod
+    def setUpTestData(cls):
+        generator = SchoolGenerator(
+            seed=1, prefix='rollup', branches=2, classes=1, arms=1, students_per_arm=6,
+            staff_per_branch=2, communications=0, scheduled=0,
+        )
+        generator.build()
+        cls.sender = CustomUser.objects.filter(branch=generator.branches[0], role='branch_admin').first()
+        cls.recipients = CustomUser.objects.filter(role__in=['student', 'parent']).order_by('id')
+
+    def send(self, title, requires_response):
+        communication = Communication.objects.create(
+            sender=self.sender, message_type='notification', title=title, body='Body',
+            requires_response=requires_response,
+        )
+        send_communication_to_recipients(communication=communication, selected_recipients=self.recipients)
+        communication.sent = True
+        communication.sent_at = timezone.now()
+        communication.save()
+        return communication
+
+    def test_incremental_counters_match_rebuild(self):
+        notice = self.send('Notice', requires_response=False)
+        survey = self.send('Survey', requires_response=True)
+        readers = list(self.recipients[:6])
+
+        for n, user in enumerate(readers):
+            self.client.force_login(user)
+            entry = CommunicationRecipient.objects.get(communication=survey, recipient=user)
+            self.assertEqual(self.client.get(reverse('read_message', args=[entry.pk])).status_code, 200)
+            if n % 2 == 0:
+                self.client.post(reverse('submit_reply', args=[entry.pk]), {
+                    'reply': 'Yes', 'idempotency_key': f'reply-{n}',
+                    'attachments-TOTAL_FORMS': '0', 'attachments-INITIAL_FORMS': '0',
+                })
+            if n % 3 == 0:
+                # A second reply to the same message
+                self.client.post(reverse('submit_reply', args=[entry.pk]), {
+                    'reply': 'And another thing', 'idempotency_key': f'again-{n}',
+                    'attachments-TOTAL_FORMS': '0', 'attachments-INITIAL_FORMS': '0',
+                })
+            if n % 2 == 1:
+                # Deleted with the reply still pending
+                self.client.post(reverse('delete_message', args=[entry.pk]))
+            notice_entry = CommunicationRecipient.objects.get(communication=notice, recipient=user)
+            if n < 3:
+                self.client.post(reverse('delete_message', args=[notice_entry.pk]))
+
+        self.assertTrue(CommunicationRecipient.objects.filter(deleted=True).exists())
+        self.assertTrue(CommunicationRecipient.objects.filter(has_responded=True).exists())
+
+        today = timezone.localdate()
+        users, daily = _user_stats(), _daily_stats(today)
+        rollups.rebuild_user_stats()
+        rollups.rebuild_daily_stats(today)
+        self.assertEqual(users, _user_stats())
+        self.assertEqual(daily, _daily_stats(today))
+
+        replies = Communication.objects.filter(pk=survey.pk).values_list('reply_count', 'responder_count').get()
+        self.assertEqual(rollups.rebuild_reply_counts(), 0)
+        self.assertEqual(replies, (5, 4))
+
+    def test_rebuild_without_conflict_target(self):
+        # MySQL's upsert cannot name the unique column: rows are updated, then the rest inserted
+        self.send('Notice', requires_response=False)
+        rollups.refresh_branch_stats()
+        rollups.rebuild_user_stats()
+        users, branches = _user_stats(), sorted(BranchStats.objects.values_list('branch_id', 'students', 'parents'))
+
+        UserMessageStats.objects.filter(user=self.recipients[0]).delete()
+        UserMessageStats.objects.filter(user=self.recipients[1]).update(received=99, unread=99)
+        BranchStats.objects.filter(pk=BranchStats.objects.first().pk).delete()
+        BranchStats.objects.update(students=99)
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False):
+            rollups.refresh_branch_stats()
+            rollups.rebuild_user_stats(batch_size=7)
+        self.assertEqual(users, _user_stats())
+        self.assertEqual(branches, sorted(BranchStats.objects.values_list('branch_id', 'students', 'parents')))
+
+
+class ScheduledMessagesTests(TestCase):
+    """Senders see their scheduled and recurring messages and can stop or delete them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        generator = SchoolGenerator(
+            seed=1, prefix='sched', branches=1, classes=1, arms=1, students_per_arm=2,
+            staff_per_branch=1, communications=0, scheduled=0,
+        )
+        generator.build()
+        cls.sender = CustomUser.objects.filter(role='branch_admin').first()
+        template = Communication.objects.create(sender=cls.sender, message_type='notification', title='Fees reminder', body='Body')
+        cls.schedule = RecurringCommunication.objects.create(template=template, rule='0 7 * * 1-5')
+
+    def test_stop_and_delete(self):
+        self.client.force_login(self.sender)
+        response = self.client.get(reverse('scheduled_messages'))
+        self.assertContains(response, 'Fees reminder')
+        self.assertContains(response, 'Repeats')
+
+        self.client.post(reverse('stop_recurring_message', args=[self.schedule.template_id]))
+        self.schedule.refresh_from_db()
+        self.assertFalse(self.schedule.active)
+        self.assertIsNone(self.schedule.next_run_at)
+        self.assertContains(self.client.get(reverse('scheduled_messages')), 'Ended')
+
+        self.client.post(reverse('delete_scheduled_message', args=[self.schedule.template_id]))
+        self.assertFalse(RecurringCommunication.objects.filter(pk=self.schedule.pk).exists())
+
+
+class AudienceSnapshotTests(TestCase):
+    """Only messages that wait keep a recipient snapshot, and only while they wait."""
+
+    @classmethod
+    def setUpTestData(cls):
+        generator = SchoolGenerator(
+            seed=1, prefix='snap', branches=1, classes=1, arms=1, students_per_arm=6,
+            staff_per_branch=1, communications=0, scheduled=0,
+        )
+        generator.build()
+        cls.branch = generator.branches[0]
+        cls.sender = CustomUser.objects.filter(role='branch_admin').first()
+        cls.students = list(CustomUser.objects.filter(role='student').values_list('id', flat=True))
+
+    def compose(self, recipients, url=None, **fields):
+        data = {
+            'message_type': 'announcement', 'title': 'Snapshot', 'body': 'Body',
+            'saved_branch': str(self.branch.pk), 'saved_role': 'student',
+            'selected_recipients': [str(pk) for pk in recipients],
+            'attachments-TOTAL_FORMS': '0', 'attachments-INITIAL_FORMS': '0',
+            **fields,
+        }
+        self.assertEqual(self.client.post(url or reverse('communication_create'), data).status_code, 302)
+        return Communication.objects.filter(sender=self.sender).latest('id')
+
+    def snapshots(self):
+        return SavedAudience.objects.filter(name='').count()
+
+    def setUp(self):
+        self.client.force_login(self.sender)
+
+    def test_sent_now_takes_no_snapshot(self):
+        communication = self.compose(self.students[:3])
+        self.assertTrue(communication.sent)
+        self.assertIsNone(communication.audience_id)
+        self.assertEqual(self.snapshots(), 0)
+
+    def test_scheduled_message_drops_its_snapshot_once_sent(self):
+        later = timezone.localtime() + timedelta(days=1)
+        communication = self.compose(self.students[:3], scheduled_time=later.strftime('%d-%m-%Y %I:%M %p'))
+        self.assertEqual(communication.audience.size, 3)
+        self.assertTrue(tasks.send_communication(communication.pk))
+        communication.refresh_from_db()
+        self.assertIsNone(communication.audience_id)
+        self.assertEqual(communication.recipients.count(), 3)
+        self.assertEqual(self.snapshots(), 0)
+
+    def test_resaved_and_deleted_drafts_leave_no_snapshots(self):
+        draft = self.compose(self.students[:3], is_draft='on')
+        self.compose(self.students[3:], url=reverse('communication_edit_draft', args=[draft.pk]), is_draft='on')
+        draft.refresh_from_db()
+        self.assertEqual(sorted(draft.audience.member_ids()), sorted(self.students[3:]))
+        self.assertEqual(self.snapshots(), 1)
+
+        draft.delete()
+        self.assertEqual(archive_communications().snapshots, 1)
+        self.assertEqual(self.snapshots(), 0)
+
+
+@skipUnless(fakeredis, "fakeredis[lua] is not installed")
+class RedisBucketsTests(TestCase):
+    """The Lua bucket shared through Redis grants what the in-process bucket does."""
+
+    def setUp(self):
+        self.client = fakeredis.FakeRedis()
+        with mock.patch('redis.Redis.from_url', return_value=self.client):
+            self.redis = ratelimit.RedisBuckets('redis://fake')
+        self.local = ratelimit.LocalBuckets()
+
+    def take(self, key, requested, rate, capacity):
+        granted, tokens = self.redis.take(key, requested, rate, capacity)
+        local_granted, local_tokens = self.local.take(key, requested, rate, capacity)
+        self.assertEqual(granted, local_granted)
+        self.assertAlmostEqual(tokens, local_tokens, delta=0.5)
+        return granted
+
+    def test_burst_refill_and_cap(self):
+        # A full bucket grants its burst, then nothing until it refills
+        self.assertEqual(self.take('gmail', 30, 10, 20), 20)
+        self.assertEqual(self.take('gmail', 5, 10, 20), 0)
+        time.sleep(0.35)
+        self.assertEqual(self.take('gmail', 10, 10, 20), 3)
+        # Idle for longer than a refill: capped at the burst
+        self.assertEqual(self.take('yahoo', 5, 10, 5), 5)
+        time.sleep(1)
+        self.assertEqual(self.take('yahoo', 8, 10, 5), 5)
+        # Peeking takes nothing; buckets expire once they would be full again
+        self.assertEqual(self.take('yahoo', 0, 10, 5), 0)
+        self.assertGreater(self.client.ttl('gmail'), 0)
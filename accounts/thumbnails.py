@@ -0,0 +1,131 @@
+"""
+Square profile-picture thumbnails (32/64/128 px by default) stored next to the originals.
+
+Thumbnails are generated when a picture is uploaded, lazily on first use, or in bulk
+with ``manage.py generate_thumbnails``. Their names are derived from the source's full
+name (its stem plus a hash of the path), so the URL can be built without a query; a
+cache entry remembers which ones exist.
+"""
+# Standard Library
+import hashlib
+import logging
+import os
+from io import BytesIO
+
+# Django Core
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+# Third-Party
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+# Local App Imports
+from . import cache_keys
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZES = tuple(getattr(settings, 'PROFILE_THUMBNAIL_SIZES', (32, 64, 128)))
+THUMBNAIL_DIR = 'profile_pictures/thumbs'
+DEFAULT_PICTURE = 'profile_pictures/default.png'
+
+MISSING = 'missing'
+# A source that could not be read is retried after this long
+MISSING_TIMEOUT = 60 * 60
+
+
+def thumbnail_format():
+    fmt = getattr(settings, 'PROFILE_THUMBNAIL_FORMAT', 'WEBP').upper()
+    if fmt == 'WEBP' and not features.check('webp'):
+        return 'JPEG'
+    return fmt
+
+
+def nearest_size(size):
+    """Smallest configured size that is at least ``size`` (or the largest available)."""
+    for candidate in sorted(THUMBNAIL_SIZES):
+        if candidate >= size:
+            return candidate
+    return max(THUMBNAIL_SIZES)
+
+
+def thumbnail_name(source_name, size):
+    # The stem alone is not unique (me.jpg and me.png, or the same name in two folders)
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+    digest = hashlib.sha1(source_name.encode()).hexdigest()[:10]
+    ext = 'webp' if thumbnail_format() == 'WEBP' else 'jpg'
+    return f"{THUMBNAIL_DIR}/{size}/{stem}-{digest}.{ext}"
+
+
+def _cache_key(source_name, size):
+    return cache_keys.make_key(cache_keys.THUMBNAILS, size, source_name)
+
+
+def generate_thumbnails(source_name, sizes=THUMBNAIL_SIZES, force=False, storage=default_storage):
+    """
+    Write every missing thumbnail of ``source_name``. Returns the number written;
+    raises ``OSError``/``UnidentifiedImageError`` if the source cannot be read.
+    """
+    pending = [s for s in sizes if force or not storage.exists(thumbnail_name(source_name, s))]
+    if not pending:
+        return 0
+
+    fmt = thumbnail_format()
+    with storage.open(source_name, 'rb') as fh:
+        image = Image.open(fh)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if fmt == 'JPEG' or image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB' if fmt == 'JPEG' else 'RGBA')
+
+    for size in pending:
+        thumb = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        buffer = BytesIO()
+        thumb.save(buffer, fmt, quality=80, **({'method': 4} if fmt == 'WEBP' else {'optimize': True}))
+        name = thumbnail_name(source_name, size)
+        if storage.exists(name):
+            storage.delete(name)
+        storage.save(name, ContentFile(buffer.getvalue()))
+
+    cache.set_many({_cache_key(source_name, s): True for s in sizes}, None)
+    return len(pending)
+
+
+def ensure_thumbnails(source_name, force=False):
+    """Generate missing thumbnails, skipping the storage round-trips when the cache says they exist."""
+    if not force:
+        keys = [_cache_key(source_name, s) for s in THUMBNAIL_SIZES]
+        cached = cache.get_many(keys)
+        if len(cached) == len(keys) and all(v is True for v in cached.values()):
+            return 0
+    try:
+        return generate_thumbnails(source_name, force=force)
+    except (OSError, UnidentifiedImageError) as e:
+        logger.warning(f"[THUMBNAILS] Cannot generate thumbnails for {source_name}: {e}")
+        return 0
+
+
+def get_thumbnail_url(source_name, size, generate=True):
+    """URL of the ``size`` thumbnail for ``source_name``, or ``None`` if unavailable."""
+    size = nearest_size(size)
+    name = thumbnail_name(source_name, size)
+    state = cache.get(_cache_key(source_name, size))
+    if state is True:
+        return default_storage.url(name)
+    if state == MISSING:
+        return None
+
+    if default_storage.exists(name):
+        cache.set(_cache_key(source_name, size), True, None)
+        return default_storage.url(name)
+    if not generate:
+        return None
+
+    try:
+        generate_thumbnails(source_name)
+    except (OSError, UnidentifiedImageError) as e:
+        logger.warning(f"[THUMBNAILS] Cannot generate thumbnails for {source_name}: {e}")
+        cache.set(_cache_key(source_name, size), MISSING, MISSING_TIMEOUT)
+        return None
+    return default_storage.url(name)
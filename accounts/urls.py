@@ -95,6 +95,8 @@ urlpatterns = [
     # path('communications/ajax/get_student_classes/', views.get_student_classes, name='get_student_classes'),
     # path('communications/ajax/get_class_arms/', views.get_class_arms, name='get_class_arms'),
     path('communications/ajax/get_filtered_users/', views.get_filtered_users, name='get_filtered_users'),
+    path('communications/ajax/target_group_size/', views.target_group_size, name='target_group_size'),
+    path('notifications/devices/register/', views.register_push_device, name='register_push_device'),
     path('communications/get-user-by-id/', views.get_user_by_id, name='get_user_by_id'),
     # path('communications/send/', views.SendCommunicationView.as_view(), name='send_communication'),
     path('communications/sent/', views.communication_success, name='communication_success'),
@@ -102,14 +104,19 @@ urlpatterns = [
     path('communications/inbox/', views.inbox_view, name='inbox'),
     path('communications/inbox/read/<int:pk>/', views.read_message, name='read_message'),
     path('communication/<int:pk>/delete/', views.delete_message, name='delete_message'),
+    path('communications/inbox/broadcast/<int:communication_id>/', views.read_broadcast, name='read_broadcast'),
+    path('communications/inbox/broadcast/<int:communication_id>/delete/', views.delete_broadcast, name='delete_broadcast'),
     path('communication/attachments/download/<int:pk>/', views.download_attachment, name='download_attachment'),
     path('communications/outbox/', views.outbox_view, name='outbox'),
     path('communications/outbox/read/<int:pk>/', views.read_sent_message, name='read_sent_message'),
+    path('communications/outbox/read/<int:pk>/replies/', views.reply_thread_view, name='reply_thread'),
     path('communications/outbox/delete/<int:pk>/', views.delete_sent_message, name='delete_sent_message'),
     path('communications/inbox/delete-all/', views.delete_all_inbox_messages, name='delete_all_inbox_messages'),
     path('communications/sent/delete-all/', views.delete_all_sent_messages, name='delete_all_outbox_messages'),
     path('communications/reply/<int:recipient_id>/', views.submit_reply, name='submit_reply'),
-    path('communications/scheduled/', views.scheduled_messages_view, name='scheduled_messages'),
+    path('communications/scheduled/list/', views.scheduled_messages_view, name='scheduled_messages'),
+    path('communications/scheduled/<int:pk>/delete/', views.delete_scheduled_message, name='delete_scheduled_message'),
+    path('communications/scheduled/<int:pk>/stop/', views.stop_recurring_message, name='stop_recurring_message'),
     path('communications/drafts/', views.draft_messages_view, name='draft_messages'),
     # path('communications/drafts/<int:pk>/edit/', views.EditDraftMessageView.as_view(), name='edit_draft_message'),
     path('communications/drafts/<int:pk>/delete/', views.delete_draft_message, name='delete_draft_message'),
@@ -119,6 +126,13 @@ urlpatterns = [
 
     path('communications/edit/<int:pk>/', views.CommunicationCreateUpdateView.as_view(), name='communication_edit_draft'),
 
+    path('communications/archive/', views.archive_view, name='communication_archive'),
+    path('communications/archive/<int:pk>/', views.read_archived_message, name='read_archived_message'),
+    path('communications/archive/<int:pk>/attachments/<int:index>/', views.download_archived_attachment, name='download_archived_attachment'),
+
+    # Instrumentation
+    path('metrics/requests/', views.request_metrics_view, name='request_metrics'),
+
 
 ]
 
@@ -87,26 +87,16 @@ logger = logging.getLogger(__name__)
 
 def send_communication_to_recipients(communication, selected_recipients=None, manual_emails=None):
     from .models import CommunicationRecipient
-    from django.contrib.auth import get_user_model
-    from django.core.mail import EmailMessage
-    from django.utils.timezone import now
-    from django.conf import settings
+    from .notifications.channels import schedule_delivery
+    from .rollups import record_broadcast_sent, record_sent
     from django.db import transaction
-    import logging
-
-    logger = logging.getLogger(__name__)
-    User = get_user_model()
-
-    subject = communication.title or (communication.body[:50] + '...')
-    message = communication.body
-    from_email = (
-        communication.sender.email
-        if communication.sender and communication.sender.email
-        else settings.DEFAULT_FROM_EMAIL
-    )
 
     # Step 1: Save recipients if provided
-    if selected_recipients or manual_emails:
+    recipient_ids = []
+    if communication.is_broadcast:
+        # Fan-out-on-read: users' inbox rows are created when they first open it
+        selected_recipients = None
+    if selected_recipients or manual_emails or communication.is_broadcast:
         with transaction.atomic():
             if selected_recipients:
                 for recipient in selected_recipients:
@@ -115,6 +105,7 @@ def send_communication_to_recipients(communication, selected_recipients=None, ma
                         recipient=recipient,
                         requires_response=communication.requires_response
                     )
+                    recipient_ids.append(recipient.id)
             if manual_emails:
                 for email in manual_emails:
                     CommunicationRecipient.objects.create(
@@ -123,62 +114,39 @@ def send_communication_to_recipients(communication, selected_recipients=None, ma
                         requires_response=communication.requires_response
                     )
 
-    # Step 2: Send to manual emails (not in-app users)
-    recipients = CommunicationRecipient.objects.filter(communication=communication)
-    attachments = list(communication.attachments.all())
-
-    registered_emails = set(
-        email.lower() for email in User.objects.values_list('email', flat=True)
-    )
-
-    for recipient in recipients:
-        if recipient.recipient:
-            logger.debug(f"Skipping in-app recipient: {recipient.recipient}")
-            continue
-
-        if recipient.email:
-            if recipient.email.lower() in registered_emails:
-                logger.info(f"Skipping {recipient.email} (registered user)")
-                continue
-
-            try:
-                email_msg = EmailMessage(
-                    subject=subject,
-                    body=message,
-                    from_email=from_email,
-                    to=[recipient.email],
-                )
-
-                for attachment in attachments:
-                    try:
-                        content_type = getattr(attachment.file.file, 'content_type', 'application/octet-stream')
-                        email_msg.attach(attachment.basename, attachment.file.read(), content_type)
-                    except Exception as e:
-                        logger.warning(f"Attachment issue for {recipient.email}: {e}")
-
-                email_msg.send(fail_silently=False)
-                recipient.delivered = True
-                recipient.delivered_at = now()
-                recipient.save()
-                logger.info(f"Email sent to {recipient.email}")
-
-            except Exception as e:
-                logger.error(f"Failed to send to {recipient.email}: {e}", exc_info=True)
+            # Keep dashboard counters in step with the new inbox rows
+            if communication.is_broadcast:
+                record_broadcast_sent(communication)
+            else:
+                record_sent(communication, recipient_ids)
+
+    # Step 2: Deliver through each recipient's channel (in-app, email, SMS, push) and
+    # to the manual emails, in batches (accounts.notifications.channels)
+    schedule_delivery(communication)
 
 
 def generate_profile_number(role_prefix, model_class):
+    return allocate_profile_numbers(role_prefix, model_class, 1)[0]
+
+
+def allocate_profile_numbers(role_prefix, model_class, count, taken=None):
+    """
+    Reserve ``count`` consecutive profile numbers with a single lookup of the
+    highest existing number. Numbers listed in ``taken`` (e.g. explicit numbers
+    supplied in the same import) are skipped.
+    """
     year = now().year
     base_pattern = f"LAGS/{role_prefix}/{year}/"
 
     # Determine the profile number field name dynamically
     # Convention: For StaffProfile -> staff_number
     #             For ParentProfile -> parent_number
-    #             For StudentProfile -> student_number
+    #             For StudentProfile -> admission_number
     # You can extend this mapping if needed
     field_map = {
         'StaffProfile': 'staff_number',
         'ParentProfile': 'parent_number',
-        'StudentProfile': 'student_number',
+        'StudentProfile': 'admission_number',
     }
     number_field = field_map.get(model_class.__name__)
     if not number_field:
@@ -199,7 +167,14 @@ def generate_profile_number(role_prefix, model_class):
     else:
         new_number = 1
 
-    return f"{base_pattern}{str(new_number).zfill(4)}"
+    taken = taken or set()
+    numbers = []
+    while len(numbers) < count:
+        candidate = f"{base_pattern}{str(new_number).zfill(4)}"
+        if candidate not in taken:
+            numbers.append(candidate)
+        new_number += 1
+    return numbers
 
 
 def get_prefix_for_user(user):
@@ -1,7 +1,9 @@
 # Standard Library
 import json
 import os
+import uuid
 import logging
+from contextlib import ExitStack
 from datetime import datetime
 from django.db.models import Count
 
@@ -11,10 +13,11 @@ from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout as auth_logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.files.storage import default_storage
 from django.core.paginator import Paginator
 from django.core.validators import validate_email
-from django.db import transaction
-from django.db.models import F
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
 from django.db.models.functions import Coalesce
 from django.http import (
     JsonResponse, HttpResponseRedirect, 
@@ -23,6 +26,7 @@ from django.http import (
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.utils.decorators import method_decorator
 from django.utils.http import urlencode
 from django.views import View
@@ -33,6 +37,11 @@ from django.views.generic import (
 )
 
 # Project-Specific Imports
+from . import audiences, broadcasts, merge_fields, rollups, targeting
+from .metrics import request_metrics
+from .audiences import snapshot
+from .id_joins import id_join
+from .paginators import KnownCountPaginator
 from .utils import send_communication_to_recipients
 from .forms import (
     TeachingPositionForm, NonTeachingPositionForm, StaffCreationForm, StaffProfileForm,
@@ -46,7 +55,8 @@ from .models import (
     CustomUser, StudentProfile, StaffProfile,
     TeachingPosition, NonTeachingPosition, Branch, StudentClass, ClassArm,
     Communication, CommunicationAttachment,
-    CommunicationRecipient, SentMessageDelete,MessageReply, ReplyAttachment
+    CommunicationRecipient, SentMessageDelete,MessageReply, ReplyAttachment,
+    CommunicationArchive, ArchivedRecipient, SavedAudience, PushDevice, RecurringCommunication
 )
 from django.http import QueryDict
 from django.views.decorators.http import require_http_methods
@@ -106,27 +116,27 @@ def user_login(request):
 # Define the student dashboard
 @login_required
 def student_dashboard(request):
-    return render(request, 'dashboard/student_dashboard.html')
+    return render(request, 'dashboard/student_dashboard.html', {'stats': rollups.dashboard_stats(request.user)})
 
 # Define the parent dashboard
 @login_required
 def parent_dashboard(request):
-    return render(request, 'dashboard/parent_dashboard.html')
+    return render(request, 'dashboard/parent_dashboard.html', {'stats': rollups.dashboard_stats(request.user)})
 
 # Define the staff dashboard
 @login_required
 def staff_dashboard(request):
-    return render(request, 'dashboard/staff_dashboard.html')
+    return render(request, 'dashboard/staff_dashboard.html', {'stats': rollups.dashboard_stats(request.user)})
 
 # Define the branch admin dashboard
 @login_required
 def branch_admin_dashboard(request):
-    return render(request, 'dashboard/branch_admin_dashboard.html')
+    return render(request, 'dashboard/branch_admin_dashboard.html', {'stats': rollups.dashboard_stats(request.user)})
 
 # Define the superadmin dashboard
 @login_required
 def superadmin_dashboard(request):
-    return render(request, 'dashboard/superadmin_dashboard.html')
+    return render(request, 'dashboard/superadmin_dashboard.html', {'stats': rollups.dashboard_stats(request.user)})
 
 
 def logout(request):
@@ -1049,6 +1059,7 @@ class ParentUpdateView(View):
             'occupation': getattr(user.parentprofile, 'occupation', ''),
             'relationship_to_student': getattr(user.parentprofile, 'relationship_to_student', ''),
             'preferred_contact_method': getattr(user.parentprofile, 'preferred_contact_method', ''),
+            'digest_frequency': getattr(user.parentprofile, 'digest_frequency', 'off'),
             'nationality': getattr(user.parentprofile, 'nationality', ''),
             'state': getattr(user.parentprofile, 'state', '')
         })
@@ -1304,7 +1315,7 @@ def get_filtered_users(request):
         users_list = []
         for user in recipients:
             profile_picture_url = (
-                user.profile_picture.url if user.profile_picture else "/static/assets/img/profile-pic.png"
+                user.get_profile_picture_url(size=32) if user.profile_picture else "/static/assets/img/profile-pic.png"
             )
             users_list.append({
                 "id": user.id,
@@ -1326,6 +1337,38 @@ def get_filtered_users(request):
     return JsonResponse({"error": "Invalid filter data"}, status=400)
 
 
+@login_required
+@require_GET
+def target_group_size(request):
+    """Label and cached member count of one target group, for the compose form's group list."""
+    if request.user.role not in targeting.STAFF_ROLES:
+        return JsonResponse({'status': 'error', 'message': 'Only staff can target groups.'}, status=403)
+
+    spec = targeting.clean_spec({
+        name: request.GET.getlist(name) if name in targeting.POSITION_FIELDS else request.GET.get(name)
+        for name in targeting.SPEC_FIELDS
+    })
+    if spec is None:
+        return JsonResponse({'status': 'error', 'message': 'Please select a Branch.'}, status=400)
+    return JsonResponse({'status': 'success', **targeting.preview(spec)})
+
+
+@login_required
+@require_POST
+def register_push_device(request):
+    """Store the FCM token of the user's app or browser so urgent notices can be pushed to it."""
+    token = (request.POST.get('token') or '').strip()
+    platform = request.POST.get('platform', 'android')
+    if not token or len(token) > 255:
+        return JsonResponse({'status': 'error', 'message': 'A device token is required.'}, status=400)
+    if platform not in dict(PushDevice.PLATFORM_CHOICES):
+        return JsonResponse({'status': 'error', 'message': 'Unknown platform.'}, status=400)
+
+    # A token moves with the device, e.g. when another user signs in on it
+    PushDevice.objects.update_or_create(token=token, defaults={'user': request.user, 'platform': platform})
+    return JsonResponse({'status': 'success', 'message': 'Device registered.'})
+
+
 @login_required
 def get_user_by_id(request):
     user_id = request.GET.get("id")
@@ -1338,7 +1381,7 @@ def get_user_by_id(request):
             "email": user.email,
             "branch__name": user.branch.name if user.branch else "",
             "profile_picture": {
-                "url": getattr(user.profile_picture, "url", "")
+                "url": user.get_profile_picture_url(size=32) if user.profile_picture else ""
             }
 
         })
@@ -1450,8 +1493,39 @@ class CommunicationCreateUpdateView(View):
         return recipients.exclude(id=user.id)
 
     def _get_selected_recipients(self, request, allowed_recipients):
-        selected_ids = request.POST.getlist('selected_recipients')
-        return allowed_recipients.filter(id__in=selected_ids)
+        selected_ids = self._clean_id_list(request.POST.getlist('selected_recipients'))
+        return allowed_recipients.filter(id__in=self.id_joins.enter_context(id_join(selected_ids)))
+
+    def _get_target_groups(self, request):
+        """Extra target groups added on the form (staff senders only), as ``targeting`` specs."""
+        if request.user.role not in targeting.STAFF_ROLES:
+            return []
+        return targeting.parse_specs(request.POST.get('target_groups'))
+
+    def _whole_filter_spec(self, request, target_group_form, selected_recipients, allowed_recipients):
+        """
+        The filter as a target group when it is a plain branch/role filter with every
+        matching user ticked, so it can be stored (and broadcast) as a group.
+        """
+        if request.user.role not in targeting.STAFF_ROLES:
+            return None
+        spec = targeting.clean_spec(target_group_form.cleaned_data)
+        if spec is None or not targeting.is_branch_role_only(spec) or target_group_form.cleaned_data.get('search'):
+            return None
+        count = selected_recipients.count()
+        if not count or count != allowed_recipients.count():
+            return None
+        return spec
+
+    def _get_saved_audience(self, request):
+        """The saved audience chosen on the form, unless recipients were ticked in the table."""
+        audience_id = request.POST.get('saved_audience')
+        if not audience_id or request.POST.getlist('selected_recipients'):
+            return None
+        return SavedAudience.objects.filter(pk=audience_id, owner=request.user).first()
+
+    def _saved_audiences(self, user):
+        return SavedAudience.objects.filter(owner=user).exclude(name='').defer('members').order_by('name')
 
     def _parse_manual_emails(self, email_string):
         emails = [email.strip() for email in email_string.split(',') if email.strip()]
@@ -1482,6 +1556,8 @@ class CommunicationCreateUpdateView(View):
             'communication': draft,
             'user_role': self.request.user.role,
             'user_branch_id': getattr(self.request.user.branch, 'id', ''),
+            'saved_audiences': self._saved_audiences(self.request.user),
+            'target_groups': [targeting.preview(spec) for spec in self._get_target_groups(self.request)],
         }
         messages.error(self.request, "There was an error with your submission. Please correct the highlighted fields.")
         return render(self.request, 'communications/com_create_and_update.html', context)
@@ -1490,11 +1566,14 @@ class CommunicationCreateUpdateView(View):
         self.request = request
         draft = None
         if pk:
-            draft = get_object_or_404(Communication, pk=pk, sender=request.user, is_draft=True, sent=False)
+            # The recipient list stays in the database: the page only shows the audience's name and size
+            draft = get_object_or_404(
+                Communication.objects.select_related('audience').defer('selected_recipient_ids', 'audience__members'),
+                pk=pk, sender=request.user, is_draft=True, sent=False
+            )
 
         if draft:
             saved_filter_data = draft.saved_filter_data or {}
-            selected_recipient_ids = draft.selected_recipient_ids or []
 
             initial_data = {
                 'branch': Branch.objects.filter(id=saved_filter_data.get('id_branch')).first() if saved_filter_data.get('id_branch') else None,
@@ -1512,19 +1591,6 @@ class CommunicationCreateUpdateView(View):
 
             target_group_form = CommunicationTargetGroupForm(initial=initial_data, user=request.user)
 
-            dummy_data = QueryDict('', mutable=True)
-            for key in ['id_branch', 'id_role', 'id_staff_type', 'id_student_class', 'id_class_arm']:
-                dummy_data[key] = saved_filter_data.get(key, '')
-            dummy_data.setlist('id_teaching_positions', self._clean_id_list(saved_filter_data.get('id_teaching_positions', [])))
-            dummy_data.setlist('id_non_teaching_positions', self._clean_id_list(saved_filter_data.get('id_non_teaching_positions', [])))
-
-            dummy_form = CommunicationTargetGroupForm(data=dummy_data, user=request.user)
-            if dummy_form.is_valid():
-                allowed_recipients = dummy_form.get_filtered_recipients(dummy_form.cleaned_data).exclude(id=request.user.id)
-            else:
-                allowed_recipients = CustomUser.objects.filter(id__in=selected_recipient_ids)
-
-            selected_recipients = allowed_recipients.filter(id__in=selected_recipient_ids)
             manual_emails_str = ", ".join(draft.manual_emails) if draft.manual_emails else ""
             communication_form = CommunicationForm(
                 instance=draft,
@@ -1540,12 +1606,11 @@ class CommunicationCreateUpdateView(View):
                 'attachment_formset': attachment_formset,
                 'communication': draft,
                 'saved_filter_data': json.dumps(saved_filter_data),
-                'selected_recipient_ids': json.dumps(selected_recipient_ids),
-                'recipients': allowed_recipients,
-                'selected_recipients': selected_recipients,
                 'editing_draft': True,
                 'user_branch_id': request.user.branch.id if getattr(request.user, 'branch', None) else '',
                 'user_role': request.user.role,
+                'saved_audiences': self._saved_audiences(request.user),
+                'target_groups': [targeting.preview(spec) for spec in targeting.communication_specs(draft)],
             }
             return render(request, 'communications/com_create_and_update.html', context)
 
@@ -1561,10 +1626,19 @@ class CommunicationCreateUpdateView(View):
                 'editing_draft': False,
                 'user_role': request.user.role,
                 'user_branch_id': getattr(request.user.branch, 'id', ''),
+                'saved_audiences': self._saved_audiences(request.user),
+                'target_groups': [],
             }
             return render(request, 'communications/com_create_and_update.html', context)
 
     def post(self, request, pk=None):
+        # Large recipient ID sets are joined through temporary tables (accounts.id_joins)
+        # that stay open until the communication has been saved and sent
+        with ExitStack() as stack:
+            self.id_joins = stack
+            return self._post(request, pk)
+
+    def _post(self, request, pk=None):
         self.request = request
         draft = None
         if pk:
@@ -1590,8 +1664,11 @@ class CommunicationCreateUpdateView(View):
         form_data.setlist('non_teaching_positions', saved_filter_data['non_teaching_positions'])
 
         target_group_form = CommunicationTargetGroupForm(data=form_data, user=request.user)
+        audience = self._get_saved_audience(request)
+        specs = self._get_target_groups(request)
+        filters_valid = audience is None and target_group_form.is_valid()
 
-        if not target_group_form.is_valid():
+        if audience is None and not specs and not filters_valid:
             communication_form.add_error(None, "Invalid target group filters.")
             return self._render_with_errors(communication_form, target_group_form, attachment_formset, draft)
 
@@ -1604,13 +1681,43 @@ class CommunicationCreateUpdateView(View):
             messages.error(request, str(e))
             return self._render_with_errors(communication_form, target_group_form, attachment_formset, draft)
 
-        branch = request.user.branch if request.user.role in ['student', 'parent'] else target_group_form.cleaned_data.get('branch')
-        if not branch:
+        selected_recipients = None
+        if audience is not None:
+            # Members were checked against the sender's filters when the audience was saved
+            member_ids = self.id_joins.enter_context(id_join(audience.member_ids()))
+            selected_recipients = CustomUser.objects.filter(
+                id__in=member_ids, is_active=True
+            ).exclude(id=request.user.id)
+        elif filters_valid:
+            branch = request.user.branch if request.user.role in ['student', 'parent'] else target_group_form.cleaned_data.get('branch')
+            if not branch and not specs:
+                target_group_form.add_error('branch', "Please select a Branch.")
+                return self._render_with_errors(communication_form, target_group_form, attachment_formset, draft)
+
+            if branch:
+                allowed_recipients = self._get_allowed_recipients(target_group_form, request.user)
+                selected_recipients = self._get_selected_recipients(request, allowed_recipients)
+                main_spec = self._whole_filter_spec(request, target_group_form, selected_recipients, allowed_recipients)
+                if main_spec is not None:
+                    # Everyone matching the filter is ticked: target the filter itself
+                    specs.append(main_spec)
+                    selected_recipients = None
+        elif not specs:
             target_group_form.add_error('branch', "Please select a Branch.")
             return self._render_with_errors(communication_form, target_group_form, attachment_formset, draft)
 
-        allowed_recipients = self._get_allowed_recipients(target_group_form, request.user)
-        selected_recipients = self._get_selected_recipients(request, allowed_recipients)
+        broadcast = False
+        hand_picked = selected_recipients
+        if specs:
+            # One query for every group plus anyone ticked by hand or in the saved audience
+            extra = Q(id__in=selected_recipients.values('id')) if selected_recipients is not None else None
+            # Personalised bodies need a row per recipient to render their emails/SMS from
+            broadcast = extra is None and not merge_fields.compile_body(
+                communication_form.cleaned_data.get('body')
+            ).fields and broadcasts.is_broadcast(
+                request.user, specs, targeting.audience(specs, sender=request.user)
+            )
+            selected_recipients = targeting.audience(specs, sender=request.user, extra=extra)
 
         manual_emails_raw = communication_form.cleaned_data.get('manual_emails', '')
         valid_manual_emails = self._parse_manual_emails(manual_emails_raw)
@@ -1627,12 +1734,34 @@ class CommunicationCreateUpdateView(View):
         communication.requires_response = communication_form.cleaned_data.get('requires_response', False)
         communication.sent = False
         communication.is_draft = communication_form.cleaned_data.get('is_draft', False)
-        communication.selected_recipient_ids = list(selected_recipients.values_list('id', flat=True))
         communication.manual_emails = valid_manual_emails
         communication.saved_filter_data = {
             f"id_{k}": v for k, v in saved_filter_data.items()
         }
+
+        communication.is_broadcast = broadcast
+
+        audience_name = request.POST.get('audience_name', '').strip()[:100]
+        repeat = '' if communication.is_draft else communication_form.cleaned_data.get('repeat', '')
+        # Sent now, the message's recipients are its inbox rows: only a message that waits needs a snapshot
+        waits = communication.is_draft or bool(repeat) or not communication.is_due()
+        # Broadcasts are resolved from their target groups; drafts keep the resolved users
+        if (waits and (audience is None or specs) and (not broadcast or communication.is_draft)) or audience_name:
+            selected_ids = list(selected_recipients.values_list('id', flat=True))
+            if selected_ids:
+                audience = snapshot(request.user, selected_ids, communication.saved_filter_data, name=audience_name)
+        previous_audience_id = draft.audience_id if draft is not None else None
+        communication.audience = audience
+        communication.selected_recipient_ids = []
+        starts_at = communication.scheduled_time or timezone.now()
+        if repeat:
+            # The message becomes the template of its occurrences and is not sent itself
+            communication.scheduled_time = None
         communication.save()
+        if previous_audience_id != communication.audience_id:
+            audiences.discard(previous_audience_id)
+        if specs or draft is not None:
+            targeting.save_groups(communication, specs)
 
         for form in attachment_formset:
             if not form.cleaned_data.get('DELETE', False):
@@ -1640,7 +1769,25 @@ class CommunicationCreateUpdateView(View):
                     form.instance.communication = communication
         attachment_formset.save() 
 
-        if not communication.is_draft and communication.is_due():
+        if repeat:
+            extra_audience = None
+            if specs and hand_picked is not None:
+                # Kept apart from the groups, which each occurrence resolves again
+                extra_ids = list(hand_picked.values_list('id', flat=True))
+                if extra_ids:
+                    extra_audience = snapshot(request.user, extra_ids, communication.saved_filter_data)
+            schedule = RecurringCommunication.objects.create(
+                template=communication, rule=repeat, starts_at=starts_at, extra_audience=extra_audience,
+            )
+            first_run = timezone.localtime(schedule.next_run_at)
+            query_string = urlencode({
+                'scheduled_time': first_run.strftime('%Y-%m-%d %I:%M:%S %p'),
+                'sent': 'false'
+            })
+            messages.success(request, f"Repeats ({repeat}), first on {first_run.strftime('%b %d, %Y at %I:%M %p')}.")
+            return redirect(f"{reverse('communication_scheduled')}?{query_string}")
+
+        elif not communication.is_draft and communication.is_due():
             send_communication_to_recipients(
                 communication=communication,
                 selected_recipients=selected_recipients,
@@ -1649,6 +1796,7 @@ class CommunicationCreateUpdateView(View):
             communication.sent = True
             communication.sent_at = timezone.now()
             communication.save()
+            audiences.release(communication)
             messages.success(request, "Communication sent successfully.")
             return redirect('communication_success')
 
@@ -1726,6 +1874,13 @@ def inbox_view(request):
             F('display_time').desc()
         )
 
+        # Broadcasts the user has not opened yet have no row; merge them in by time
+        pending = broadcasts.inbox_entries(request.user)
+        if pending:
+            received_messages = sorted(
+                [*received_messages, *pending], key=lambda entry: entry.display_time, reverse=True
+            )
+
         return render(request, 'communications/inbox.html', {
             'received_messages': received_messages
         })
@@ -1743,7 +1898,9 @@ def read_message(request, pk):
         recipient=request.user,
         deleted=False
     )
-    recipient_entry.mark_as_read()
+    if not recipient_entry.read:
+        recipient_entry.mark_as_read()
+        rollups.record_read(request.user)
 
     reply_instance = MessageReply()  
     attachment_formset = ReplyAttachmentFormSet(
@@ -1756,12 +1913,31 @@ def read_message(request, pk):
         'message': recipient_entry.communication,
         'recipient_entry': recipient_entry,
         'attachment_formset': attachment_formset,
+        'idempotency_key': uuid.uuid4().hex,
         'MAX_ATTACHMENT_COUNT': settings.MAX_ATTACHMENT_COUNT,
         'MAX_SINGLE_ATTACHMENT_MB': settings.MAX_SINGLE_ATTACHMENT_MB,
     })
 
 
 
+@login_required
+def read_broadcast(request, communication_id):
+    """Open a broadcast from the inbox, creating the user's inbox row on first open."""
+    recipient_entry = broadcasts.materialize(request.user, communication_id)
+    if recipient_entry is None or recipient_entry.deleted:
+        raise Http404("Message not found.")
+    return redirect('read_message', pk=recipient_entry.pk)
+
+
+@login_required
+@require_POST
+def delete_broadcast(request, communication_id):
+    recipient_entry = broadcasts.materialize(request.user, communication_id)
+    if recipient_entry is None or recipient_entry.deleted:
+        raise Http404("Message not found.")
+    return _delete_recipient_entry(request, recipient_entry)
+
+
 @login_required
 @require_POST  # Only allow POST for delete operation
 def delete_message(request, pk):
@@ -1771,9 +1947,13 @@ def delete_message(request, pk):
         recipient=request.user,
         deleted=False
     )
+    return _delete_recipient_entry(request, recipient_message)
+
 
+def _delete_recipient_entry(request, recipient_message):
     recipient_message.deleted = True
     recipient_message.save()
+    rollups.record_deleted(request.user, recipient_message)
 
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
         return JsonResponse({'status': 'success', 'message': 'Message deleted.'})
@@ -1869,8 +2049,34 @@ def read_sent_message(request, pk):
         # Optionally, you can raise 404 if the message is deleted by sender
         raise Http404("This message was deleted.")
 
+    recipients = list(communication.recipients.select_related('recipient__branch'))
     return render(request, 'communications/sent_message_detail.html', {
         'sent_message': communication,
+        'recipients': recipients,
+    })
+
+
+@login_required
+@require_GET
+def reply_thread_view(request, pk):
+    """All replies to one of the user's sent communications, paginated by time."""
+    communication = get_object_or_404(Communication, pk=pk, sender=request.user, sent=True)
+    if SentMessageDelete.objects.filter(communication=communication, sender=request.user, deleted=True).exists():
+        raise Http404("This message was deleted.")
+
+    newest_first = request.GET.get('order') == 'newest'
+    replies = MessageReply.objects.filter(communication=communication).select_related(
+        'responder__branch'
+    ).prefetch_related('attachments').order_by(
+        *(('-replied_at', '-id') if newest_first else ('replied_at', 'id'))
+    )
+
+    # reply_count is kept with every reply (accounts.rollups), so no COUNT(*) per page
+    page_obj = KnownCountPaginator(replies, 25, communication.reply_count).get_page(request.GET.get('page'))
+    return render(request, 'communications/reply_thread.html', {
+        'sent_message': communication,
+        'page_obj': page_obj,
+        'newest_first': newest_first,
     })
 
 
@@ -1904,6 +2110,8 @@ def delete_all_inbox_messages(request):
     if request.method == "POST":
         user = request.user
         CommunicationRecipient.objects.filter(recipient=user, deleted=False).update(deleted=True)
+        broadcasts.materialize_deleted(user)
+        rollups.record_inbox_cleared(user)
         messages.success(request, "All your inbox messages have been deleted.")
     return redirect('inbox') 
 
@@ -1923,8 +2131,25 @@ def delete_all_sent_messages(request):
     return redirect('outbox')
 
 
+def _reply_payload(reply, attachments):
+    return {
+        'id': reply.pk,
+        'reply_text': reply.reply_text,
+        'replied_at': timezone.localtime(reply.replied_at).strftime('%a, %b %d, %Y - %I:%M %p'),
+        'attachments': [{'name': a.basename, 'url': a.file.url} for a in attachments],
+    }
+
+
 @login_required
 def submit_reply(request, recipient_id):
+    """
+    Save a reply to a message that requires a response.
+
+    The form carries an ``idempotency_key`` (or the client sends an ``Idempotency-Key``
+    header), so a double-click or retried request returns the reply that already exists
+    instead of creating a second one. Everything is validated before anything is written.
+    AJAX requests get JSON; other requests are redirected to the inbox.
+    """
     recipient_entry = get_object_or_404(
         CommunicationRecipient,
         pk=recipient_id,
@@ -1935,43 +2160,78 @@ def submit_reply(request, recipient_id):
 
     from .forms import ReplyAttachmentFormSet
 
-    if request.method == 'POST':
-        reply_text = request.POST.get('reply', '').strip()
-
-        if not reply_text and not request.FILES:
-            messages.error(request, "Reply cannot be empty.")
-            return redirect('inbox')
-
-        try:
-            with transaction.atomic():
-                reply = MessageReply.objects.create(
-                    recipient_entry=recipient_entry,
-                    responder=request.user,
-                    reply_text=reply_text
-                )
-
-                formset = ReplyAttachmentFormSet(
-                    request.POST, request.FILES,
-                    instance=reply,
-                    prefix='attachments'
-                )
-
-                if formset.is_valid():
-                    formset.save()
-                else:
-                    messages.error(request, "There was an error with the attachments.")
-                    return redirect('inbox')
+    is_ajax = request.headers.get('x-requested-with') == 'XMLHttpRequest'
+
+    def respond(ok, message, status=200, reply=None, attachments=(), **extra):
+        if is_ajax:
+            payload = {'status': 'success' if ok else 'error', 'message': message, **extra}
+            if reply is not None:
+                payload['reply'] = _reply_payload(reply, attachments)
+            return JsonResponse(payload, status=status)
+        (messages.success if ok else messages.error)(request, message)
+        return redirect('inbox')
+
+    if request.method != 'POST':
+        return redirect('inbox')
+
+    key = (request.POST.get('idempotency_key') or request.headers.get('Idempotency-Key') or '').strip()[:64] or None
+    if key:
+        existing = MessageReply.objects.filter(recipient_entry=recipient_entry, idempotency_key=key).first()
+        if existing:
+            return respond(True, "Your reply has been submitted.", reply=existing,
+                           attachments=existing.attachments.all(), duplicate=True)
+
+    reply_text = request.POST.get('reply', '').strip()
+    formset = ReplyAttachmentFormSet(
+        request.POST, request.FILES,
+        instance=MessageReply(recipient_entry=recipient_entry),
+        prefix='attachments'
+    )
+    if not formset.is_valid():
+        errors = [str(e) for form_errors in formset.errors for field in form_errors.values() for e in field]
+        errors += list(formset.non_form_errors())
+        return respond(False, "There was an error with the attachments.", status=400, errors=errors)
+
+    files = [
+        form.cleaned_data['file'] for form in formset.forms
+        if form.cleaned_data.get('file') and not form.cleaned_data.get('DELETE')
+    ]
+    if not reply_text and not files:
+        return respond(False, "Reply cannot be empty.", status=400)
 
-                recipient_entry.has_responded = True
-                recipient_entry.save()
+    try:
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    reply = MessageReply.objects.create(
+                        recipient_entry=recipient_entry,
+                        communication_id=recipient_entry.communication_id,
+                        responder=request.user,
+                        reply_text=reply_text,
+                        idempotency_key=key,
+                    )
+            except IntegrityError:
+                # A concurrent request with the same key won the race
+                existing = MessageReply.objects.get(recipient_entry=recipient_entry, idempotency_key=key)
+                return respond(True, "Your reply has been submitted.", reply=existing,
+                               attachments=existing.attachments.all(), duplicate=True)
+
+            attachments = ReplyAttachment.objects.bulk_create(
+                [ReplyAttachment(reply=reply, file=f) for f in files]
+            )
 
-                messages.success(request, "Your reply has been submitted.")
+            # Conditional UPDATE: exactly one request sees the first reply
+            first_reply = bool(
+                CommunicationRecipient.objects.filter(pk=recipient_entry.pk, has_responded=False)
+                .update(has_responded=True)
+            )
+            rollups.record_reply(request.user, recipient_entry.communication_id, first_reply)
 
-        except Exception as e:
-            messages.error(request, f"An error occurred while saving your reply: {e}")
-            return redirect('inbox')
+    except Exception as e:
+        logger.error(f"[REPLY] Failed to save reply for entry {recipient_entry.pk}: {e}", exc_info=True)
+        return respond(False, "An error occurred while saving your reply. Please try again.", status=500)
 
-    return redirect('inbox')
+    return respond(True, "Your reply has been submitted.", status=201, reply=reply, attachments=attachments)
 
 
 @login_required(login_url='login')
@@ -1991,11 +2251,11 @@ def scheduled_messages_view(request):
             sender=request.user,
             sent=False,
             is_draft=False,
-        ).annotate(
-            display_time=Coalesce('scheduled_time', 'created_at')
+        ).select_related('recurrence').annotate(
+            display_time=Coalesce('scheduled_time', 'recurrence__next_run_at', 'created_at')
         ).order_by(F('display_time').asc())
 
-        return render(request, 'communications/scheduled.html', {
+        return render(request, 'communications/scheduled_messages.html', {
             'scheduled_messages': scheduled_messages
         })
 
@@ -2004,6 +2264,26 @@ def scheduled_messages_view(request):
         return HttpResponseServerError("An error occurred while loading scheduled messages.")
 
 
+@require_POST
+@login_required
+def delete_scheduled_message(request, pk):
+    # A recurring message's template goes with its schedule; occurrences already sent stay
+    scheduled = get_object_or_404(Communication, pk=pk, sender=request.user, is_draft=False, sent=False)
+    scheduled.delete()
+    messages.success(request, "Scheduled message deleted successfully.")
+    return redirect('scheduled_messages')
+
+
+@require_POST
+@login_required
+def stop_recurring_message(request, pk):
+    schedule = get_object_or_404(RecurringCommunication, template__pk=pk, template__sender=request.user)
+    schedule.active = False
+    schedule.save()
+    messages.success(request, "The message will not repeat again.")
+    return redirect('scheduled_messages')
+
+
 from django.db.models import Count, Q
 
 @login_required(login_url='login')
@@ -2041,3 +2321,105 @@ class DeleteAllDraftMessagesView(View):
     def post(self, request):
         Communication.objects.filter(sender=request.user, is_draft=True, sent=False).delete()
         return redirect('draft_messages')  # or wherever you want to go after deletion
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+@require_http_methods(["GET", "POST"])
+def request_metrics_view(request):
+    """Per-URL request timing histogram for this worker process; a POST also clears it."""
+    data = request_metrics.snapshot()
+    if request.method == 'POST':
+        request_metrics.reset()
+    return JsonResponse({'pid': os.getpid(), 'urls': data})
+
+
+
+# ---------------------------------------------------------------------------
+# Archived communications (cold storage, see accounts.archive)
+# ---------------------------------------------------------------------------
+
+def _get_archive_for_user(user, pk):
+    archive = get_object_or_404(CommunicationArchive.objects.select_related('sender'), pk=pk)
+    if archive.sender_id == user.pk:
+        return archive, None
+    entry = ArchivedRecipient.objects.filter(archive=archive, recipient=user, deleted=False).first()
+    if entry is None:
+        raise Http404("Archived message not found.")
+    return archive, entry
+
+
+@login_required
+@require_GET
+def archive_view(request):
+    box = 'sent' if request.GET.get('box') == 'sent' else 'inbox'
+    if box == 'sent':
+        items = CommunicationArchive.objects.filter(
+            sender=request.user, sender_deleted=False
+        ).defer('payload').order_by('-sent_at')
+    else:
+        items = ArchivedRecipient.objects.filter(
+            recipient=request.user, deleted=False
+        ).select_related('archive__sender').defer('archive__payload').order_by('-archive__sent_at')
+
+    page_obj = Paginator(items, 25).get_page(request.GET.get('page'))
+    archives = list(page_obj) if box == 'sent' else [entry.archive for entry in page_obj]
+    return render(request, 'communications/archive.html', {
+        'box': box,
+        'page_obj': page_obj,
+        'archives': archives,
+    })
+
+
+@login_required
+@require_GET
+def read_archived_message(request, pk):
+    archive, entry = _get_archive_for_user(request.user, pk)
+    payload = archive.get_payload()
+
+    replies = payload['replies']
+    recipients = []
+    if entry is None:
+        users = CustomUser.objects.in_bulk(
+            [r['recipient_id'] for r in payload['recipients'] if r['recipient_id']]
+        )
+        recipients = [
+            {'user': users.get(r['recipient_id']), 'email': r['email'], 'read': r['read']}
+            for r in payload['recipients']
+        ]
+        responders = users
+    else:
+        # A recipient only sees their own replies
+        own_entries = {r['id'] for r in payload['recipients'] if r['recipient_id'] == request.user.pk}
+        replies = [r for r in replies if r['recipient_entry_id'] in own_entries]
+        responders = {request.user.pk: request.user}
+
+    for reply in replies:
+        reply['responder'] = responders.get(reply['responder_id'])
+        reply['replied_at'] = parse_datetime(reply['replied_at'])
+        reply['attachment_names'] = [os.path.basename(name) for name in reply['attachments']]
+
+    return render(request, 'communications/archived_message_detail.html', {
+        'archive': archive,
+        'body': payload['body'],
+        'attachments': [os.path.basename(name) for name in payload['attachments']],
+        'recipients': recipients,
+        'replies': replies,
+        'is_sender': entry is None,
+    })
+
+
+@login_required
+@require_GET
+def download_archived_attachment(request, pk, index):
+    archive, _ = _get_archive_for_user(request.user, pk)
+    attachments = archive.get_payload()['attachments']
+    if index >= len(attachments):
+        raise Http404("Attachment not found.")
+
+    try:
+        file_handle = default_storage.open(attachments[index], 'rb')
+    except FileNotFoundError:
+        raise Http404("Attachment file not found on the server.")
+
+    return FileResponse(file_handle, as_attachment=True, filename=os.path.basename(attachments[index]))
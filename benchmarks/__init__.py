@@ -0,0 +1,16 @@
+"""
+End-to-end benchmarks for the communication hot paths.
+
+Run with the Django test runner against a local database:
+
+    python manage.py test benchmarks
+    BENCH_SIZES=small,medium python manage.py test benchmarks
+
+Each path is timed and its queries counted on a synthetic school built by
+``accounts.synthetic.SchoolGenerator``. Results are written as JSON to
+``BENCH_REPORT`` (default ``benchmarks/results/latest.json``). When a baseline
+exists at ``BENCH_BASELINE`` (default ``benchmarks/baseline.json``) a path fails
+if it runs more queries than the baseline, or is slower by more than
+``BENCH_THRESHOLD`` (default 0.25, i.e. 25%). Set ``BENCH_UPDATE_BASELINE=1`` to
+record the current results as the new baseline.
+"""
@@ -0,0 +1,108 @@
+# Standard Library
+import json
+import os
+import statistics
+import time
+from pathlib import Path
+
+# Django Core
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPORT_PATH = Path(os.environ.get('BENCH_REPORT', BENCH_DIR / 'results' / 'latest.json'))
+BASELINE_PATH = Path(os.environ.get('BENCH_BASELINE', BENCH_DIR / 'baseline.json'))
+THRESHOLD = float(os.environ.get('BENCH_THRESHOLD', '0.25'))
+UPDATE_BASELINE = os.environ.get('BENCH_UPDATE_BASELINE') == '1'
+SIZES = [s.strip() for s in os.environ.get('BENCH_SIZES', 'small').split(',') if s.strip()]
+REPEAT = int(os.environ.get('BENCH_REPEAT', '5'))
+
+# Differences below this are timer noise, not regressions
+NOISE_FLOOR_MS = 5.0
+
+
+def measure(fn, setup=None, repeat=REPEAT):
+    """
+    Run ``fn`` ``repeat`` times (after an untimed warm-up) and return timing and
+    query statistics. ``setup`` runs before every call and is not measured.
+    """
+    if setup:
+        setup()
+    fn()
+
+    timings = []
+    query_counts = []
+    query_times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        reset_queries()
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - start) * 1000)
+        query_counts.append(len(ctx.captured_queries))
+        query_times.append(sum(float(q['time']) for q in ctx.captured_queries) * 1000)
+
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'min_ms': round(min(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'queries': max(query_counts),
+        'sql_ms': round(statistics.median(query_times), 3),
+        'repeat': repeat,
+    }
+
+
+class Report:
+    def __init__(self):
+        self.results = {}
+        self.baseline = self._load(BASELINE_PATH)
+
+    @staticmethod
+    def _load(path):
+        if path.exists():
+            with open(path) as fh:
+                return json.load(fh).get('results', {})
+        return {}
+
+    def record(self, size, name, stats):
+        key = f"{size}:{name}"
+        self.results[key] = stats
+        return self.regressions(key, stats)
+
+    def regressions(self, key, stats):
+        if UPDATE_BASELINE or key not in self.baseline:
+            return []
+
+        base = self.baseline[key]
+        problems = []
+        if stats['queries'] > base['queries']:
+            problems.append(f"{key}: {stats['queries']} queries (baseline {base['queries']})")
+        allowed = base['median_ms'] * (1 + THRESHOLD)
+        if stats['median_ms'] > allowed and stats['median_ms'] - base['median_ms'] > NOISE_FLOOR_MS:
+            problems.append(
+                f"{key}: {stats['median_ms']:.1f}ms median (baseline {base['median_ms']:.1f}ms, "
+                f"threshold +{THRESHOLD:.0%})"
+            )
+        return problems
+
+    def write(self):
+        payload = {
+            'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'database': connection.vendor,
+            'threshold': THRESHOLD,
+            'results': dict(sorted({**self._load(REPORT_PATH), **self.results}.items())),
+        }
+        REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(REPORT_PATH, 'w') as fh:
+            json.dump(payload, fh, indent=2)
+
+        if UPDATE_BASELINE:
+            baseline = {'results': dict(sorted({**self.baseline, **self.results}.items()))}
+            with open(BASELINE_PATH, 'w') as fh:
+                json.dump(baseline, fh, indent=2)
+
+
+report = Report()
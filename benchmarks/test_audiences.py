@@ -0,0 +1,95 @@
+# Standard Library
+import random
+import tracemalloc
+
+# Django Core
+from django.db import OperationalError
+from django.test import TestCase
+
+# Local App Imports
+from accounts.audiences import Audience, decode_ids, encode_ids
+from accounts.models import CustomUser
+
+from .harness import measure, report
+
+MEMBERS = 50_000
+ID_RANGE = 100_000
+
+
+def allocated(build):
+    """Bytes still allocated by the object ``build()`` returns."""
+    tracemalloc.start()
+    try:
+        value = build()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del value
+    return size
+
+
+class AudienceBenchmarks(TestCase):
+    """Memory and time of 50k-member audiences as ``set``s versus ``Audience`` bitmaps."""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(1)
+        cls.ids = rng.sample(range(1, ID_RANGE), MEMBERS)
+        cls.other_ids = rng.sample(range(1, ID_RANGE), MEMBERS)
+
+    def record(self, name, stats, **extra):
+        stats.update(extra)
+        problems = report.record('audience50k', name, stats)
+        self.assertFalse(problems, "Performance regression:\n" + "\n".join(problems))
+
+    def test_memory_and_set_operations(self):
+        a, b = Audience(self.ids), Audience(self.other_ids)
+        sa, sb = set(self.ids), set(self.other_ids)
+        self.assertEqual(set(a | b), sa | sb)
+        self.assertEqual(set(a & b), sa & sb)
+        self.assertEqual(set(a - b), sa - sb)
+
+        self.record(
+            'set_build_and_ops',
+            measure(lambda: (lambda x, y: (x | y, x & y, x - y))(set(self.ids), set(self.other_ids))),
+            bytes=allocated(lambda: set(self.ids)),
+        )
+        self.record(
+            'audience_build_and_ops',
+            measure(lambda: (lambda x, y: (x | y, x & y, x - y))(Audience(self.ids), Audience(self.other_ids))),
+            bytes=allocated(lambda: Audience(self.ids)),
+        )
+        self.record('audience_ops_only', measure(lambda: (a | b, a & b, a - b)))
+        self.record('audience_iterate', measure(lambda: sum(1 for _ in a)))
+
+    def test_serialization(self):
+        a = Audience(self.ids)
+        encoded = a.encode()
+        self.assertEqual(decode_ids(encoded), sorted(self.ids))
+        self.record('audience_encode', measure(a.encode), encoded_bytes=len(encoded))
+        self.record('audience_decode', measure(lambda: Audience.decode(encoded)))
+        self.record('sorted_list_encode', measure(lambda: encode_ids(self.ids)))
+
+    def test_queryset_filter(self):
+        """Filtering users by 50k IDs: one huge IN list versus a temporary-table join."""
+        a = Audience(self.ids)
+        qs = CustomUser.objects.all()
+
+        def in_list():
+            list(qs.filter(id__in=self.ids).values_list('id', flat=True))
+
+        def temp_table():
+            with a.id_join() as member_ids:
+                list(qs.filter(id__in=member_ids).values_list('id', flat=True))
+
+        self.record('audience_temp_table_join', measure(temp_table))
+        try:
+            self.record('audience_in_list', measure(in_list))
+        except OperationalError as e:
+            # e.g. SQLite's "too many SQL variables"; the temp table has no such limit
+            report.record('audience50k', 'audience_in_list', {'error': str(e), 'queries': 0, 'median_ms': 0})
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        report.write()
@@ -0,0 +1,139 @@
+# Standard Library
+import shutil
+import tempfile
+import unittest
+
+# Django Core
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+# Local App Imports
+from accounts import broadcasts, targeting
+from accounts.models import Communication, CommunicationRecipient, CustomUser
+from accounts.synthetic import SchoolGenerator
+from accounts.utils import send_communication_to_recipients
+
+from .harness import SIZES, measure, report
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='lagooz-bench-broadcast-')
+
+# Extra students added to one branch, standing in for a school-wide notice
+BRANCH_USERS = 5000
+# Announcements in the reader's inbox for the latency comparison
+INBOX_MESSAGES = 20
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class BroadcastBenchmarks(TestCase):
+    """
+    Fan-out-on-write versus fan-out-on-read (accounts.broadcasts) for an announcement to
+    a whole branch: rows and queries written per send, and the reader's inbox latency.
+    """
+    size = SIZES[0] if SIZES else None
+
+    @classmethod
+    def setUpClass(cls):
+        if cls.size is None:
+            raise unittest.SkipTest("BENCH_SIZES is empty")
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        generator = SchoolGenerator.from_size(cls.size, seed=1, prefix='bench')
+        generator.build()
+        cls.branch = generator.branches[0]
+        cls.sender = CustomUser.objects.filter(branch=cls.branch, role='branch_admin').first()
+        CustomUser.objects.bulk_create(
+            [
+                CustomUser(
+                    email=f"broadcast{n}@bench.test", username=f"broadcast{n}",
+                    role='student', branch=cls.branch, password='!',
+                )
+                for n in range(BRANCH_USERS)
+            ],
+            batch_size=1000,
+        )
+        cls.reader = CustomUser.objects.get(username='broadcast0')
+        cls.audience = CustomUser.objects.filter(branch=cls.branch, is_active=True).exclude(id=cls.sender.id)
+        cls.audience_count = cls.audience.count()
+
+    def record(self, name, stats, **extra):
+        stats.update(extra)
+        problems = report.record(f"{self.size}_broadcast", name, stats)
+        self.assertFalse(problems, "Performance regression:\n" + "\n".join(problems))
+
+    def new_communication(self, broadcast, title='Notice'):
+        communication = Communication.objects.create(
+            sender=self.sender, message_type='announcement', title=title, body='School-wide notice',
+            is_broadcast=broadcast,
+        )
+        targeting.save_groups(communication, [targeting.clean_spec({'branch': self.branch})])
+        return communication
+
+    def send(self, broadcast):
+        communication = self.new_communication(broadcast)
+        send_communication_to_recipients(communication, selected_recipients=self.audience)
+        communication.sent = True
+        communication.sent_at = timezone.now()
+        communication.save()
+        return communication
+
+    def test_write_amplification(self):
+        for label, broadcast in (('fanout_on_write', False), ('fanout_on_read', True)):
+            before = CommunicationRecipient.objects.count()
+            communication = self.send(broadcast)
+            rows = CommunicationRecipient.objects.count() - before
+            if broadcast:
+                self.assertEqual(communication.broadcast_size, self.audience_count)
+            else:
+                self.assertEqual(rows, self.audience_count)
+            self.record(
+                f"send_{label}", measure(lambda: self.send(broadcast), repeat=3),
+                recipients=self.audience_count, rows_written=rows,
+            )
+
+    def inbox(self):
+        response = self.client.get(reverse('inbox'))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_inbox_fanout_on_write(self):
+        for n in range(INBOX_MESSAGES):
+            communication = self.new_communication(False, title=f"Notice {n}")
+            CommunicationRecipient.objects.bulk_create(
+                [CommunicationRecipient(communication=communication, recipient_id=pk)
+                 for pk in self.audience.values_list('id', flat=True)],
+                batch_size=5000,
+            )
+        Communication.objects.filter(sender=self.sender, title__startswith='Notice').update(
+            sent=True, sent_at=timezone.now()
+        )
+        self.client.force_login(self.reader)
+        self.assertEqual(self.inbox().content.decode().count('Notice '), INBOX_MESSAGES)
+        self.record('inbox_fanout_on_write', measure(self.inbox))
+
+    def test_inbox_fanout_on_read(self):
+        for n in range(INBOX_MESSAGES):
+            self.new_communication(True, title=f"Notice {n}")
+        Communication.objects.filter(sender=self.sender, title__startswith='Notice').update(
+            sent=True, sent_at=timezone.now()
+        )
+        self.client.force_login(self.reader)
+        self.assertEqual(self.inbox().content.decode().count('Notice '), INBOX_MESSAGES)
+        self.record('inbox_fanout_on_read_pending', measure(self.inbox))
+
+        # Once opened, each broadcast has an ordinary inbox row
+        for communication_id in broadcasts.pending_broadcasts(self.reader).values_list('id', flat=True):
+            broadcasts.materialize(self.reader, communication_id)
+        self.assertFalse(broadcasts.pending_broadcasts(self.reader).exists())
+        self.record('inbox_fanout_on_read_opened', measure(self.inbox))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        report.write()
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
@@ -0,0 +1,115 @@
+# Standard Library
+import random
+from unittest import mock
+
+# Django Core
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+# Local App Imports
+from accounts.models import (
+    Communication, CommunicationRecipient, CustomUser, DeliveryAttempt, ParentProfile, PushDevice,
+)
+from accounts.notifications import breaker, channels, providers
+from accounts.synthetic import SchoolGenerator
+
+from .harness import measure, report
+
+# Parents reached by one urgent notice
+PARENTS = 2000
+# Stand-in for a provider API round trip
+LATENCY_MS = 5
+
+
+class DownProvider(providers.FakeProvider):
+    """A provider that is down: every call waits out its latency, then fails."""
+
+    def send(self, message, addresses):
+        super().send(message, addresses)
+        raise providers.ProviderError("Service unavailable")
+
+
+# Measures provider batching; per-domain email limits are benchmarked in test_email_rate_limit
+@override_settings(FAKE_CHANNEL_LATENCY_MS=LATENCY_MS, EMAIL_RATE_LIMIT_ENABLED=False)
+class ChannelBenchmarks(TestCase):
+    """
+    Delivering an urgent notice to 2,000 parents over email/SMS/push through the fake
+    providers (``LATENCY_MS`` per API call): batched provider calls versus one call per
+    recipient, as the old per-address email loop did.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        generator = SchoolGenerator(
+            seed=1, prefix='chan', branches=1, classes=2, arms=2,
+            students_per_arm=PARENTS // 2, children_per_parent=1, communications=0, scheduled=0,
+        )
+        generator.build()
+        rng = random.Random(1)
+        profiles = list(ParentProfile.objects.filter(user__branch=generator.branches[0])[:PARENTS])
+        for n, profile in enumerate(profiles):
+            profile.preferred_contact_method = rng.choice(['phone', 'email', 'sms'])
+            profile.phone_number = f"+23480{n:08d}"
+        ParentProfile.objects.bulk_update(profiles, ['preferred_contact_method', 'phone_number'], batch_size=1000)
+        PushDevice.objects.bulk_create([
+            PushDevice(user_id=profile.user_id, token=f"token-{profile.user_id}")
+            for profile in profiles if profile.preferred_contact_method == 'phone' and rng.random() < 0.5
+        ])
+
+        sender = CustomUser.objects.filter(branch=generator.branches[0], role='branch_admin').first()
+        cls.communication = Communication.objects.create(
+            sender=sender, message_type='announcement', title='School closed', body='Urgent notice', sent=True,
+        )
+        CommunicationRecipient.objects.bulk_create(
+            [CommunicationRecipient(communication=cls.communication, recipient_id=p.user_id) for p in profiles],
+            batch_size=1000,
+        )
+
+    def record(self, name, stats, **extra):
+        stats.update(extra)
+        problems = report.record('channels_2k', name, stats)
+        self.assertFalse(problems, "Performance regression:\n" + "\n".join(problems))
+
+    def reset(self):
+        CommunicationRecipient.objects.filter(communication=self.communication).update(delivered=False)
+        DeliveryAttempt.objects.all().delete()
+        providers.outbox.clear()
+        cache.clear()
+
+    def deliver(self):
+        return channels.deliver(self.communication)
+
+    def test_throughput(self):
+        self.reset()
+        delivered = self.deliver()
+        self.assertEqual(
+            CommunicationRecipient.objects.filter(communication=self.communication, delivered=True).count(), PARENTS,
+        )
+        calls = sum(len(batches) for batches in providers.outbox.values())
+
+        stats = measure(self.deliver, setup=self.reset, repeat=3)
+        self.record('deliver_batched', stats, recipients=PARENTS, provider_calls=calls,
+                    per_second=round(PARENTS / stats['median_ms'] * 1000), **delivered)
+
+        with mock.patch.dict(providers.FakeProvider.BATCH_SIZES, {c: 1 for c in channels.CHANNELS}):
+            stats = measure(self.deliver, setup=self.reset, repeat=1)
+            calls = sum(len(batches) for batches in providers.outbox.values())
+        self.record('deliver_per_recipient', stats, recipients=PARENTS, provider_calls=calls,
+                    per_second=round(PARENTS / stats['median_ms'] * 1000))
+
+    def test_provider_outage(self):
+        """Every provider down: the circuit breaker stops calling after the first failed batches."""
+        down = {channel: 'benchmarks.test_channels.DownProvider' for channel in channels.EXTERNAL_CHANNELS}
+
+        for label, min_calls in (('breaker', breaker.BREAKER_MIN_CALLS), ('no_breaker', PARENTS * 10)):
+            with override_settings(CHANNEL_PROVIDERS=down), \
+                    mock.patch.object(breaker, 'BREAKER_MIN_CALLS', min_calls):
+                stats = measure(self.deliver, setup=self.reset, repeat=1)
+                calls = sum(len(batches) for batches in providers.outbox.values())
+            self.assertEqual(DeliveryAttempt.objects.filter(status='retrying').count(), PARENTS)
+            self.record(f"outage_{label}", stats, recipients=PARENTS, provider_calls=calls)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        report.write()
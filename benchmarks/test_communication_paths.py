@@ -0,0 +1,275 @@
+# Standard Library
+import shutil
+import tempfile
+import unittest
+from datetime import timedelta
+
+# Django Core
+from django.core.signals import request_finished
+from django.db import close_old_connections, connection
+from django.db.models import Count
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+# Local App Imports
+from accounts.archive import archive_communications
+from accounts.audiences import snapshot
+from accounts.forms import CommunicationTargetGroupForm
+from accounts.models import (
+    Communication, CommunicationAttachment, CommunicationRecipient, CustomUser
+)
+from accounts.synthetic import SchoolGenerator
+from accounts.tasks import send_scheduled_communications
+from accounts.utils import send_communication_to_recipients
+
+from .harness import SIZES, measure, report
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='lagooz-bench-media-')
+
+
+class CommunicationBenchmarkMixin:
+    size = None
+
+    @classmethod
+    def setUpClass(cls):
+        if cls.size not in SIZES:
+            raise unittest.SkipTest(f"'{cls.size}' not in BENCH_SIZES")
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        generator = SchoolGenerator.from_size(cls.size, seed=1, prefix='bench')
+        generator.build()
+        cls.audience_size = generator.audience_size
+        cls.anchor = generator.anchor
+        cls.branch = generator.branches[0]
+
+        domain = f"@{generator.domain}"
+        cls.sender = (
+            CustomUser.objects.filter(email__endswith=domain, role='staff')
+            .annotate(n=Count('sent_communications')).order_by('-n').first()
+        )
+        cls.reader = (
+            CustomUser.objects.filter(email__endswith=domain, role='student')
+            .annotate(n=Count('received_communications')).order_by('-n').first()
+        )
+        cls.recipient_entry = CommunicationRecipient.objects.filter(recipient=cls.reader).first()
+        cls.attachment = CommunicationAttachment.objects.filter(
+            communication__sender__email__endswith=domain
+        ).first()
+        cls.audience_ids = list(
+            CustomUser.objects.filter(branch=cls.branch, role='student')
+            .values_list('id', flat=True)[:cls.audience_size]
+        )
+        cls.draft = Communication.objects.create(
+            sender=cls.sender, message_type='announcement', title='Benchmark draft',
+            body='Draft body', is_draft=True,
+            audience=snapshot(cls.sender, cls.audience_ids),
+            saved_filter_data={'id_branch': str(cls.branch.id), 'id_role': 'student'},
+        )
+        cls.admin_user = CustomUser.objects.create_superuser(
+            email=f"bench-admin{domain}", username='bench-admin', password='x', role='superadmin'
+        )
+        cls.scheduled_ids = list(
+            Communication.objects.filter(sender__email__endswith=domain, sent=False, is_draft=False)
+            .values_list('id', flat=True)
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        report.write()
+
+    def bench(self, name, fn, setup=None):
+        stats = measure(fn, setup=setup)
+        problems = report.record(self.size, name, stats)
+        self.assertFalse(problems, "Performance regression:\n" + "\n".join(problems))
+
+    # --- Compose ---
+
+    def test_compose_get(self):
+        self.client.force_login(self.sender)
+        url = reverse('communication_create')
+        self.bench('compose_get', lambda: self.assertEqual(self.client.get(url).status_code, 200))
+
+    def test_compose_edit_draft_get(self):
+        self.client.force_login(self.sender)
+        url = reverse('communication_edit_draft', args=[self.draft.pk])
+        self.bench('compose_edit_draft_get', lambda: self.assertEqual(self.client.get(url).status_code, 200))
+
+    def test_compose_post(self):
+        self.client.force_login(self.sender)
+        url = reverse('communication_create')
+        data = {
+            'message_type': 'announcement',
+            'title': 'Benchmark announcement',
+            'body': 'Benchmark body',
+            'saved_branch': str(self.branch.id),
+            'saved_role': 'student',
+            'selected_recipients': [str(pk) for pk in self.audience_ids],
+            'attachments-TOTAL_FORMS': '0',
+            'attachments-INITIAL_FORMS': '0',
+            'attachments-MIN_NUM_FORMS': '0',
+            'attachments-MAX_NUM_FORMS': '1000',
+        }
+        self.bench('compose_post', lambda: self.assertEqual(self.client.post(url, data).status_code, 302))
+
+    # --- Audience resolution and sending ---
+
+    def test_get_filtered_recipients(self):
+        def run():
+            form = CommunicationTargetGroupForm(
+                data={'branch': self.branch.id, 'role': 'student'}, user=self.sender
+            )
+            self.assertTrue(form.is_valid(), form.errors)
+            list(form.get_filtered_recipients(form.cleaned_data).values_list('id', flat=True))
+
+        self.bench('get_filtered_recipients', run)
+
+    def test_send_communication_to_recipients(self):
+        def run():
+            communication = Communication.objects.create(
+                sender=self.sender, message_type='announcement', title='Benchmark send', body='Body'
+            )
+            send_communication_to_recipients(
+                communication=communication,
+                selected_recipients=CustomUser.objects.filter(id__in=self.audience_ids),
+                manual_emails=[],
+            )
+
+        self.bench('send_communication_to_recipients', run)
+
+    def test_send_scheduled_communications(self):
+        def setup():
+            CommunicationRecipient.objects.filter(communication_id__in=self.scheduled_ids).delete()
+            Communication.objects.filter(id__in=self.scheduled_ids).update(sent=False, sent_at=None, queued_at=None)
+
+        self.bench('send_scheduled_communications', send_scheduled_communications, setup=setup)
+
+    # --- Reading ---
+
+    def test_inbox_view(self):
+        self.client.force_login(self.reader)
+        url = reverse('inbox')
+        self.bench('inbox_view', lambda: self.assertEqual(self.client.get(url).status_code, 200))
+
+    def test_outbox_view(self):
+        self.client.force_login(self.sender)
+        url = reverse('outbox')
+        self.bench('outbox_view', lambda: self.assertEqual(self.client.get(url).status_code, 200))
+
+    def test_read_message(self):
+        self.client.force_login(self.reader)
+        url = reverse('read_message', args=[self.recipient_entry.pk])
+        self.bench('read_message', lambda: self.assertEqual(self.client.get(url).status_code, 200))
+
+    def test_reply_thread(self):
+        communication = Communication.objects.filter(
+            sender__email__endswith=self.sender.email.split('@')[1]
+        ).order_by('-reply_count').first()
+        self.client.force_login(communication.sender)
+
+        url = reverse('read_sent_message', args=[communication.pk])
+        self.bench('read_sent_message', lambda: self.assertEqual(self.client.get(url).status_code, 200))
+        url = reverse('reply_thread', args=[communication.pk]) + '?order=newest&page=2'
+        self.bench('reply_thread', lambda: self.assertEqual(self.client.get(url).status_code, 200))
+
+    def test_download_attachment(self):
+        self.client.force_login(self.reader)
+        url = reverse('download_attachment', args=[self.attachment.pk])
+
+        def run():
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            b''.join(response.streaming_content)
+            # Closing fires request_finished; keep it from closing the test's DB connection,
+            # as the test client does during the request
+            request_finished.disconnect(close_old_connections)
+            try:
+                response.close()
+            finally:
+                request_finished.connect(close_old_connections)
+
+        self.bench('download_attachment', run)
+
+    # --- Sessions ---
+
+    def test_session_store(self):
+        """django_session queries per authenticated page view, DB engine versus cached_db."""
+        urls = [reverse('inbox'), reverse('outbox'), reverse('communication_create')]
+        for engine in ('db', 'cached_db'):
+            with self.settings(SESSION_ENGINE=f'django.contrib.sessions.backends.{engine}'):
+                # SessionMiddleware binds the engine when the handler loads, so start a fresh client
+                self.client = self.client_class()
+                self.client.force_login(self.sender)
+
+                def run():
+                    for url in urls:
+                        self.assertEqual(self.client.get(url).status_code, 200)
+
+                stats = measure(run)
+                with CaptureQueriesContext(connection) as ctx:
+                    run()
+                session_sql = [q['sql'] for q in ctx.captured_queries if 'django_session' in q['sql']]
+                stats['session_reads'] = sum(sql.lstrip().upper().startswith('SELECT') for sql in session_sql)
+                stats['session_writes'] = len(session_sql) - stats['session_reads']
+                stats['page_views'] = len(urls)
+                problems = report.record(self.size, f"session_{engine}", stats)
+                self.assertFalse(problems, "Performance regression:\n" + "\n".join(problems))
+
+    # --- Django admin ---
+
+    def test_admin_changelists(self):
+        self.client.force_login(self.admin_user)
+        urls = {
+            'admin_user_changelist': reverse('admin:accounts_customuser_changelist'),
+            'admin_communication_changelist': reverse('admin:accounts_communication_changelist'),
+            'admin_recipient_changelist': reverse('admin:accounts_communicationrecipient_changelist'),
+            'admin_recipient_changelist_filtered': (
+                reverse('admin:accounts_communicationrecipient_changelist')
+                + f"?communication__id__exact={self.recipient_entry.communication_id}"
+            ),
+            'admin_communication_change': reverse(
+                'admin:accounts_communication_change', args=[self.recipient_entry.communication_id]
+            ),
+        }
+        for name, url in urls.items():
+            self.bench(name, lambda url=url: self.assertEqual(self.client.get(url).status_code, 200))
+
+    # --- Archival ---
+
+    def test_hot_paths_after_archival(self):
+        """Compare with inbox_view/outbox_view: the same pages once history older than 90 days is archived."""
+        result = archive_communications(before=self.anchor - timedelta(days=90))
+        self.assertGreater(result.communications, 0)
+
+        self.client.force_login(self.reader)
+        url = reverse('inbox')
+        self.bench('inbox_view_archived', lambda: self.assertEqual(self.client.get(url).status_code, 200))
+
+        self.client.force_login(self.sender)
+        url = reverse('outbox')
+        self.bench('outbox_view_archived', lambda: self.assertEqual(self.client.get(url).status_code, 200))
+
+        url = reverse('communication_archive')
+        self.bench('archive_view', lambda: self.assertEqual(self.client.get(url).status_code, 200))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class SmallCommunicationBenchmarks(CommunicationBenchmarkMixin, TestCase):
+    size = 'small'
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class MediumCommunicationBenchmarks(CommunicationBenchmarkMixin, TestCase):
+    size = 'medium'
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class LargeCommunicationBenchmarks(CommunicationBenchmarkMixin, TestCase):
+    size = 'large'
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
@@ -0,0 +1,117 @@
+# Standard Library
+import shutil
+import statistics
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+# Django Core
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+# Local App Imports
+from accounts.models import CommunicationRecipient, MessageReply
+from accounts.synthetic import SchoolGenerator
+
+from .harness import SIZES, report
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='lagooz-bench-replies-')
+THREADS = 8
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ConcurrentReplyBenchmarks(TransactionTestCase):
+    """
+    ``submit_reply`` latency with ``THREADS`` clients replying at once, and a
+    double-submit storm (every thread posting the same idempotency key) that must
+    leave exactly one reply.
+
+    Like test_connection_overhead this needs a database other threads can connect
+    to: MySQL, PostgreSQL, or SQLite with a file-backed test database.
+    """
+    size = SIZES[0] if SIZES else None
+
+    @classmethod
+    def setUpClass(cls):
+        if cls.size is None:
+            raise unittest.SkipTest("BENCH_SIZES is empty")
+        super().setUpClass()
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            raise unittest.SkipTest("in-memory SQLite is not shared between threads; use a file test database")
+
+    def setUp(self):
+        generator = SchoolGenerator.from_size(self.size, seed=1, prefix='bench')
+        generator.build()
+        self.entries = list(
+            CommunicationRecipient.objects.filter(
+                communication__sender__email__endswith=f"@{generator.domain}",
+                requires_response=True, has_responded=False, deleted=False, recipient__isnull=False,
+            ).select_related('recipient')[:THREADS * 4]
+        )
+
+    @staticmethod
+    def post_reply(entry, key, client=None):
+        if client is None:
+            client = Client()
+            client.force_login(entry.recipient)
+        data = {
+            'reply': 'Concurrent reply', 'idempotency_key': key,
+            'attachments-TOTAL_FORMS': '1', 'attachments-INITIAL_FORMS': '0',
+            'attachments-0-file': SimpleUploadedFile('reply.txt', b'Reply attachment'),
+        }
+        start = time.perf_counter()
+        response = client.post(reverse('submit_reply', args=[entry.pk]), data, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        elapsed = (time.perf_counter() - start) * 1000
+        connections.close_all()
+        return response.status_code, elapsed
+
+    def run_concurrently(self, jobs):
+        with ThreadPoolExecutor(max_workers=THREADS) as pool:
+            return list(pool.map(lambda job: self.post_reply(*job), jobs))
+
+    @staticmethod
+    def summarize(timings, queries):
+        timings = sorted(timings)
+        return {
+            'median_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(timings[int(len(timings) * 0.95) - 1], 3),
+            'max_ms': round(timings[-1], 3),
+            'queries': queries,
+            'requests': len(timings),
+            'threads': THREADS,
+        }
+
+    def test_concurrent_replies(self):
+        self.assertGreater(len(self.entries), THREADS, "dataset has too few entries awaiting a reply")
+        first, rest = self.entries[0], self.entries[1:]
+
+        # Queries for one uncontended reply, for the regression check
+        client = Client()
+        client.force_login(first.recipient)
+        with CaptureQueriesContext(connection) as ctx:
+            self.post_reply(first, 'single', client)
+        queries = len(ctx.captured_queries)
+
+        results = self.run_concurrently([(entry, f'distinct-{entry.pk}') for entry in rest])
+        self.assertEqual({status for status, _ in results}, {201})
+        problems = report.record(self.size, 'submit_reply_concurrent', self.summarize([t for _, t in results], queries))
+        self.assertFalse(problems, "Performance regression:\n" + "\n".join(problems))
+
+        target = rest[0]
+        results = self.run_concurrently([(target, 'double-submit')] * (THREADS * 2))
+        self.assertTrue({status for status, _ in results} <= {200, 201})
+        self.assertEqual(MessageReply.objects.filter(recipient_entry=target, idempotency_key='double-submit').count(), 1)
+        report.record(self.size, 'submit_reply_duplicate_storm', self.summarize([t for _, t in results], queries))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        report.write()
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
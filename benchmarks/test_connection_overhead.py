@@ -0,0 +1,88 @@
+# Standard Library
+import shutil
+import tempfile
+import unittest
+
+# Django Core
+from django.db import connection
+from django.db.models import Count
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+# Local App Imports
+from accounts.models import Communication, CommunicationRecipient, CustomUser
+from accounts.synthetic import SchoolGenerator
+from accounts.tasks import send_scheduled_communications
+
+from .harness import SIZES, measure, report
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='lagooz-bench-conn-')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ConnectionOverheadBenchmarks(TransactionTestCase):
+    """
+    Time the hot paths with a reused connection versus a fresh connection per call,
+    i.e. CONN_MAX_AGE > 0 versus CONN_MAX_AGE = 0.
+
+    Needs a database that can actually reconnect: MySQL, PostgreSQL, or SQLite with a
+    file-backed test database (``DATABASES['default']['TEST']['NAME']``). Runs at the
+    first size in BENCH_SIZES.
+    """
+    size = SIZES[0] if SIZES else None
+
+    @classmethod
+    def setUpClass(cls):
+        if cls.size is None:
+            raise unittest.SkipTest("BENCH_SIZES is empty")
+        super().setUpClass()
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            raise unittest.SkipTest("in-memory SQLite cannot reconnect; use a file test database")
+
+    def setUp(self):
+        generator = SchoolGenerator.from_size(self.size, seed=1, prefix='bench')
+        generator.build()
+        domain = f"@{generator.domain}"
+        self.reader = (
+            CustomUser.objects.filter(email__endswith=domain, role='student')
+            .annotate(n=Count('received_communications')).order_by('-n').first()
+        )
+        self.scheduled_ids = list(
+            Communication.objects.filter(sender__email__endswith=domain, sent=False, is_draft=False)
+            .values_list('id', flat=True)
+        )
+
+    def bench_both(self, name, fn, setup=None):
+        def fresh():
+            connection.close()
+            fn()
+
+        for label, call in (('reused_connection', fn), ('new_connection', fresh)):
+            problems = report.record(self.size, f"{name}_{label}", measure(call, setup=setup))
+            self.assertFalse(problems, "Performance regression:\n" + "\n".join(problems))
+
+    def test_connection_overhead(self):
+        def connect():
+            connection.close()
+            connection.ensure_connection()
+
+        report.record(self.size, 'db_connect', measure(connect))
+
+        self.client.force_login(self.reader)
+        url = reverse('inbox')
+        self.bench_both('inbox_view', lambda: self.assertEqual(self.client.get(url).status_code, 200))
+
+        def reset_scheduled():
+            CommunicationRecipient.objects.filter(communication_id__in=self.scheduled_ids).delete()
+            Communication.objects.filter(id__in=self.scheduled_ids).update(sent=False, sent_at=None)
+
+        self.bench_both('send_scheduled_communications', send_scheduled_communications, setup=reset_scheduled)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        report.write()
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
@@ -0,0 +1,111 @@
+# Standard Library
+import random
+from datetime import datetime, timedelta
+from unittest import mock
+
+# Django Core
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+# Local App Imports
+from accounts.models import Communication, CommunicationRecipient, CustomUser, ParentProfile
+from accounts.notifications import digests, providers, ratelimit
+from accounts.synthetic import SchoolGenerator
+
+from .harness import measure, report
+
+PARENTS = 1000
+# Posts and news sent during the week, each to a share of the parents (one class's worth)
+MESSAGES = 40
+REACH = 0.3
+
+
+@override_settings(EMAIL_RATE_LIMIT_ENABLED=False)
+class DigestBenchmarks(TestCase):
+    """
+    A week of class posts and news for 1,000 parents on weekly digests: one email per
+    parent assembled in a single pass, versus one email per message and parent.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        generator = SchoolGenerator(
+            seed=1, prefix='digest', branches=1, classes=2, arms=2,
+            students_per_arm=PARENTS // 4, children_per_parent=1, communications=0, scheduled=0,
+        )
+        generator.build()
+        cls.domain = generator.domain
+        branch = generator.branches[0]
+        ParentProfile.objects.filter(user__branch=branch).update(digest_frequency='weekly')
+        parents = list(CustomUser.objects.filter(branch=branch, role='parent').values_list('id', flat=True))
+        sender = CustomUser.objects.filter(branch=branch, role='branch_admin').first()
+
+        rng = random.Random(1)
+        now = timezone.now()
+        rows = []
+        for n in range(MESSAGES):
+            communication = Communication.objects.create(
+                sender=sender, message_type=rng.choice(['post', 'news']), title=f"Class update {n}",
+                body="Reminder about this week's activities. " * 8, sent=True,
+                sent_at=now - timedelta(hours=rng.randint(1, 24 * 6)),
+            )
+            rows.extend(
+                CommunicationRecipient(communication=communication, recipient_id=pk, delivered=True)
+                for pk in rng.sample(parents, int(len(parents) * REACH))
+            )
+        CommunicationRecipient.objects.bulk_create(rows, batch_size=2000)
+        cls.rows = len(rows)
+
+    def record(self, name, stats, **extra):
+        stats.update(extra)
+        problems = report.record('digests_1k', name, stats)
+        self.assertFalse(problems, "Performance regression:\n" + "\n".join(problems))
+
+    def reset(self):
+        CommunicationRecipient.objects.update(digested_at=None)
+        providers.outbox.clear()
+
+    def test_weekly_digest(self):
+        self.reset()
+        counts = digests.send_digests('weekly')
+        self.assertEqual(counts['items'], self.rows)
+        self.assertFalse(CommunicationRecipient.objects.filter(digested_at__isnull=True).exists())
+        # A second run finds nothing new
+        self.assertEqual(digests.send_digests('weekly')['digests'], 0)
+
+        stats = measure(lambda: digests.send_digests('weekly'), setup=self.reset, repeat=3)
+        emails = sum(len(addresses) for _, addresses in providers.outbox['email'])
+        self.record(
+            'send_weekly', stats, parents=PARENTS, messages=MESSAGES, emails=emails,
+            emails_without_digest=self.rows, provider_calls=len(providers.outbox['email']),
+        )
+
+    def test_rate_limited_digests_follow_up(self):
+        # A burst of 100 and no waiting: the rest go to follow-up runs, not a sleep
+        self.reset()
+        ratelimit._buckets = None
+        follow_ups = []
+        now = timezone.now()
+        rates = {self.domain: (1, 100)}
+        with override_settings(EMAIL_RATE_LIMIT_ENABLED=True, EMAIL_RATE_LIMIT_MAX_WAIT=0, EMAIL_DOMAIN_RATES=rates), \
+                mock.patch('accounts.tasks.send_digests.apply_async', lambda args, countdown: follow_ups.append((args, countdown))):
+            counts = digests.send_digests('weekly', now)
+        ratelimit._buckets = None
+
+        self.assertEqual(counts['digests'], 100)
+        self.assertEqual(counts['digests'] + counts['deferred'], PARENTS)
+        self.assertEqual(counts['follow_ups'], len(follow_ups))
+        self.assertGreater(min(countdown for _, countdown in follow_ups), 0)
+        sent = {address for _, addresses in providers.outbox['email'] for address in addresses}
+        for (frequency, run_at, only), _ in follow_ups:
+            self.assertFalse(sent & set(only))
+            digests.send_digests(frequency, datetime.fromisoformat(run_at), only)
+        emails = [address for _, addresses in providers.outbox['email'] for address in addresses]
+        self.assertEqual(len(emails), PARENTS)
+        self.assertEqual(len(set(emails)), PARENTS)
+        self.assertFalse(CommunicationRecipient.objects.filter(digested_at__isnull=True).exists())
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        report.write()
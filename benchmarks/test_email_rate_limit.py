@@ -0,0 +1,184 @@
+# Standard Library
+import random
+import time
+
+# Django Core
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+# Local App Imports
+from accounts.models import Communication, CommunicationRecipient, CustomUser, DeliveryAttempt
+from accounts.notifications import channels, providers, ratelimit, retries
+from accounts.synthetic import SchoolGenerator
+
+from .harness import measure, report
+
+# Manual email addresses reached by one notice
+ADDRESSES = 3000
+# Share of the addresses per mailbox provider; the rest spread over small domains
+DOMAINS = {'gmail.com': 0.5, 'yahoo.com': 0.25, 'outlook.com': 0.15}
+SMALL_DOMAINS = 30
+# (messages per second, burst) we allow, and the burst each provider accepts
+RATES = {'gmail.com': (20, 100), 'yahoo.com': (5, 20), 'outlook.com': (10, 50)}
+DEFAULT_RATE = (5, 20)
+# The drain test runs ten times faster so it takes seconds, not minutes
+DRAIN_SPEEDUP = 10
+
+
+class ThrottlingProvider(providers.FakeProvider):
+    """A mail server that rejects a domain's messages once its own token bucket is empty."""
+
+    server = ratelimit.LocalBuckets()
+    speedup = 1
+
+    def send(self, message, addresses):
+        super().send(message, addresses)
+        accepted = []
+        for address in addresses:
+            domain = ratelimit.domain_of(address)
+            rate, burst = RATES.get(domain, DEFAULT_RATE)
+            # Sped up, a few ms between our bucket and the server's is worth a token or two
+            granted, _ = self.server.take(domain, 1, rate * self.speedup, burst + self.speedup - 1)
+            if granted:
+                accepted.append(address)
+        return accepted
+
+
+@override_settings(
+    EMAIL_DOMAIN_RATES=RATES, EMAIL_DEFAULT_DOMAIN_RATE=DEFAULT_RATE, EMAIL_RATE_LIMIT_REDIS_URL='',
+    CHANNEL_PROVIDERS={
+        **{channel: 'accounts.notifications.providers.FakeProvider' for channel in channels.CHANNELS},
+        'email': 'benchmarks.test_email_rate_limit.ThrottlingProvider',
+    },
+)
+class EmailRateLimitBenchmarks(TestCase):
+    """
+    One notice to 3,000 manual addresses, half of them on one provider, against mail
+    servers that reject a domain's messages past its burst. Without limits the excess
+    bounces and spends a retry; with per-domain token buckets it waits its turn.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        generator = SchoolGenerator(
+            seed=1, prefix='mailrate', branches=1, classes=1, arms=1, students_per_arm=1,
+            communications=0, scheduled=0,
+        )
+        generator.build()
+        rng = random.Random(1)
+        domains = list(DOMAINS) + [f"school{n}.ng" for n in range(SMALL_DOMAINS)]
+        weights = list(DOMAINS.values()) + [(1 - sum(DOMAINS.values())) / SMALL_DOMAINS] * SMALL_DOMAINS
+        addresses = [f"guardian{n}@{rng.choices(domains, weights)[0]}" for n in range(ADDRESSES)]
+
+        sender = CustomUser.objects.filter(branch=generator.branches[0], role='branch_admin').first()
+        cls.communication = Communication.objects.create(
+            sender=sender, message_type='notification', title='Fees reminder', body='Please pay', sent=True,
+            manual_emails=addresses,
+        )
+        CommunicationRecipient.objects.bulk_create(
+            [CommunicationRecipient(communication=cls.communication, email=address) for address in addresses],
+            batch_size=1000,
+        )
+
+    def record(self, name, stats, **extra):
+        stats.update(extra)
+        problems = report.record('email_rate_limit', name, stats)
+        self.assertFalse(problems, "Performance regression:\n" + "\n".join(problems))
+
+    def reset(self):
+        CommunicationRecipient.objects.filter(communication=self.communication).update(delivered=False)
+        DeliveryAttempt.objects.all().delete()
+        providers.outbox.clear()
+        ThrottlingProvider.server.reset()
+        ratelimit._buckets = None
+        cache.clear()
+
+    def deliver(self):
+        return channels.deliver(self.communication)
+
+    def deliver_and_defer(self):
+        self.reset()
+        started = time.monotonic()
+        self.deliver()
+        # The send took each domain's burst and deferred the rest without waiting
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertTrue(DeliveryAttempt.objects.filter(attempts=0).exists())
+        DeliveryAttempt.objects.update(next_attempt_at=timezone.now())
+
+    def retry_tick(self):
+        return retries.retry_due(limit=ADDRESSES)
+
+    def outcome(self):
+        attempts = DeliveryAttempt.objects.filter(communication=self.communication)
+        deferred = list(attempts.filter(attempts=0).values_list('next_attempt_at', flat=True))
+        first_batch = providers.outbox['email'][0][1]
+        return {
+            'sent_now': CommunicationRecipient.objects.filter(communication=self.communication, delivered=True).count(),
+            'rejected': attempts.filter(attempts__gt=0).count(),
+            'deferred': len(deferred),
+            'drain_seconds': round((max(deferred) - timezone.now()).total_seconds()) if deferred else 0,
+            'provider_calls': len(providers.outbox['email']),
+            'domains_in_first_batch': len({ratelimit.domain_of(address) for address in first_batch}),
+        }
+
+    def test_domain_limits(self):
+        # The send never waits for tokens: what is over the limit is deferred at once
+        for label, enabled in (('no_limit', False), ('domain_limit', True)):
+            with override_settings(EMAIL_RATE_LIMIT_ENABLED=enabled):
+                stats = measure(self.deliver, setup=self.reset, repeat=3)
+                outcome = self.outcome()
+            self.assertEqual(outcome['sent_now'] + outcome['rejected'] + outcome['deferred'], ADDRESSES)
+            if enabled:
+                self.assertEqual(outcome['rejected'], 0)
+            self.record(f"deliver_{label}", stats, addresses=ADDRESSES, **outcome)
+
+        # A retry tick sends what the buckets allow by then and defers the rest again
+        DeliveryAttempt.objects.update(next_attempt_at=timezone.now())
+        with override_settings(EMAIL_RATE_LIMIT_MAX_WAIT=0):
+            counts = retries.retry_due(limit=ADDRESSES)
+        self.assertEqual(counts.get('sent', 0) + counts.get('retrying', 0), outcome['deferred'])
+        self.assertFalse(DeliveryAttempt.objects.filter(attempts__gt=0).exists())
+
+    def test_drain_time(self):
+        """
+        Wall-clock time of the retry tick that drains a send's deferred addresses,
+        against the slowest domain's rate: the tick paces the domains in process
+        instead of sending a burst per tick.
+        """
+        rates = {domain: (rate * DRAIN_SPEEDUP, burst) for domain, (rate, burst) in RATES.items()}
+        default_rate = (DEFAULT_RATE[0] * DRAIN_SPEEDUP, DEFAULT_RATE[1])
+        addresses = CommunicationRecipient.objects.filter(communication=self.communication).values_list('email', flat=True)
+        per_domain = {}
+        for address in addresses:
+            domain = ratelimit.domain_of(address)
+            per_domain[domain] = per_domain.get(domain, 0) + 1
+        # The bucket's burst goes at once, the rest at the domain's rate
+        expected = max(
+            (n - rates.get(domain, default_rate)[1]) / rates.get(domain, default_rate)[0]
+            for domain, n in per_domain.items()
+        )
+
+        ThrottlingProvider.speedup = DRAIN_SPEEDUP
+        try:
+            with override_settings(EMAIL_DOMAIN_RATES=rates, EMAIL_DEFAULT_DOMAIN_RATE=default_rate,
+                                   EMAIL_RATE_LIMIT_MAX_WAIT=expected * 2):
+                stats = measure(self.retry_tick, setup=self.deliver_and_defer, repeat=1)
+        finally:
+            ThrottlingProvider.speedup = 1
+        drain_seconds = stats['median_ms'] / 1000
+
+        delivered = CommunicationRecipient.objects.filter(communication=self.communication, delivered=True).count()
+        self.assertEqual(delivered, ADDRESSES)
+        self.assertFalse(DeliveryAttempt.objects.exclude(status='sent').exists())
+        # Close to what the rate allows: a refill is lost while a batch is being sent
+        self.assertLess(drain_seconds, expected * 1.25 + 1)
+        self.record(
+            'drain_paced', stats, addresses=ADDRESSES, drain_seconds=round(drain_seconds, 1),
+            expected_seconds=round(expected, 1), speedup=DRAIN_SPEEDUP,
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        report.write()
@@ -0,0 +1,60 @@
+# Standard Library
+import random
+
+# Django Core
+from django.db import OperationalError
+from django.test import TestCase
+
+# Local App Imports
+from accounts.id_joins import id_join
+from accounts.models import CustomUser
+
+from .harness import measure, report
+
+USERS = 100_000
+SET_SIZES = (1_000, 10_000, 100_000)
+
+
+class IdJoinBenchmarks(TestCase):
+    """
+    Filtering a 100k-row user table by 1k/10k/100k IDs: a plain ``IN`` list versus
+    the temporary-table and chunked-``VALUES`` strategies of ``accounts.id_joins``.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        CustomUser.objects.bulk_create(
+            [
+                CustomUser(email=f"idjoin{n}@bench.test", username=f"idjoin{n}", role='student', password='!')
+                for n in range(USERS)
+            ],
+            batch_size=5000,
+        )
+        cls.user_ids = list(CustomUser.objects.values_list('id', flat=True))
+
+    def test_strategies(self):
+        rng = random.Random(1)
+        qs = CustomUser.objects.all()
+
+        for size in SET_SIZES:
+            ids = rng.sample(self.user_ids, size)
+            key = f"idjoin{size // 1000}k"
+
+            def run(strategy):
+                with id_join(ids, strategy=strategy) as joined:
+                    return len(qs.filter(id__in=joined).values_list('id', flat=True))
+
+            for strategy in ('temp_table', 'values'):
+                self.assertEqual(run(strategy), size)
+                problems = report.record(key, f"users_{strategy}", measure(lambda: run(strategy)))
+                self.assertFalse(problems, "Performance regression:\n" + "\n".join(problems))
+            try:
+                report.record(key, 'users_in_list', measure(lambda: run('in')))
+            except OperationalError as e:
+                # e.g. SQLite's "too many SQL variables"
+                report.record(key, 'users_in_list', {'error': str(e), 'queries': 0, 'median_ms': 0})
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        report.write()
@@ -0,0 +1,82 @@
+# Django Core
+from django.template import Context, Engine
+from django.test import TestCase
+
+# Local App Imports
+from accounts import merge_fields
+from accounts.models import Communication, CustomUser
+from accounts.synthetic import SchoolGenerator
+
+from .harness import measure, report
+
+# Students, and as many parents (one child each)
+STUDENTS = 5000
+# Recipients rendered one query set at a time, as reading the inbox does
+PER_RECIPIENT = 500
+
+BODY = (
+    "Dear {{ parent_name }},\n\n{{ student_name }}'s results for {{ class_name }} are now available "
+    "on the portal. Please contact {{ branch_name }} with any questions.\n\nRegards"
+)
+
+
+class MergeFieldBenchmarks(TestCase):
+    """
+    Rendering a personalised notice for 10,000 students and parents: merge fields
+    compiled once to a format string with variables prefetched in bulk, versus Django's
+    template engine over the same variables, versus fetching each recipient's values
+    on their own.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        generator = SchoolGenerator(
+            seed=1, prefix='merge', branches=1, classes=2, arms=2,
+            students_per_arm=STUDENTS // 4, children_per_parent=1, communications=0, scheduled=0,
+        )
+        generator.build()
+        branch = generator.branches[0]
+        cls.users = CustomUser.objects.filter(branch=branch, role__in=['student', 'parent'])
+        cls.recipients = cls.users.count()
+        sender = CustomUser.objects.filter(branch=branch, role='branch_admin').first()
+        cls.communication = Communication.objects.create(
+            sender=sender, message_type='notification', title='Results', body=BODY, sent=True,
+        )
+
+    def record(self, name, stats, **extra):
+        stats.update(extra)
+        problems = report.record('merge_fields_10k', name, stats)
+        self.assertFalse(problems, "Performance regression:\n" + "\n".join(problems))
+
+    def test_render(self):
+        bodies = merge_fields.render_many(self.communication, self.users)
+        self.assertEqual(len(bodies), self.recipients)
+        self.assertFalse(any('{{' in body for body in bodies.values()))
+
+        stats = measure(lambda: merge_fields.render_many(self.communication, self.users), repeat=3)
+        self.record('render_bulk', stats, recipients=self.recipients,
+                    per_second=round(self.recipients / stats['median_ms'] * 1000))
+
+        values = merge_fields.variables(self.users)
+        compiled = merge_fields.compile_body(BODY)
+        stats = measure(lambda: [compiled.render(v) for v in values.values()], repeat=3)
+        self.record('render_only_format_map', stats, recipients=self.recipients,
+                    per_second=round(self.recipients / stats['median_ms'] * 1000))
+
+        template = Engine(autoescape=False).from_string(BODY)
+        stats = measure(lambda: [template.render(Context(v)) for v in values.values()], repeat=3)
+        self.record('render_only_django_template', stats, recipients=self.recipients,
+                    per_second=round(self.recipients / stats['median_ms'] * 1000))
+
+        def per_recipient():
+            for user in self.users.order_by('id')[:PER_RECIPIENT]:
+                merge_fields.render_for(self.communication, user)
+
+        stats = measure(per_recipient, repeat=1)
+        self.record('render_per_recipient', stats, recipients=PER_RECIPIENT,
+                    per_second=round(PER_RECIPIENT / stats['median_ms'] * 1000))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        report.write()
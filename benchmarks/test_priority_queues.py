@@ -0,0 +1,87 @@
+# Standard Library
+from datetime import timedelta
+
+# Django Core
+from django.test import TestCase
+from django.utils import timezone
+
+# Local App Imports
+from accounts import queues
+from accounts.audiences import snapshot
+from accounts.models import Communication, CommunicationRecipient, CustomUser
+from accounts.synthetic import SchoolGenerator
+from accounts.tasks import send_communication
+
+from .harness import measure, report
+
+# Students reached by the bulk announcement
+STUDENTS = 5000
+
+
+class PriorityQueueBenchmarks(TestCase):
+    """
+    How long an urgent personal message waits when a 5,000-recipient announcement fell
+    due just before it. With one queue the worker sends them in due order, so the
+    urgent message is done only after the fan-out; with priority queues it is sent by
+    the urgent worker while the bulk worker is busy. Both run in-process, so the numbers
+    are the send times each layout puts in front of the urgent message, without broker
+    overhead.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        generator = SchoolGenerator(
+            seed=1, prefix='prio', branches=1, classes=2, arms=2,
+            students_per_arm=STUDENTS // 4, communications=0, scheduled=0,
+        )
+        generator.build()
+        branch = generator.branches[0]
+        sender = CustomUser.objects.filter(branch=branch, role='branch_admin').first()
+        students = list(CustomUser.objects.filter(branch=branch, role='student').values_list('id', flat=True))
+        parent = CustomUser.objects.filter(branch=branch, role='parent').first()
+
+        now = timezone.now()
+        cls.bulk = Communication.objects.create(
+            sender=sender, message_type='announcement', title='Term newsletter', body='Newsletter',
+            scheduled_time=now - timedelta(minutes=2), audience=snapshot(sender, students),
+        )
+        cls.urgent = Communication.objects.create(
+            sender=sender, message_type='personal', title='Your child is unwell', body='Please call',
+            scheduled_time=now - timedelta(minutes=1), audience=snapshot(sender, [parent.id]),
+        )
+
+    def record(self, name, stats, **extra):
+        stats.update(extra)
+        problems = report.record('priority_queues', name, stats)
+        self.assertFalse(problems, "Performance regression:\n" + "\n".join(problems))
+
+    def reset(self):
+        ids = [self.bulk.pk, self.urgent.pk]
+        CommunicationRecipient.objects.filter(communication_id__in=ids).delete()
+        Communication.objects.filter(id__in=ids).update(sent=False, sent_at=None, queued_at=None)
+
+    def test_routing(self):
+        self.assertEqual(queues.queue_for(self.bulk), queues.BULK_QUEUE)
+        self.assertEqual(queues.queue_for(self.urgent), queues.URGENT_QUEUE)
+
+    def test_urgent_latency(self):
+        def single_queue():
+            # Due order: the announcement first
+            send_communication(self.bulk.pk)
+            send_communication(self.urgent.pk)
+
+        def urgent_queue():
+            send_communication(self.urgent.pk)
+
+        stats = measure(single_queue, setup=self.reset, repeat=3)
+        self.assertTrue(Communication.objects.get(pk=self.urgent.pk).sent)
+        self.record('urgent_behind_bulk_single_queue', stats, bulk_recipients=STUDENTS)
+
+        stats = measure(urgent_queue, setup=self.reset, repeat=3)
+        self.assertTrue(Communication.objects.get(pk=self.urgent.pk).sent)
+        self.record('urgent_own_queue', stats, bulk_recipients=STUDENTS)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        report.write()
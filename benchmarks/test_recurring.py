@@ -0,0 +1,134 @@
+# Standard Library
+import random
+from datetime import timedelta
+
+# Django Core
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+# Local App Imports
+from accounts import recurrence, targeting, tasks
+from accounts.audiences import snapshot
+from accounts.models import Communication, CustomUser, RecurringCommunication
+from accounts.notifications import providers
+from accounts.synthetic import SchoolGenerator
+
+from .harness import measure, report
+
+SCHEDULES = 5000
+# Schedules due on a given beat tick
+DUE = 20
+RULES = [
+    '0 7 * * 1-5',
+    '30 15 * * 5',
+    '0 8 1 * *',
+    'FREQ=WEEKLY;BYDAY=MO;BYHOUR=9;BYMINUTE=0',
+    'FREQ=DAILY;BYHOUR=16;BYMINUTE=30',
+]
+
+
+@override_settings(EMAIL_RATE_LIMIT_ENABLED=False)
+class RecurringBenchmarks(TestCase):
+    """
+    A beat tick over 5,000 recurring messages, 20 of them due: the indexed range query
+    on ``next_run_at`` versus computing every schedule's next occurrence from its rule,
+    and the cost of creating and sending the due occurrences.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        generator = SchoolGenerator(
+            seed=1, prefix='recur', branches=1, classes=1, arms=1,
+            students_per_arm=20, children_per_parent=1, communications=0, scheduled=0,
+        )
+        generator.build()
+        branch = generator.branches[0]
+        sender = CustomUser.objects.filter(branch=branch, role='branch_admin').first()
+        parents = list(CustomUser.objects.filter(branch=branch, role='parent').values_list('id', flat=True))
+        audience = snapshot(sender, parents)
+
+        rng = random.Random(1)
+        templates = Communication.objects.bulk_create([
+            Communication(
+                sender=sender, message_type='notification', title=f"Reminder {n}",
+                body="Fees are due this week.", audience=audience,
+            )
+            for n in range(SCHEDULES)
+        ], batch_size=1000)
+        now = timezone.now()
+        schedules = []
+        for template in templates:
+            rule = rng.choice(RULES)
+            schedules.append(RecurringCommunication(
+                template=template, rule=rule, starts_at=now - timedelta(days=30),
+                last_run_at=now - timedelta(days=1),
+                next_run_at=recurrence.next_occurrence(rule, now, now),
+            ))
+        RecurringCommunication.objects.bulk_create(schedules, batch_size=1000)
+        cls.due_ids = [schedule.pk for schedule in rng.sample(schedules, DUE)]
+        cls.recipients = len(parents)
+        cls.branch, cls.sender, cls.parents = branch, sender, parents
+
+    def record(self, name, stats, **extra):
+        stats.update(extra)
+        problems = report.record('recurring_5k', name, stats)
+        self.assertFalse(problems, "Performance regression:\n" + "\n".join(problems))
+
+    def reset(self):
+        Communication.objects.filter(recurrence__isnull=True, title__startswith='Reminder').delete()
+        RecurringCommunication.objects.filter(pk__in=self.due_ids).update(
+            next_run_at=timezone.now() - timedelta(minutes=1), occurrences=0,
+        )
+        providers.outbox.clear()
+
+    def test_find_due(self):
+        self.reset()
+        now = timezone.now()
+
+        def indexed():
+            return list(RecurringCommunication.objects.filter(active=True, next_run_at__lte=now).values_list('id', flat=True))
+
+        def scan():
+            # Without a stored next run: every schedule's rule, from its last run
+            return [
+                pk for pk, rule, starts_at, ends_at, last_run_at in RecurringCommunication.objects.filter(
+                    active=True,
+                ).values_list('id', 'rule', 'starts_at', 'ends_at', 'last_run_at')
+                if (recurrence.next_occurrence(rule, last_run_at, starts_at, ends_at) or now) < now
+            ]
+
+        self.assertEqual(sorted(indexed()), sorted(self.due_ids))
+        stats = measure(indexed, repeat=5)
+        self.record('find_due_indexed', stats, schedules=SCHEDULES, due=DUE)
+        stats = measure(scan, repeat=1)
+        self.record('find_due_scan_rules', stats, schedules=SCHEDULES)
+
+    def test_dispatch(self):
+        self.reset()
+        self.assertEqual(tasks.send_recurring_communications(), DUE)
+        # Each due schedule moved on and sent once; a second tick finds nothing
+        self.assertEqual(tasks.send_recurring_communications(), 0)
+        self.assertEqual(
+            Communication.objects.filter(recurrence__isnull=True, title__startswith='Reminder', sent=True).count(), DUE,
+        )
+
+        stats = measure(tasks.send_recurring_communications, setup=self.reset, repeat=3)
+        self.record('dispatch_due', stats, due=DUE, recipients_each=self.recipients)
+
+    def test_occurrence_keeps_extra_recipients(self):
+        # The branch's parents as a group, plus a teacher ticked by hand
+        teacher = CustomUser.objects.filter(branch=self.branch, role='staff').first()
+        template = Communication.objects.create(
+            sender=self.sender, message_type='notification', title='Parents and one teacher', body='Body',
+        )
+        targeting.save_groups(template, [targeting.clean_spec({'branch': self.branch.pk, 'role': 'parent'})])
+        schedule = RecurringCommunication.objects.create(
+            template=template, rule=RULES[0], extra_audience=snapshot(self.sender, [teacher.pk]),
+        )
+        occurrence = recurrence.instantiate(schedule, timezone.now())
+        self.assertEqual(sorted(occurrence.audience.member_ids()), sorted(self.parents + [teacher.pk]))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        report.write()
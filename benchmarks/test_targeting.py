@@ -0,0 +1,144 @@
+# Standard Library
+import shutil
+import tempfile
+import unittest
+
+# Django Core
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+# Local App Imports
+from accounts import targeting
+from accounts.models import CustomUser, StaffProfile, StudentProfile
+from accounts.synthetic import SchoolGenerator
+
+from .harness import SIZES, measure, report
+
+# Students in the "guardians of" benchmark school (one branch, 6 classes x 4 arms)
+GUARDIAN_STUDENTS = 20_160
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='lagooz-bench-media-')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class TargetingBenchmarks(TestCase):
+    """
+    Resolving a multi-group audience ("JSS1 parents + JSS1 class teachers + every
+    branch admin of another branch"): one ORed ``SELECT`` (accounts.targeting) versus
+    resolving each group separately and taking the union of the IDs in Python.
+    """
+    size = SIZES[0] if SIZES else None
+
+    @classmethod
+    def setUpClass(cls):
+        if cls.size is None:
+            raise unittest.SkipTest("BENCH_SIZES is empty")
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        generator = SchoolGenerator.from_size(cls.size, seed=1, prefix='bench')
+        generator.build()
+        branch, other = generator.branches[0], generator.branches[-1]
+        cls.sender = CustomUser.objects.filter(branch=branch, role='branch_admin').first()
+        student_class = StudentProfile.objects.filter(user__branch=branch).exclude(current_class=None).first().current_class
+        StaffProfile.objects.filter(user__branch=branch, user__role='staff').update(managing_class=student_class)
+        cls.specs = [
+            targeting.clean_spec(spec) for spec in (
+                {'branch': branch, 'role': 'parent', 'student_class': student_class},
+                {'branch': branch, 'role': 'staff', 'student_class': student_class},
+                {'branch': other, 'role': 'branch_admin'},
+                {'branch': branch, 'role': 'student', 'student_class': student_class},
+            )
+        ]
+
+    def record(self, name, stats, **extra):
+        stats.update(extra)
+        problems = report.record(f"{self.size}_targeting", name, stats)
+        self.assertFalse(problems, "Performance regression:\n" + "\n".join(problems))
+
+    def union_in_sql(self):
+        return list(targeting.audience(self.specs, sender=self.sender).values_list('id', flat=True))
+
+    def union_in_python(self):
+        ids = set()
+        for spec in self.specs:
+            ids.update(targeting.audience([spec], sender=self.sender).values_list('id', flat=True))
+        return list(ids)
+
+    def test_union(self):
+        expected = self.union_in_python()
+        self.assertCountEqual(self.union_in_sql(), expected)
+        self.assertEqual(len(set(self.union_in_sql())), len(self.union_in_sql()))
+
+        self.record('union_python', measure(self.union_in_python), recipients=len(expected), groups=len(self.specs))
+        self.record('union_sql', measure(self.union_in_sql), recipients=len(expected), groups=len(self.specs))
+
+    def test_group_sizes(self):
+        self.record('group_sizes_uncached', measure(
+            lambda: [targeting.group_size(spec) for spec in self.specs], setup=cache.clear,
+        ))
+        self.record('group_sizes_cached', measure(lambda: [targeting.group_size(spec) for spec in self.specs]))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        report.write()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class GuardianBenchmarks(TestCase):
+    """
+    Live size preview of a "guardians of" group at 20k students: the single
+    ``StudentProfile`` -> ``ParentProfile`` subquery of accounts.targeting versus
+    fetching the students' parents and de-duplicating them in Python.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        generator = SchoolGenerator(
+            seed=1, prefix='guard', branches=1, classes=6, arms=4,
+            students_per_arm=GUARDIAN_STUDENTS // 24, children_per_parent=2,
+            communications=0, scheduled=0,
+        )
+        generator.build()
+        branch = generator.branches[0]
+        student_class = generator.classes[0]
+        cls.specs = {
+            'branch': targeting.clean_spec({'branch': branch, 'role': 'student', 'guardians': 'only'}),
+            'class': targeting.clean_spec({
+                'branch': branch, 'role': 'student', 'student_class': student_class, 'guardians': 'only',
+            }),
+        }
+
+    def record(self, name, stats, **extra):
+        stats.update(extra)
+        problems = report.record('guardians_20k', name, stats)
+        self.assertFalse(problems, "Performance regression:\n" + "\n".join(problems))
+
+    @staticmethod
+    def count_in_python(spec):
+        students = StudentProfile.objects.filter(user__branch_id=spec['branch'], user__is_active=True)
+        if spec['student_class']:
+            students = students.filter(current_class_id=spec['student_class'])
+        parent_ids = set(students.values_list('parent__user_id', flat=True))
+        return CustomUser.objects.filter(id__in=parent_ids, is_active=True).count()
+
+    def test_preview(self):
+        for label, spec in self.specs.items():
+            size = targeting.audience([spec]).count()
+            self.assertEqual(size, self.count_in_python(spec))
+            self.record(f"preview_{label}_python", measure(lambda: self.count_in_python(spec)), recipients=size)
+            self.record(
+                f"preview_{label}_join", measure(lambda: targeting.group_size(spec), setup=cache.clear),
+                recipients=size,
+            )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        report.write()
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
@@ -1,6 +1,10 @@
 from __future__ import absolute_import, unicode_literals
 import os
+import time
 from celery import Celery
+from celery.signals import (
+    before_task_publish, task_failure, task_postrun, task_prerun, worker_init, worker_process_init,
+)
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lagooz_coms.settings')
 
@@ -10,5 +14,59 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 
 app.autodiscover_tasks()
 
+
+@worker_init.connect
+@worker_process_init.connect
+def configure_db_connections(**kwargs):
+    """
+    Let worker processes keep their DB connection across tasks. Celery's Django
+    fixup closes connections after each task only once CONN_MAX_AGE has expired
+    (or the connection is unusable), so a longer age here means reuse.
+    """
+    from django.conf import settings
+    from django.db import connections
+
+    max_age = getattr(settings, 'CELERY_DB_CONN_MAX_AGE', None)
+    if max_age is None:
+        return
+    for conn in connections.all(initialized_only=False):
+        conn.settings_dict['CONN_MAX_AGE'] = max_age
+
+
+@before_task_publish.connect
+def stamp_enqueued_at(headers=None, **kwargs):
+    """Record when a task was published, so workers can measure how long it queued."""
+    if headers is not None:
+        headers.setdefault('enqueued_at', time.time())
+
+
+@task_prerun.connect
+def start_task_timer(task=None, **kwargs):
+    task.request.started_at = time.time()
+
+
+@task_failure.connect
+def flag_task_failure(sender=None, **kwargs):
+    sender.request.failed = True
+
+
+@task_postrun.connect
+def record_task_metrics(task=None, **kwargs):
+    """Queue wait and run time per queue (accounts.metrics.task_metrics)."""
+    from accounts.metrics import task_metrics
+
+    request = task.request
+    started_at = getattr(request, 'started_at', None)
+    if started_at is None or request.is_eager:
+        return
+    enqueued_at = getattr(request, 'enqueued_at', None) or started_at
+    queue = (request.delivery_info or {}).get('routing_key') or 'unknown'
+    task_metrics.record(
+        queue,
+        wait_ms=max(started_at - enqueued_at, 0) * 1000,
+        run_ms=(time.time() - started_at) * 1000,
+        failed=getattr(request, 'failed', False),
+    )
+
 # Explicitly import tasks so Celery registers them
 # import accounts.tasks
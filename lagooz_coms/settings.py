@@ -1,6 +1,8 @@
 import os
+import sys
 from pathlib import Path
 from celery.schedules import crontab
+from kombu import Queue
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -35,6 +37,7 @@ INSTALLED_APPS = [
     'crispy_forms',
     'crispy_bootstrap4',
     'phonenumber_field',
+    'django_celery_beat',
 ]
 
 
@@ -45,6 +48,7 @@ CRISPY_TEMPLATE_PACK = "bootstrap4"
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'accounts.middleware.QueryTimingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -92,10 +96,48 @@ DATABASES = {
             'CHARSET': 'utf8mb4',
             'COLLATION': 'utf8mb4_unicode_ci',
         },
+        # Keep connections open between requests instead of reconnecting every time;
+        # health checks replace a connection the server has dropped before it is reused.
+        # asgi.py defaults this to 0: async requests run on short-lived threads, so use a
+        # server-side pooler (e.g. ProxySQL) there instead.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Redis is shared by every web and Celery process (database 1; the broker uses 0).
+# CACHE_BACKEND=locmem runs without Redis; ``manage.py test`` always uses locmem so a
+# test run never reads or flushes the shared cache. Key namespaces: accounts/cache_keys.py
+REDIS_CACHE_URL = os.environ.get('REDIS_CACHE_URL', 'redis://localhost:6379/1')
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem' if sys.argv[1:2] == ['test'] else 'redis')
+
+if CACHE_BACKEND == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'lagooz',
+            'KEY_PREFIX': 'lagooz',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+            'KEY_PREFIX': 'lagooz',
+            'TIMEOUT': 300,
+        }
+    }
+
+# Sessions are read from the cache and written through to django_session, so a page
+# view no longer queries the session table and a cache flush does not log users out.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'default'
+
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -194,11 +236,85 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_ENABLE_UTC = True
 CELERY_TIMEZONE = 'Africa/Lagos'
 
+# Each prefork child keeps at most one DB connection, so concurrency bounds the
+# worker's connection pool. Children reuse their connection across tasks for
+# CELERY_DB_CONN_MAX_AGE seconds (see lagooz_coms/celery.py) and are recycled
+# after CELERY_WORKER_MAX_TASKS_PER_CHILD tasks.
+CELERY_WORKER_CONCURRENCY = int(os.environ.get('CELERY_WORKER_CONCURRENCY', '4'))
+CELERY_WORKER_MAX_TASKS_PER_CHILD = 1000
+CELERY_DB_CONN_MAX_AGE = int(os.environ.get('CELERY_DB_CONN_MAX_AGE', '600'))
+
+# Priority queues (accounts.queues): run one worker per queue so bulk fan-outs never
+# hold up urgent messages, e.g. `celery -A lagooz_coms worker -Q urgent -c 4` and
+# `-Q bulk -c 2`. Prefetching one task at a time keeps a worker from reserving work
+# behind a long send.
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_TASK_QUEUES = (
+    Queue('urgent', routing_key='urgent'),
+    Queue('default', routing_key='default'),
+    Queue('bulk', routing_key='bulk'),
+)
+CELERY_TASK_ROUTES = {
+    # Dispatchers are short and decide each message's queue themselves
+    'accounts.tasks.send_scheduled_communications': {'queue': 'urgent'},
+    'accounts.tasks.send_recurring_communications': {'queue': 'urgent'},
+    'accounts.tasks.retry_failed_deliveries': {'queue': 'default'},
+    'accounts.tasks.archive_old_communications': {'queue': 'bulk'},
+    'accounts.tasks.refresh_branch_stats': {'queue': 'bulk'},
+    'accounts.tasks.rebuild_dashboard_rollups': {'queue': 'bulk'},
+    'accounts.tasks.send_digests': {'queue': 'bulk'},
+}
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Tests have no broker: queued tasks run inline
+CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_TASK_ALWAYS_EAGER', '1' if sys.argv[1:2] == ['test'] else '0') == '1'
+# Messages to at most URGENT_MAX_RECIPIENTS people go to 'urgent'; announcements and
+# news to at least BULK_MIN_RECIPIENTS go to 'bulk'
+URGENT_MAX_RECIPIENTS = 50
+BULK_MIN_RECIPIENTS = 1000
+# Per-queue wait/run times; `manage.py dump_queue_metrics` merges every worker's snapshot
+TASK_METRICS_SNAPSHOT_DIR = os.environ.get('TASK_METRICS_SNAPSHOT_DIR')
+
+# Beat keeps its schedule and last-run times in the database (django_celery_beat)
+# rather than a local celerybeat-schedule file, so a restarted or replacement beat
+# node carries on where the last one stopped and periodic tasks can be edited in the
+# admin. Run a single beat process; the entries below are synced into the database on
+# start. Recurring messages are rows of their own (accounts.recurrence).
+CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 CELERY_BEAT_SCHEDULE = {
     'send-scheduled-communications-every-minute': {
         'task': 'accounts.tasks.send_scheduled_communications',  # Correct path!
         'schedule': crontab(minute='*/1'),  # every minute
     },
+    'send-recurring-communications-every-minute': {
+        'task': 'accounts.tasks.send_recurring_communications',
+        'schedule': crontab(minute='*/1'),
+    },
+    'archive-old-communications-nightly': {
+        'task': 'accounts.tasks.archive_old_communications',
+        'schedule': crontab(hour=2, minute=30),
+    },
+    'refresh-branch-stats': {
+        'task': 'accounts.tasks.refresh_branch_stats',
+        'schedule': crontab(minute='*/15'),
+    },
+    'rebuild-dashboard-rollups-nightly': {
+        'task': 'accounts.tasks.rebuild_dashboard_rollups',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'retry-failed-deliveries': {
+        'task': 'accounts.tasks.retry_failed_deliveries',
+        'schedule': crontab(minute='*/1'),
+    },
+    'send-daily-digests': {
+        'task': 'accounts.tasks.send_digests',
+        'schedule': crontab(hour=17, minute=0),
+        'args': ('daily',),
+    },
+    'send-weekly-digests': {
+        'task': 'accounts.tasks.send_digests',
+        'schedule': crontab(hour=17, minute=30, day_of_week='fri'),
+        'args': ('weekly',),
+    },
 }
 
 
@@ -217,6 +333,83 @@ MAX_TOTAL_ATTACHMENT_MB = 20
 MAX_ATTACHMENT_COUNT = 5
 MAX_FILE_SIZE_MB = 10
 
+# Per-request SQL/template/latency instrumentation (accounts.middleware.QueryTimingMiddleware).
+# Set a snapshot directory to let `manage.py dump_request_metrics` merge every worker's histogram.
+REQUEST_METRICS_ENABLED = True
+REQUEST_METRICS_SNAPSHOT_DIR = os.environ.get('REQUEST_METRICS_SNAPSHOT_DIR')
+REQUEST_METRICS_SNAPSHOT_INTERVAL = 30  # seconds
+
+# Square avatar thumbnails (accounts.thumbnails); WEBP falls back to JPEG without libwebp
+PROFILE_THUMBNAIL_SIZES = (32, 64, 128)
+PROFILE_THUMBNAIL_FORMAT = 'WEBP'
+
+# Sent communications older than this are moved to the archive tables (accounts.archive)
+COMMUNICATION_ARCHIVE_AFTER_DAYS = 365
+
+# Recipient ID sets at least this large are joined through accounts.id_joins instead of
+# an IN list: 'temp_table' (session temporary table) or 'values' (inlined VALUES rows,
+# for database users without the CREATE TEMPORARY TABLES privilege)
+ID_JOIN_THRESHOLD = 1000
+ID_JOIN_STRATEGY = 'temp_table'
+
+# Whole-branch/role announcements to at least this many users are delivered
+# fan-out-on-read (accounts.broadcasts) instead of writing one inbox row per user
+BROADCAST_THRESHOLD = 1000
+
+# Besides the inbox, these message types also go out by email/SMS/push per
+# ParentProfile.preferred_contact_method and registered push devices
+# (accounts.notifications.channels), from a Celery task unless delivery is synchronous
+CHANNEL_MESSAGE_TYPES = ('announcement', 'notification')
+CHANNEL_DELIVERY_ASYNC = os.environ.get('CHANNEL_DELIVERY_ASYNC', '0' if sys.argv[1:2] == ['test'] else '1') == '1'
+CHANNEL_PROVIDERS = {
+    'in_app': 'accounts.notifications.providers.InAppProvider',
+    'email': 'accounts.notifications.providers.EmailProvider',
+    'sms': 'accounts.notifications.providers.SmsGatewayProvider',
+    'push': 'accounts.notifications.providers.PushProvider',
+}
+# CHANNEL_PROVIDERS=fake (and ``manage.py test``) records batches in memory instead of sending
+if os.environ.get('CHANNEL_PROVIDERS', 'fake' if sys.argv[1:2] == ['test'] else '') == 'fake':
+    CHANNEL_PROVIDERS = {channel: 'accounts.notifications.providers.FakeProvider' for channel in CHANNEL_PROVIDERS}
+FAKE_CHANNEL_LATENCY_MS = 0
+SMS_GATEWAY_URL = os.environ.get('SMS_GATEWAY_URL', '')
+SMS_GATEWAY_API_KEY = os.environ.get('SMS_GATEWAY_API_KEY', '')
+SMS_SENDER_ID = 'Lagooz'
+FIREBASE_CREDENTIALS = os.environ.get('FIREBASE_CREDENTIALS', '')
+
+# Failed deliveries are retried with exponential backoff and full jitter, then
+# dead-lettered (accounts.notifications.retries). A channel is paused for the cooldown
+# when at least half of the last minute's (minimum 20) addresses failed.
+DELIVERY_MAX_ATTEMPTS = 6
+DELIVERY_RETRY_BASE = 60  # seconds, doubling per attempt
+DELIVERY_RETRY_MAX = 6 * 60 * 60
+DELIVERY_BREAKER_WINDOW = 60
+DELIVERY_BREAKER_MIN_CALLS = 20
+DELIVERY_BREAKER_ERROR_RATE = 0.5
+DELIVERY_BREAKER_COOLDOWN = 5 * 60
+
+# Posts and news reach parents who opt in (ParentProfile.digest_frequency, default off)
+# by email as one digest per period (accounts.notifications.digests), listing at most
+# DIGEST_MAX_ITEMS unread messages
+DIGEST_MESSAGE_TYPES = ('post', 'news')
+DIGEST_MAX_AGE_DAYS = 8
+DIGEST_MAX_ITEMS = 20
+
+# Outbound email per recipient domain (accounts.notifications.ratelimit): messages per
+# second and burst. Over the limit, a send defers the rest to the retry queue at once;
+# a retry run waits for tokens for up to EMAIL_RATE_LIMIT_MAX_WAIT seconds (less than
+# the one-minute retry tick), then leaves the rest for the next run. The buckets are shared through Redis;
+# without it (tests, locmem) they are per process.
+EMAIL_RATE_LIMIT_ENABLED = True
+EMAIL_RATE_LIMIT_MAX_WAIT = 45
+EMAIL_RATE_LIMIT_REDIS_URL = os.environ.get('EMAIL_RATE_LIMIT_REDIS_URL', REDIS_CACHE_URL if CACHE_BACKEND == 'redis' else '')
+EMAIL_DEFAULT_DOMAIN_RATE = (5, 20)
+EMAIL_DOMAIN_RATES = {
+    'gmail.com': (20, 100),
+    'yahoo.com': (5, 20),
+    'outlook.com': (10, 50),
+    'hotmail.com': (10, 50),
+}
+
 
 LOGGING = {
     'version': 1,